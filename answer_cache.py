@@ -0,0 +1,92 @@
+# answer_cache.py
+# Cache semântico de respostas do generate_answer.
+# Perguntas parecidas (similaridade de cosseno dos embeddings) feitas no mesmo
+# ponto do curso (modulo, aula, etapa, cenario) reaproveitam a resposta anterior.
+
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from itertools import count
+
+ANSWER_CACHE_ATIVO = os.getenv("ANSWER_CACHE_ATIVO", "1") != "0"
+ANSWER_CACHE_LIMIAR = float(os.getenv("ANSWER_CACHE_LIMIAR", "0.95"))
+ANSWER_CACHE_TTL = int(os.getenv("ANSWER_CACHE_TTL", str(24 * 3600)))
+ANSWER_CACHE_MAX = int(os.getenv("ANSWER_CACHE_MAX", "1000"))
+
+
+def _normalizar(vetor: list) -> list:
+    norma = math.sqrt(sum(v * v for v in vetor)) or 1.0
+    return [v / norma for v in vetor]
+
+
+def escopo_resposta(progresso: dict, cenario: str) -> tuple:
+    """Escopo do cache: respostas só são reaproveitadas no mesmo ponto do curso."""
+    return (
+        progresso.get("modulo"),
+        progresso.get("aula"),
+        progresso.get("etapa"),
+        cenario,
+    )
+
+
+class CacheRespostas:
+    """Entradas com TTL, limite de tamanho (remove as menos usadas) e busca por similaridade."""
+
+    def __init__(self, limiar: float, ttl: int, max_itens: int):
+        self.limiar = limiar
+        self.ttl = ttl
+        self.max_itens = max_itens
+        self._entradas = OrderedDict()  # id -> (escopo, vetor, resposta, criado_em)
+        self._por_escopo = {}           # escopo -> set(ids)
+        self._ids = count()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _remover(self, entrada_id):
+        escopo = self._entradas.pop(entrada_id)[0]
+        ids = self._por_escopo.get(escopo)
+        if ids is not None:
+            ids.discard(entrada_id)
+            if not ids:
+                del self._por_escopo[escopo]
+
+    def buscar(self, escopo: tuple, vetor: list):
+        """Retorna a resposta mais parecida do escopo se passar do limiar, senão None."""
+        consulta = _normalizar(vetor)
+        agora = time.time()
+        with self._lock:
+            melhor_id, melhor_sim = None, -1.0
+            for entrada_id in list(self._por_escopo.get(escopo, ())):
+                _, candidato, _, criado_em = self._entradas[entrada_id]
+                if agora - criado_em > self.ttl:
+                    self._remover(entrada_id)
+                    continue
+                sim = sum(a * b for a, b in zip(consulta, candidato))
+                if sim > melhor_sim:
+                    melhor_id, melhor_sim = entrada_id, sim
+
+            if melhor_id is None or melhor_sim < self.limiar:
+                self.misses += 1
+                return None
+
+            self._entradas.move_to_end(melhor_id)
+            self.hits += 1
+            return self._entradas[melhor_id][2]
+
+    def guardar(self, escopo: tuple, vetor: list, resposta: str):
+        with self._lock:
+            entrada_id = next(self._ids)
+            self._entradas[entrada_id] = (escopo, _normalizar(vetor), resposta, time.time())
+            self._por_escopo.setdefault(escopo, set()).add(entrada_id)
+            while len(self._entradas) > self.max_itens:
+                self._remover(next(iter(self._entradas)))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "itens": len(self._entradas)}
+
+
+cache_respostas = CacheRespostas(ANSWER_CACHE_LIMIAR, ANSWER_CACHE_TTL, ANSWER_CACHE_MAX)
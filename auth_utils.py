@@ -1,3 +1,8 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
 from fastapi import Request, HTTPException, status
 from fastapi.responses import RedirectResponse
 from jose import JWTError, jwt
@@ -5,12 +10,59 @@ from jose import JWTError, jwt
 SECRET_KEY = "segredo-teste"
 ALGORITHM = "HS256"
 
-def get_current_user(request: Request):
+# Tokens já verificados: evita decodificar/verificar o JWT a cada requisição.
+# A entrada nunca vale além do `exp` do próprio token.
+AUTH_CACHE_MAX = int(os.getenv("AUTH_CACHE_MAX", "10000"))
+AUTH_CACHE_TTL = int(os.getenv("AUTH_CACHE_TTL", "300"))
+
+
+class CacheTokens:
+    """Token -> usuário, com validade min(exp, agora + ttl) e limite de tamanho (remove os menos usados)."""
+
+    def __init__(self, max_itens: int = AUTH_CACHE_MAX, ttl: int = AUTH_CACHE_TTL):
+        self.max_itens = max_itens
+        self.ttl = ttl
+        self._entradas = OrderedDict()  # token -> (usuario, valido_ate)
+        self._lock = threading.Lock()
+
+    def buscar(self, token: str):
+        with self._lock:
+            entrada = self._entradas.get(token)
+            if entrada is None:
+                return None
+            usuario, valido_ate = entrada
+            if time.time() >= valido_ate:
+                del self._entradas[token]
+                return None
+            self._entradas.move_to_end(token)
+            return usuario
+
+    def guardar(self, token: str, usuario: str, exp=None):
+        valido_ate = time.time() + self.ttl
+        if exp is not None:
+            valido_ate = min(valido_ate, float(exp))
+        with self._lock:
+            self._entradas[token] = (usuario, valido_ate)
+            self._entradas.move_to_end(token)
+            while len(self._entradas) > self.max_itens:
+                self._entradas.popitem(last=False)
+
+
+cache_tokens = CacheTokens()
+
+
+async def get_current_user(request: Request):
     token = request.cookies.get("token")
     if not token:
         raise HTTPException(status_code=status.HTTP_303_SEE_OTHER, headers={"Location": "/login"})
+    usuario = cache_tokens.buscar(token)
+    if usuario is not None:
+        return usuario
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        return payload.get("sub")
     except JWTError:
         raise HTTPException(status_code=status.HTTP_303_SEE_OTHER, headers={"Location": "/login"})
+    usuario = payload.get("sub")
+    if usuario is not None:
+        cache_tokens.guardar(token, usuario, payload.get("exp"))
+    return usuario
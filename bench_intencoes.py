@@ -0,0 +1,244 @@
+# bench_intencoes.py
+# Confere que intent_engine.classificar dá exatamente os mesmos resultados que as
+# cadeias antigas de `in` / re.search (cópias abaixo) e mede o ganho de tempo.
+# Corpus: frases de uso real do chat + combinações de todos os termos das tabelas
+# + frases das transcrições. Sem rede. Sai com código 1 se houver divergência.
+
+import itertools
+import random
+import re
+import sys
+import time
+
+import intent_engine as ie
+
+N_TRANSCRICOES = 2000
+
+# ---------------------------------------------------------------------------
+# Implementações antigas (copiadas de prompt_router.py e gpt_utils.py)
+# ---------------------------------------------------------------------------
+
+def inferir_tipo_de_prompt_antigo(pergunta: str) -> str:
+    pergunta_lower = pergunta.lower()
+    termos_mensagem_auto = [
+        "mensagem automática", "resposta automática", "mensagem padrão",
+        "robô", "responder depois", "responder mais tarde", "sem tempo para responder",
+        "fim de semana", "fora do horário", "mensagem fora do expediente"
+    ]
+    if any(t in pergunta_lower for t in termos_mensagem_auto):
+        return "mensagem_automatica"
+    if (
+        "health plan" in pergunta_lower
+        or "plano de tratamento" in pergunta_lower
+        or "meu health plan" in pergunta_lower
+        or "fazer meu health plan" in pergunta_lower
+        or "fazer meu plano" in pergunta_lower
+        or "dúvida no health" in pergunta_lower
+        or "dúvida no plano" in pergunta_lower
+        or "como montar meu health" in pergunta_lower
+        or "como montar meu plano" in pergunta_lower
+        or "criar meu plano" in pergunta_lower
+        or "montar health plan" in pergunta_lower
+        or "montar plano" in pergunta_lower
+        or ("sou pediatra" in pergunta_lower and "health" in pergunta_lower)
+        or ("sou psicóloga" in pergunta_lower and "ansiedade" in pergunta_lower)
+    ):
+        return "health_plan"
+    if (
+        "preço" in pergunta_lower
+        or "valor" in pergunta_lower
+        or "cobrar" in pergunta_lower
+        or "precificar" in pergunta_lower
+    ):
+        return "precificacao"
+    if (
+        "atrair pacientes" in pergunta_lower
+        or "sem marketing" in pergunta_lower
+        or "sem instagram" in pergunta_lower
+    ):
+        return "capitacao_sem_marketing_digital"
+    if (
+        "como aplicar" in pergunta_lower
+        or "exemplo prático" in pergunta_lower
+        or "na prática" in pergunta_lower
+    ):
+        return "aplicacao"
+    if (
+        "errei" in pergunta_lower
+        or "confundi" in pergunta_lower
+        or "não entendi" in pergunta_lower
+    ):
+        return "correcao"
+    if (
+        "resumo" in pergunta_lower
+        or "revisão" in pergunta_lower
+    ):
+        return "revisao"
+    if (
+        "muitos perguntam" in pergunta_lower
+        or "pergunta comum" in pergunta_lower
+    ):
+        return "faq"
+    return "explicacao"
+
+
+def detectar_cenario_antigo(pergunta: str) -> str:
+    pergunta = pergunta.lower()
+    especialidades = [
+        "dermatologista", "psicóloga", "psicologo", "pediatra", "dentista",
+        "fonoaudióloga", "fonoaudiologo", "nutricionista", "veterinário", "veterinaria",
+        "psicanalista", "fisioterapeuta", "terapeuta", "acupunturista"
+    ]
+    termos_acao = [
+        "atrair", "captar", "faturar", "paciente high ticket", "crescer", "aplicar",
+        "ter mais pacientes", "dobrar faturamento", "ganhar mais", "aumentar", "consultório cheio",
+        "lotar agenda", "consultorio", "atendimento particular"
+    ]
+    if any(f"sou {esp}" in pergunta for esp in especialidades) and any(
+        t in pergunta for t in termos_acao
+    ):
+        return "duvida_pontual"
+    if re.search(r"como\s+faço|como\s+atrair|quero\s+(aumentar|dobrar|captar|faturar|ter mais|consultório|consultorio|lotar)", pergunta):
+        return "duvida_pontual"
+    if any(p in pergunta for p in [
+        "quero fazer o curso completo", "começar do início", "me ensina tudo",
+        "fazer o curso com você", "menu", "ver módulos", "ver o curso", "ver estrutura", "iniciar o curso", "quero começar o curso"
+    ]):
+        return "curso_completo"
+    elif re.search(r'\bm[oó]dulo\s*\d+\b', pergunta) or re.search(r'\baula\s*\d+\.\d+\b', pergunta):
+        return "navegacao_especifica"
+    elif any(p in pergunta for p in ["voltar", "retornar", "anterior", "repetir aula"]):
+        return "voltar"
+    elif any(p in pergunta for p in [
+        "tenho uma dúvida", "tenho outra dúvida", "minha dúvida", "não entendi", "duvida", "dúvida", "me explica",
+        "poderia explicar", "por que", "como", "o que", "quais", "qual", "explique", "me fale", "exemplo", "caso prático",
+        "me mostre", "me explique", "?"
+    ]):
+        return "duvida_pontual"
+    elif any(p in pergunta for p in [
+        "exemplo prático", "me dá um exemplo", "passo a passo", "como fazer isso", "como faço", "me ensina", "ensinar", "me mostre como"
+    ]):
+        return "exemplo_pratico"
+    else:
+        return "geral"
+
+
+def encontrar_modulo_aula_antigo(pergunta):
+    pergunta = pergunta.lower()
+    m_modulo = re.search(r'\bm[oó]dulo\s*(\d+)\b', pergunta)
+    m_aula = re.search(r'\baula\s*(\d+\.\d+)\b', pergunta)
+    modulo = None
+    aula = None
+    if m_modulo:
+        modulo = int(m_modulo.group(1))
+    if m_aula:
+        aula = m_aula.group(1)
+    return modulo, aula
+
+
+def comandos_antigos(pergunta):
+    pergunta_lower = pergunta.strip().lower()
+    return (
+        any(p in pergunta_lower for p in ["voltar", "retornar", "anterior"]),
+        "repetir" in pergunta_lower,
+        any(p in pergunta_lower for p in ["próxima aula", "avançar", "continuar", "pode avançar"]),
+    )
+
+
+def classificar_antigo(pergunta):
+    """O que o fluxo antigo calculava por pergunta (cenário duas vezes, como em generate_answer)."""
+    detectar_cenario_antigo(pergunta)
+    return (
+        inferir_tipo_de_prompt_antigo(pergunta),
+        detectar_cenario_antigo(pergunta),
+        encontrar_modulo_aula_antigo(pergunta),
+        comandos_antigos(pergunta),
+    )
+
+
+def classificar_novo(pergunta):
+    r = ie.classificar(pergunta)
+    return (r["tipo_prompt"], r["cenario"], (r["modulo"], r["aula"]), (r["voltar"], r["repetir"], r["avancar"]))
+
+# ---------------------------------------------------------------------------
+# Corpus
+# ---------------------------------------------------------------------------
+
+FRASES_CHAT = [
+    "oi", "Olá, bom dia", "sim", "não", "ok", "Próxima aula", "Repetir esta aula",
+    "Voltar para aula anterior", "Tenho outra dúvida", "Aprofundar esta aula",
+    "Escolher módulo ou aula específica", "Ir para o próximo módulo", "Ir para o módulo anterior",
+    "Quero tirar uma dúvida específica", "Me mostre um exemplo prático",
+    "Como aplicar o método na minha especialidade", "Por onde começo no curso?",
+    "Tenho uma dúvida específica sobre o curso.", "Quero começar o curso completo do início.",
+    "Quero ir para um módulo ou aula específica.", "Me mostre um exemplo prático para minha especialidade.",
+    "Quero começar o curso desde o início", "Tenho uma dúvida sobre o módulo 2, aula 2.1",
+    "Me mostre um exemplo prático para ginecologia.", "módulo 3", "aula 4.2", "Modulo 7 aula 7.9",
+    "Sou pediatra e quero fazer meu Health Plan", "sou psicóloga e atendo ansiedade",
+    "Como faço para   atrair pacientes sem Instagram?", "quero\taumentar meu valor de consulta",
+    "Quanto devo cobrar pela consulta?", "Errei o script da secretária", "Me dá um resumo da aula",
+    "Muitos perguntam sobre desconto", "sou dentista e quero lotar agenda", "MÓDULO 02 AULA 2.10",
+    "modulo12 aula1.1", "aula 1.1.2", "mensagem automática do WhatsApp no fim de semana",
+    "", "?", "passo a passo", "me ensina", "continuar", "pode avançar", "retornar",
+]
+
+
+def corpus():
+    frases = list(FRASES_CHAT)
+    termos = sorted(ie._todos_os_termos())
+    # cada termo sozinho, em contexto e com maiúsculas
+    for t in termos:
+        frases += [t, f"Olá, {t} no consultório", t.upper(), f"{t}?"]
+    # pares de termos (cobre as prioridades entre as tabelas)
+    rnd = random.Random(42)
+    for a, b in itertools.combinations(termos, 2):
+        if rnd.random() < 0.25:
+            frases.append(f"{a} {b}")
+    # frases reais das transcrições
+    try:
+        with open("transcricoes.txt", encoding="utf-8") as f:
+            linhas = [l.strip() for l in f if l.strip()]
+        frases += rnd.sample(linhas, min(N_TRANSCRICOES, len(linhas)))
+    except FileNotFoundError:
+        pass
+    return frases
+
+
+def medir(nome, fn, frases, repeticoes=5):
+    melhor = float("inf")
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        for frase in frases:
+            fn(frase)
+        melhor = min(melhor, time.perf_counter() - inicio)
+    por_frase = melhor / len(frases) * 1e6
+    print(f"{nome:<45} {por_frase:8.2f} µs/pergunta")
+    return por_frase
+
+
+if __name__ == "__main__":
+    frases = corpus()
+    print(f"[INTENÇÕES] Corpus com {len(frases)} frases\n")
+
+    divergencias = 0
+    for frase in frases:
+        antigo, novo = classificar_antigo(frase), classificar_novo(frase)
+        if antigo != novo:
+            divergencias += 1
+            if divergencias <= 10:
+                print(f"❌ {frase!r}\n   antigo: {antigo}\n   novo:   {novo}")
+    if divergencias:
+        print(f"\n❌ {divergencias} divergência(s)")
+        sys.exit(1)
+    print("✅ Resultados idênticos em todo o corpus\n")
+
+    print("Corpus completo:")
+    antes = medir("  antigo (cadeias de in + re.search)", classificar_antigo, frases)
+    depois = medir("  intent_engine.classificar", classificar_novo, frases)
+    print("Só perguntas típicas do chat:")
+    antes_chat = medir("  antigo (cadeias de in + re.search)", classificar_antigo, FRASES_CHAT, 200)
+    depois_chat = medir("  intent_engine.classificar", classificar_novo, FRASES_CHAT, 200)
+    print(
+        f"\n[INTENÇÕES] Ganho: {antes / max(depois, 1e-9):.1f}x (corpus), "
+        f"{antes_chat / max(depois_chat, 1e-9):.1f}x (chat)"
+    )
@@ -0,0 +1,29 @@
+# bench_retrievers.py
+# Micro-benchmark do custo de montar o objeto de consulta a cada requisição
+# (antes: index.as_query_engine por chamada; depois: registro de retrievers).
+# Não faz chamadas de rede: mede apenas a preparação, sem executar a consulta.
+
+import time
+
+from search_engine import index, get_retriever
+
+N = 200
+
+
+def medir(nome, fn, n=N):
+    fn()  # aquecimento
+    inicio = time.perf_counter()
+    for _ in range(n):
+        fn()
+    total = time.perf_counter() - inicio
+    print(f"{nome:<40} {total / n * 1000:8.3f} ms/req")
+    return total / n
+
+
+print(f"[BENCH] {N} iterações por cenário\n")
+antes = medir("as_query_engine por requisição", lambda: index.as_query_engine(similarity_top_k=3, chunk_size=512))
+meio = medir("as_retriever por requisição", lambda: index.as_retriever(similarity_top_k=3))
+depois = medir("registro (get_retriever)", lambda: get_retriever(3, 512))
+filtrado = medir("registro com filtro", lambda: get_retriever(3, 512, {"modulo": "1"}))
+
+print(f"\n[BENCH] Ganho vs. as_query_engine: {antes / max(depois, 1e-9):.0f}x")
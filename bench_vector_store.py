@@ -0,0 +1,141 @@
+# bench_vector_store.py
+# Compara o store JSON padrão do LlamaIndex com o índice FAISS (mmap) e a
+# matriz NumPy (mmap):
+# tempo de carga, RSS atual após a carga e latência de consulta.
+# Cada backend roda num subprocesso próprio para a medição de memória ser isolada;
+# a dimensão dos vetores é lida pelo processo pai e passada ao subprocesso, que
+# não abre nada além do próprio backend antes de medir.
+# Não faz chamadas de rede: as consultas usam vetores aleatórios normalizados.
+#
+# Uso: python bench_vector_store.py            (todos os backends)
+#      python bench_vector_store.py faiss      (um backend só)
+#      python bench_vector_store.py lote       (NumPy com consultas em lote)
+
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import time
+
+INDEX_DIR = "storage"
+N_CONSULTAS = 200
+TOP_K = 3
+
+
+def rss_mb() -> float:
+    """RSS atual do processo (não o pico: o pico incluiria cargas anteriores)."""
+    try:
+        with open("/proc/self/statm") as f:
+            paginas = int(f.read().split()[1])
+        return paginas * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except OSError:
+        # sem /proc (macOS): cai para o pico, ru_maxrss em bytes lá
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 * 1024)
+
+
+def vetores_aleatorios(dim: int, n: int) -> list:
+    vetores = []
+    for _ in range(n):
+        v = [random.gauss(0, 1) for _ in range(dim)]
+        norma = sum(x * x for x in v) ** 0.5
+        vetores.append([x / norma for x in v])
+    return vetores
+
+
+def dimensao() -> int:
+    """Dimensão dos vetores, pelo cabeçalho da matriz NumPy (mmap) ou do índice FAISS."""
+    from vector_store import FAISS_INDEX_FILE, NUMPY_MATRIZ_FILE
+
+    caminho = os.path.join(INDEX_DIR, NUMPY_MATRIZ_FILE)
+    if os.path.exists(caminho):
+        import numpy as np
+        return int(np.load(caminho, mmap_mode="r").shape[1])
+    caminho = os.path.join(INDEX_DIR, FAISS_INDEX_FILE)
+    if os.path.exists(caminho):
+        import faiss
+        return faiss.read_index(caminho).d
+    # índice só no formato do LlamaIndex: lê o JSON (só no processo pai)
+    with open(os.path.join(INDEX_DIR, "default__vector_store.json"), encoding="utf-8") as f:
+        embeddings = json.load(f)["embedding_dict"]
+    return len(next(iter(embeddings.values())))
+
+
+def medir_llama(dim: int) -> dict:
+    from llama_index.core import Settings, StorageContext, load_index_from_storage, QueryBundle
+    from llama_index.core.embeddings import MockEmbedding
+
+    Settings.embed_model = MockEmbedding(embed_dim=dim)
+    rss_antes = rss_mb()
+    inicio = time.perf_counter()
+    index = load_index_from_storage(StorageContext.from_defaults(persist_dir=INDEX_DIR))
+    carga = time.perf_counter() - inicio
+    rss_depois = rss_mb()
+
+    retriever = index.as_retriever(similarity_top_k=TOP_K)
+    consultas = vetores_aleatorios(dim, N_CONSULTAS)
+    inicio = time.perf_counter()
+    for v in consultas:
+        retriever.retrieve(QueryBundle(query_str="bench", embedding=v))
+    latencia = (time.perf_counter() - inicio) / N_CONSULTAS
+    return {"carga_s": carga, "rss_mb": rss_depois, "rss_delta_mb": rss_depois - rss_antes, "consulta_ms": latencia * 1000}
+
+
+def medir_faiss(dim: int) -> dict:
+    from vector_store import FaissStore
+
+    rss_antes = rss_mb()
+    inicio = time.perf_counter()
+    store = FaissStore(INDEX_DIR)
+    carga = time.perf_counter() - inicio
+    rss_depois = rss_mb()
+
+    consultas = vetores_aleatorios(dim, N_CONSULTAS)
+    inicio = time.perf_counter()
+    for v in consultas:
+        store.buscar(v, top_k=TOP_K)
+    latencia = (time.perf_counter() - inicio) / N_CONSULTAS
+    return {"carga_s": carga, "rss_mb": rss_depois, "rss_delta_mb": rss_depois - rss_antes, "consulta_ms": latencia * 1000}
+
+
+def medir_numpy(dim: int, lote: int = 1) -> dict:
+    from vector_store import NumpyStore
+
+    rss_antes = rss_mb()
+    inicio = time.perf_counter()
+    store = NumpyStore(INDEX_DIR)
+    carga = time.perf_counter() - inicio
+    rss_depois = rss_mb()
+
+    consultas = vetores_aleatorios(dim, N_CONSULTAS)
+    inicio = time.perf_counter()
+    for i in range(0, N_CONSULTAS, lote):
+        store.buscar_lote(consultas[i:i + lote], top_k=TOP_K)
+    latencia = (time.perf_counter() - inicio) / N_CONSULTAS
+    return {"carga_s": carga, "rss_mb": rss_depois, "rss_delta_mb": rss_depois - rss_antes, "consulta_ms": latencia * 1000}
+
+
+BACKENDS = {
+    "llama": medir_llama,
+    "faiss": medir_faiss,
+    "numpy": medir_numpy,
+    "lote": lambda dim: medir_numpy(dim, lote=20),
+}
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 3 and sys.argv[1] == "--filho":
+        print(json.dumps(BACKENDS[sys.argv[2]](int(sys.argv[3]))))
+        sys.exit(0)
+
+    escolhidos = sys.argv[1:] or list(BACKENDS)
+    dim = dimensao()
+    print(f"[BENCH] {N_CONSULTAS} consultas por backend, top_k={TOP_K}\n")
+    print(f"{'backend':<8} {'carga (s)':>10} {'RSS (MB)':>10} {'Δ RSS (MB)':>11} {'consulta (ms)':>14}")
+    for nome in escolhidos:
+        saida = subprocess.run(
+            [sys.executable, __file__, "--filho", nome, str(dim)], capture_output=True, text=True, check=True
+        ).stdout.strip().splitlines()[-1]
+        r = json.loads(saida)
+        print(f"{nome:<8} {r['carga_s']:>10.3f} {r['rss_mb']:>10.1f} {r['rss_delta_mb']:>11.1f} {r['consulta_ms']:>14.3f}")
@@ -0,0 +1,172 @@
+# chunker.py
+# Divide transcricoes.txt respeitando a estrutura do curso: linhas [TEMA: ...]
+# e títulos numerados de aula ("1.7.3. Gatilho High Ticket da Prova Social").
+# Cada trecho carrega os metadados modulo, aula, secao, titulo e temas.
+
+import hashlib
+import os
+import re
+
+# Versão da regra de divisão: mudar aqui força a reconstrução dos índices
+VERSAO_CHUNKER = 1
+ARQUIVO_VERSAO = "versao_chunker.txt"
+
+# ~512 tokens em português
+CHUNK_MAX_CHARS = 2000
+# Linhas maiores que isso depois de um [TEMA] são corpo de texto, não título
+TITULO_MAX_CHARS = 300
+
+RE_TEMA = re.compile(r"^\[TEMA:\s*(?P<temas>.*?)\]?\s*$")
+RE_TITULO_AULA = re.compile(r"^(?P<secao>\d+\.\d+(?:\.\d+)*)\.?\s+(?P<titulo>\S.*)$")
+RE_SEPARADOR = re.compile(r"^\s*(?:-{5,}|={4,}.*={4,})\s*$")
+RE_FIM_FRASE = re.compile(r"[.!?…]+[\"”')]*\s+")
+
+
+def _metadados_secao(linha_tema: str, linha_titulo: str) -> dict:
+    metadata = {"modulo": "", "aula": "", "secao": "", "titulo": "", "temas": ""}
+    if linha_tema:
+        metadata["temas"] = RE_TEMA.match(linha_tema).group("temas").strip()
+    if linha_titulo:
+        metadata["titulo"] = linha_titulo.strip()
+        m = RE_TITULO_AULA.match(linha_titulo.strip())
+        if m:
+            partes = m.group("secao").split(".")
+            metadata["modulo"] = str(int(partes[0]))
+            metadata["aula"] = f"{int(partes[0])}.{int(partes[1])}"
+            metadata["secao"] = m.group("secao")
+    return metadata
+
+
+def _secoes(texto: str) -> list:
+    """Retorna [(inicio, fim, metadata)] com os limites de cada seção no texto original."""
+    linhas = texto.splitlines(keepends=True)
+    inicios = []
+    pos = 0
+    for linha in linhas:
+        inicios.append(pos)
+        pos += len(linha)
+
+    secoes = []
+    atual_inicio, atual_meta = 0, _metadados_secao("", "")
+    i = 0
+    while i < len(linhas):
+        linha = linhas[i].strip()
+        tema = titulo = ""
+        proxima = i
+        if RE_TEMA.match(linha):
+            tema = linha
+            # o título costuma vir logo depois da linha de temas
+            j = i + 1
+            while j < len(linhas) and not linhas[j].strip():
+                j += 1
+            if j < len(linhas):
+                candidato = linhas[j].strip()
+                if (
+                    len(candidato) <= TITULO_MAX_CHARS
+                    and not RE_TEMA.match(candidato)
+                    and not RE_SEPARADOR.match(candidato)
+                ):
+                    titulo = candidato
+                    proxima = j
+        elif RE_TITULO_AULA.match(linha):
+            titulo = linha
+
+        if tema or titulo:
+            if inicios[i] > atual_inicio:
+                secoes.append((atual_inicio, inicios[i], atual_meta))
+            atual_inicio, atual_meta = inicios[i], _metadados_secao(tema, titulo)
+            i = proxima
+        i += 1
+
+    secoes.append((atual_inicio, len(texto), atual_meta))
+    return secoes
+
+
+def _cortes(texto: str, inicio: int, fim: int) -> list:
+    """Quebra [inicio, fim) em pedaços de até CHUNK_MAX_CHARS, preferindo fim de linha ou de frase."""
+    quebras = sorted(
+        {m.end() for m in re.finditer(r"\n", texto[inicio:fim])}
+        | {m.end() for m in RE_FIM_FRASE.finditer(texto[inicio:fim])}
+    )
+    pedacos = []
+    pos = 0
+    tamanho = fim - inicio
+    idx = 0
+    while pos < tamanho:
+        limite = pos + CHUNK_MAX_CHARS
+        if limite >= tamanho:
+            pedacos.append((inicio + pos, fim))
+            break
+        corte = None
+        while idx < len(quebras) and quebras[idx] <= limite:
+            if quebras[idx] > pos:
+                corte = quebras[idx]
+            idx += 1
+        if corte is None:
+            corte = limite
+        pedacos.append((inicio + pos, inicio + corte))
+        pos = corte
+    return pedacos
+
+
+def id_chunk(texto: str, metadata: dict) -> str:
+    """Id estável derivado do conteúdo: o mesmo trecho gera o mesmo id em todos os índices."""
+    base = texto + "\x1f" + "\x1f".join(f"{k}={metadata[k]}" for k in sorted(metadata))
+    return hashlib.sha1(base.encode("utf-8")).hexdigest()
+
+
+def dividir_transcricoes(texto: str) -> list:
+    """
+    Lista de trechos no formato {id, texto, inicio, fim, metadata}.
+    `inicio`/`fim` são posições (em caracteres) do trecho dentro de `texto`.
+    """
+    chunks = []
+    for sec_inicio, sec_fim, metadata in _secoes(texto):
+        for inicio, fim in _cortes(texto, sec_inicio, sec_fim):
+            trecho = texto[inicio:fim]
+            if RE_SEPARADOR.sub("", trecho).strip() == "":
+                continue
+            # descarta espaços e linhas separadoras nas bordas, ajustando as posições
+            inicio += len(trecho) - len(trecho.lstrip())
+            fim -= len(trecho) - len(trecho.rstrip())
+            trecho = texto[inicio:fim]
+            chunks.append({
+                "id": id_chunk(trecho, metadata),
+                "texto": trecho,
+                "inicio": inicio,
+                "fim": fim,
+                "metadata": dict(metadata),
+            })
+    return chunks
+
+
+def chunks_para_nodes(chunks: list) -> list:
+    """Converte os trechos em TextNodes do LlamaIndex (import tardio: só quem indexa precisa)."""
+    from llama_index.core.schema import TextNode
+
+    return [
+        TextNode(
+            id_=chunk["id"],
+            text=chunk["texto"],
+            metadata=chunk["metadata"],
+            start_char_idx=chunk["inicio"],
+            end_char_idx=chunk["fim"],
+            excluded_embed_metadata_keys=["modulo", "aula", "secao"],
+            excluded_llm_metadata_keys=["modulo", "aula", "secao", "temas"],
+        )
+        for chunk in chunks
+    ]
+
+
+def versao_indice_ok(persist_dir: str) -> bool:
+    """True se o índice em `persist_dir` foi gerado com a versão atual do chunker."""
+    try:
+        with open(os.path.join(persist_dir, ARQUIVO_VERSAO), encoding="utf-8") as f:
+            return f.read().strip() == str(VERSAO_CHUNKER)
+    except FileNotFoundError:
+        return False
+
+
+def gravar_versao_indice(persist_dir: str):
+    with open(os.path.join(persist_dir, ARQUIVO_VERSAO), "w", encoding="utf-8") as f:
+        f.write(str(VERSAO_CHUNKER))
@@ -0,0 +1,91 @@
+# content_store.py
+# Conteúdo canônico das etapas de cada aula, pré-gerado por pregerar_conteudo.py
+# e servido pelo generate_answer sem chamar o LLM. Cada texto é guardado por
+# (modulo, aula, etapa, versao): a versão é um hash da instrução da etapa, do
+# modelo e de CONTEUDO_VERSAO, então mudar qualquer um deles invalida o que
+# estava pré-gerado sem apagar as versões antigas.
+
+import hashlib
+import os
+import sqlite3
+import threading
+from datetime import datetime
+
+CONTENT_DB = os.getenv("CONTENT_DB", "conteudo.db")
+# Incrementar para regenerar tudo (ex.: transcrições ou prompts de sistema alterados)
+CONTEUDO_VERSAO = os.getenv("CONTEUDO_VERSAO", "1")
+CONTEUDO_ATIVO = os.getenv("CONTEUDO_ATIVO", "1") != "0"
+
+
+def versao_conteudo(instrucao: str, modelo: str) -> str:
+    bruto = f"{CONTEUDO_VERSAO}|{modelo}|{instrucao}"
+    return hashlib.sha256(bruto.encode("utf-8")).hexdigest()[:16]
+
+
+class ConteudoAulas:
+    """Textos pré-gerados numa tabela SQLite, com os já lidos mantidos em memória."""
+
+    def __init__(self, caminho: str = CONTENT_DB):
+        self.caminho = caminho
+        self._lock = threading.Lock()
+        self._memoria = {}  # (modulo, aula, etapa, versao) -> texto
+        self._conn = sqlite3.connect(caminho, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS conteudo_aulas (
+                modulo INTEGER NOT NULL,
+                aula TEXT NOT NULL,
+                etapa INTEGER NOT NULL,
+                versao TEXT NOT NULL,
+                texto TEXT NOT NULL,
+                modelo TEXT,
+                criado_em TEXT NOT NULL,
+                PRIMARY KEY (modulo, aula, etapa, versao)
+            )
+        """)
+        self._conn.commit()
+
+    def buscar(self, modulo: int, aula: str, etapa: int, versao: str):
+        """Texto da etapa na versão pedida, ou None se ainda não foi pré-gerado."""
+        chave = (modulo, aula, etapa, versao)
+        texto = self._memoria.get(chave)
+        if texto is not None:
+            return texto
+        with self._lock:
+            linha = self._conn.execute(
+                "SELECT texto FROM conteudo_aulas WHERE modulo = ? AND aula = ? AND etapa = ? AND versao = ?",
+                chave,
+            ).fetchone()
+        if linha is None:
+            return None
+        self._memoria[chave] = linha[0]
+        return linha[0]
+
+    def gravar(self, modulo: int, aula: str, etapa: int, versao: str, texto: str, modelo: str = None):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO conteudo_aulas (modulo, aula, etapa, versao, texto, modelo, criado_em) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (modulo, aula, etapa, versao, texto, modelo, datetime.now().isoformat()),
+            )
+            self._conn.commit()
+            self._memoria[(modulo, aula, etapa, versao)] = texto
+
+    def limpar_versoes_antigas(self, versoes_atuais: set) -> int:
+        """Remove os textos cujas versões não estão em `versoes_atuais`; retorna quantos."""
+        with self._lock:
+            versoes = [linha[0] for linha in self._conn.execute("SELECT DISTINCT versao FROM conteudo_aulas")]
+            antigas = [v for v in versoes if v not in versoes_atuais]
+            removidos = 0
+            for versao in antigas:
+                removidos += self._conn.execute("DELETE FROM conteudo_aulas WHERE versao = ?", (versao,)).rowcount
+            self._conn.commit()
+            self._memoria = {k: v for k, v in self._memoria.items() if k[3] in versoes_atuais}
+        return removidos
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM conteudo_aulas").fetchone()[0]
+
+
+conteudo_aulas = ConteudoAulas()
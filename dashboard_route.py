@@ -0,0 +1,200 @@
+# dashboard_route.py
+# Dashboard de uso da IA. Sem filtros, os números vêm das tabelas de resumo
+# mantidas pelo log_writer (custo constante); com filtros, de consultas na
+# tabela logs apoiadas nos índices de data/usuário/módulo. A palavra-chave é
+# buscada no índice FTS5 (logs_fts), com ranking bm25 e trechos destacados.
+
+import re
+import sqlite3
+import threading
+from typing import Optional
+from urllib.parse import urlencode
+
+from fastapi import APIRouter, Depends, Request
+from fastapi.responses import HTMLResponse, StreamingResponse
+from fastapi.templating import Jinja2Templates
+from markupsafe import Markup, escape
+
+from auth_utils import get_current_user
+from db_logs import DB_PATH, FTS_DISPONIVEL, consulta_fts, criar_tabela
+from logs_route import COLUNAS_EXPORTAVEIS, _data, exportar, montar_consulta, montar_filtros
+
+router = APIRouter()
+templates = Jinja2Templates(directory="templates")
+
+LOGS_POR_PAGINA = 50
+DIAS_GRAFICO = 90
+TOP_PERGUNTAS = 10
+
+_esquema_ok = False
+_esquema_lock = threading.Lock()
+
+
+def _conectar():
+    """Conexão com o logs.db, garantindo (uma vez por processo) tabelas, índices e resumos."""
+    global _esquema_ok
+    conn = sqlite3.connect(DB_PATH)
+    conn.row_factory = sqlite3.Row
+    if not _esquema_ok:
+        with _esquema_lock:
+            if not _esquema_ok:
+                criar_tabela(conn)
+                _esquema_ok = True
+    return conn
+
+
+def metricas_gerais(conn) -> dict:
+    """Métricas sem filtro, lidas das tabelas de resumo."""
+    por_dia = conn.execute(
+        "SELECT dia, total FROM resumo_dia ORDER BY dia DESC LIMIT ?", (DIAS_GRAFICO,)
+    ).fetchall()
+    return {
+        "total_usuarios": conn.execute("SELECT COUNT(*) FROM resumo_usuario").fetchone()[0],
+        "total_perguntas": conn.execute("SELECT coalesce(SUM(total), 0) FROM resumo_dia").fetchone()[0],
+        "perguntas_por_dia": [dict(linha) for linha in reversed(por_dia)],
+        "perguntas_mais_frequentes": [dict(linha) for linha in conn.execute(
+            "SELECT pergunta, total FROM resumo_pergunta ORDER BY total DESC LIMIT ?", (TOP_PERGUNTAS,)
+        )],
+        "perguntas_por_aula": [dict(linha) for linha in conn.execute(
+            "SELECT modulo, aula, total FROM resumo_aula ORDER BY total DESC LIMIT ?", (TOP_PERGUNTAS,)
+        )],
+    }
+
+
+def metricas_filtradas(conn, where: str, params: list) -> dict:
+    """As mesmas métricas, calculadas sobre as linhas de logs que passam nos filtros."""
+    total_perguntas, total_usuarios = conn.execute(
+        f"SELECT COUNT(*), COUNT(DISTINCT usuario) FROM logs{where}", params
+    ).fetchone()
+    por_dia = conn.execute(
+        f"SELECT substr(data, 1, 10) AS dia, COUNT(*) AS total FROM logs{where} "
+        "GROUP BY dia ORDER BY dia DESC LIMIT ?", params + [DIAS_GRAFICO]
+    ).fetchall()
+    filtro_chave = f"{where} AND chave_pergunta != ''" if where else " WHERE chave_pergunta != ''"
+    return {
+        "total_usuarios": total_usuarios,
+        "total_perguntas": total_perguntas,
+        "perguntas_por_dia": [dict(linha) for linha in reversed(por_dia)],
+        "perguntas_mais_frequentes": [dict(linha) for linha in conn.execute(
+            f"SELECT substr(MIN(pergunta), 1, 200) AS pergunta, COUNT(*) AS total FROM logs{filtro_chave} "
+            "GROUP BY chave_pergunta ORDER BY total DESC LIMIT ?", params + [TOP_PERGUNTAS]
+        )],
+        "perguntas_por_aula": [dict(linha) for linha in conn.execute(
+            f"SELECT coalesce(modulo, '') AS modulo, coalesce(aula, '') AS aula, COUNT(*) AS total FROM logs{where} "
+            "GROUP BY 1, 2 ORDER BY total DESC LIMIT ?", params + [TOP_PERGUNTAS]
+        )],
+    }
+
+
+def listar_logs(conn, where: str, params: list, ate_id: Optional[int] = None):
+    """
+    Uma página de logs, do mais recente para o mais antigo. A paginação é por
+    id (keyset): a página seguinte começa abaixo do último id mostrado.
+    Retorna (linhas, id para a próxima página ou None).
+    """
+    if ate_id:
+        where = f"{where} AND id < ?" if where else " WHERE id < ?"
+        params = params + [ate_id]
+    linhas = conn.execute(
+        "SELECT id, data, usuario, modulo, aula, coalesce(pergunta, '') AS pergunta, "
+        f"substr(coalesce(resposta, ''), 1, 2000) AS resposta FROM logs{where} "
+        "ORDER BY id DESC LIMIT ?", params + [LOGS_POR_PAGINA + 1]
+    ).fetchall()
+    proximo = linhas[LOGS_POR_PAGINA - 1]["id"] if len(linhas) > LOGS_POR_PAGINA else None
+    return linhas[:LOGS_POR_PAGINA], proximo
+
+
+def _destacar(trecho: str) -> Markup:
+    """Trecho do snippet() como HTML seguro: sem tags da resposta, termos encontrados em <mark>."""
+    texto = str(escape(re.sub(r"<[^>]*>", " ", trecho or "")))
+    return Markup(texto.replace("\x02", "<mark>").replace("\x03", "</mark>"))
+
+
+def buscar_logs(conn, consulta: str, where: str, params: list, pagina: int = 0):
+    """
+    Resultados da busca por palavra-chave (`consulta` no formato de
+    db_logs.consulta_fts), dos mais relevantes para os menos (bm25, com peso
+    maior para a pergunta). Como a ordem é por relevância, a paginação é por
+    deslocamento. Retorna (linhas, próxima página ou None).
+    """
+    outros = where.replace(" WHERE ", " AND ", 1)
+    linhas = conn.execute(
+        "SELECT logs.id, data, usuario, modulo, aula, "
+        "snippet(logs_fts, 0, char(2), char(3), '…', 16) AS trecho_pergunta, "
+        "snippet(logs_fts, 1, char(2), char(3), '…', 24) AS trecho_resposta "
+        "FROM logs_fts JOIN logs ON logs.id = logs_fts.rowid "
+        f"WHERE logs_fts MATCH ?{outros} ORDER BY bm25(logs_fts, 2.0, 1.0) LIMIT ? OFFSET ?",
+        [consulta] + params + [LOGS_POR_PAGINA + 1, pagina * LOGS_POR_PAGINA],
+    ).fetchall()
+    resultado = [
+        {**dict(linha), "trecho_pergunta": _destacar(linha["trecho_pergunta"]),
+         "trecho_resposta": _destacar(linha["trecho_resposta"])}
+        for linha in linhas[:LOGS_POR_PAGINA]
+    ]
+    return resultado, (pagina + 1 if len(linhas) > LOGS_POR_PAGINA else None)
+
+
+@router.get("/dashboard", response_class=HTMLResponse)
+def dashboard(
+    request: Request,
+    usuario: str = "",
+    modulo: str = "",
+    palavra: str = "",
+    data_inicio: str = "",
+    data_fim: str = "",
+    ate_id: Optional[int] = None,
+    pagina: int = 0,
+    user: str = Depends(get_current_user),
+):
+    filtros = {
+        "usuario": usuario, "modulo": modulo, "palavra": palavra,
+        "data_inicio": data_inicio, "data_fim": data_fim,
+    }
+    inicio, fim = _data(data_inicio, "data_inicio"), _data(data_fim, "data_fim")
+    where, params = montar_filtros(usuario, modulo, inicio, fim, palavra)
+    busca = consulta_fts(palavra) if palavra and FTS_DISPONIVEL else ""
+    conn = _conectar()
+    try:
+        metricas = metricas_filtradas(conn, where, params) if where else metricas_gerais(conn)
+        if busca:
+            where_outros, params_outros = montar_filtros(usuario, modulo, inicio, fim)
+            logs, proxima = buscar_logs(conn, busca, where_outros, params_outros, max(pagina, 0))
+            proximos = {"pagina": proxima}
+        else:
+            logs, proximo = listar_logs(conn, where, params, ate_id)
+            proximos = {"ate_id": proximo}
+    finally:
+        conn.close()
+
+    link_mais_antigos = None
+    if all(proximos.values()):
+        link_mais_antigos = "?" + urlencode({**{k: v for k, v in filtros.items() if v}, **proximos})
+    return templates.TemplateResponse("dashboard.html", {
+        "request": request,
+        **metricas,
+        "logs": logs,
+        "link_mais_antigos": link_mais_antigos,
+        **{f"filtro_{k}": v for k, v in filtros.items()},
+    })
+
+
+@router.get("/dashboard/export")
+def dashboard_export(
+    usuario: str = "",
+    modulo: str = "",
+    palavra: str = "",
+    data_inicio: str = "",
+    data_fim: str = "",
+    user: str = Depends(get_current_user),
+):
+    """CSV (em streaming) dos logs que passam nos filtros atuais do dashboard."""
+    colunas = [c for c in COLUNAS_EXPORTAVEIS if c != "contexto"]
+    _conectar().close()
+    sql, params = montar_consulta(
+        colunas, usuario, modulo, _data(data_inicio, "data_inicio"), _data(data_fim, "data_fim"), palavra
+    )
+    return StreamingResponse(
+        exportar(colunas, sql, params),
+        media_type="text/csv",
+        headers={"Content-Disposition": "attachment; filename=dashboard_logs.csv"},
+    )
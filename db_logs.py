@@ -1,12 +1,107 @@
+import atexit
+import os
+import queue
+import re
 import sqlite3
+import threading
+import time
+from collections import Counter
 from datetime import datetime
 
+from lexical_search import normalize_key
+
 DB_PATH = "logs.db"
 
-def registrar_log(usuario, pergunta, resposta, contexto, tipo_prompt, modulo=None, aula=None, data=None):
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
+# Fila de logs em memória, gravada em lotes por uma thread de fundo
+LOG_FILA_MAX = int(os.getenv("LOG_FILA_MAX", "10000"))
+LOG_LOTE_MAX = int(os.getenv("LOG_LOTE_MAX", "200"))
+LOG_INTERVALO = float(os.getenv("LOG_INTERVALO", "1.0"))  # segundos
+# Novas tentativas do lote em erro transitório ("database is locked"), com espera dobrando
+LOG_TENTATIVAS = int(os.getenv("LOG_TENTATIVAS", "5"))
+LOG_ESPERA_INICIAL = float(os.getenv("LOG_ESPERA_INICIAL", "0.2"))  # segundos
+
+COLUNAS_LOG = ("usuario", "pergunta", "resposta", "contexto", "tipo_prompt", "modulo", "aula", "data", "tokens_prompt")
+
+
+# Agregados do dashboard, atualizados a cada lote gravado (UPSERT na mesma transação)
+TABELAS_RESUMO = """
+    CREATE TABLE IF NOT EXISTS resumo_dia (
+        dia TEXT PRIMARY KEY,
+        total INTEGER NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS resumo_usuario (
+        usuario TEXT PRIMARY KEY,
+        total INTEGER NOT NULL,
+        ultima TEXT
+    );
+    CREATE TABLE IF NOT EXISTS resumo_aula (
+        modulo TEXT NOT NULL,
+        aula TEXT NOT NULL,
+        total INTEGER NOT NULL,
+        PRIMARY KEY (modulo, aula)
+    );
+    CREATE TABLE IF NOT EXISTS resumo_pergunta (
+        chave TEXT PRIMARY KEY,
+        pergunta TEXT,
+        total INTEGER NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_resumo_pergunta_total ON resumo_pergunta(total DESC);
+    CREATE INDEX IF NOT EXISTS idx_logs_data ON logs(data);
+    CREATE INDEX IF NOT EXISTS idx_logs_usuario ON logs(usuario, data);
+    CREATE INDEX IF NOT EXISTS idx_logs_modulo ON logs(modulo, data);
+    CREATE INDEX IF NOT EXISTS idx_logs_chave ON logs(chave_pergunta);
+"""
+
+
+# Busca por palavra-chave no dashboard: índice FTS5 (external content) sobre
+# pergunta/resposta, mantido pelos triggers. remove_diacritics faz "preco"
+# encontrar "preço".
+TABELA_FTS = """
+    CREATE VIRTUAL TABLE IF NOT EXISTS logs_fts USING fts5(
+        pergunta, resposta,
+        content='logs', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    );
+    CREATE TRIGGER IF NOT EXISTS logs_fts_ai AFTER INSERT ON logs BEGIN
+        INSERT INTO logs_fts (rowid, pergunta, resposta) VALUES (new.id, new.pergunta, new.resposta);
+    END;
+    CREATE TRIGGER IF NOT EXISTS logs_fts_ad AFTER DELETE ON logs BEGIN
+        INSERT INTO logs_fts (logs_fts, rowid, pergunta, resposta) VALUES ('delete', old.id, old.pergunta, old.resposta);
+    END;
+    CREATE TRIGGER IF NOT EXISTS logs_fts_au AFTER UPDATE OF pergunta, resposta ON logs BEGIN
+        INSERT INTO logs_fts (logs_fts, rowid, pergunta, resposta) VALUES ('delete', old.id, old.pergunta, old.resposta);
+        INSERT INTO logs_fts (rowid, pergunta, resposta) VALUES (new.id, new.pergunta, new.resposta);
+    END;
+"""
+
+
+def _tem_fts5() -> bool:
+    try:
+        sqlite3.connect(":memory:").execute("CREATE VIRTUAL TABLE t USING fts5(x)")
+        return True
+    except sqlite3.OperationalError:
+        return False
+
+
+# Sem FTS5 no SQLite do servidor, a busca volta a ser LIKE
+FTS_DISPONIVEL = _tem_fts5()
+
+
+def _tabela_existe(cursor, nome: str) -> bool:
+    return cursor.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (nome,)).fetchone() is not None
+
 
+def _garantir_colunas(cursor):
+    """Bancos criados antes das colunas novas ganham as colunas na primeira gravação."""
+    colunas = {linha[1] for linha in cursor.execute("PRAGMA table_info(logs)")}
+    if "tokens_prompt" not in colunas:
+        cursor.execute("ALTER TABLE logs ADD COLUMN tokens_prompt INTEGER")
+    if "chave_pergunta" not in colunas:
+        cursor.execute("ALTER TABLE logs ADD COLUMN chave_pergunta TEXT")
+
+
+def criar_tabela(conn):
+    cursor = conn.cursor()
     cursor.execute("""
         CREATE TABLE IF NOT EXISTS logs (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -17,16 +112,260 @@ def registrar_log(usuario, pergunta, resposta, contexto, tipo_prompt, modulo=Non
             tipo_prompt TEXT,
             modulo TEXT,
             aula TEXT,
-            data TEXT DEFAULT CURRENT_TIMESTAMP
+            data TEXT DEFAULT CURRENT_TIMESTAMP,
+            tokens_prompt INTEGER,
+            chave_pergunta TEXT
         )
     """)
+    _garantir_colunas(cursor)
+    resumos_novos = not _tabela_existe(cursor, "resumo_dia")
+    fts_novo = not _tabela_existe(cursor, "logs_fts")
+    conn.commit()
+    conn.executescript(TABELAS_RESUMO)
+    if resumos_novos:
+        reconstruir_resumos(conn)
+    if FTS_DISPONIVEL:
+        conn.executescript(TABELA_FTS)
+        if fts_novo:
+            print("🔤 Indexando os logs existentes para a busca por palavra-chave...")
+            with conn:
+                conn.execute("INSERT INTO logs_fts (logs_fts) VALUES ('rebuild')")
+
+
+def chave_pergunta(pergunta: str) -> str:
+    """Pergunta normalizada (minúsculas, sem acentos/pontuação) para contar repetições."""
+    return normalize_key(pergunta)[:200]
+
+
+def consulta_fts(texto: str) -> str:
+    """
+    Converte o texto digitado numa consulta FTS5 sem operadores do usuário:
+    cada palavra vira um prefixo entre aspas e todas são obrigatórias
+    ("cobrar consulta" -> "cobrar"* "consulta"*). Retorna "" se não houver palavras.
+    """
+    return " ".join(f'"{palavra}"*' for palavra in re.findall(r"\w+", texto))
+
+
+def _dia(data) -> str:
+    return str(data or "")[:10]
+
+
+def atualizar_resumos(conn, registros: list):
+    """Soma os `registros` (tuplas de COLUNAS_LOG + chave) nos agregados do dashboard."""
+    por_dia, por_aula, por_pergunta = Counter(), Counter(), Counter()
+    por_usuario, ultima, texto_pergunta = Counter(), {}, {}
+    for usuario, pergunta, _, _, _, modulo, aula, data, _, chave in registros:
+        por_dia[_dia(data)] += 1
+        por_usuario[usuario] += 1
+        ultima[usuario] = max(ultima.get(usuario, ""), str(data or ""))
+        por_aula[(str(modulo or ""), str(aula or ""))] += 1
+        if chave:
+            por_pergunta[chave] += 1
+            texto_pergunta.setdefault(chave, (pergunta or "")[:200])
+
+    conn.executemany("""
+        INSERT INTO resumo_dia (dia, total) VALUES (?, ?)
+        ON CONFLICT(dia) DO UPDATE SET total = total + excluded.total
+    """, por_dia.items())
+    conn.executemany("""
+        INSERT INTO resumo_usuario (usuario, total, ultima) VALUES (?, ?, ?)
+        ON CONFLICT(usuario) DO UPDATE SET
+            total = total + excluded.total,
+            ultima = max(coalesce(ultima, ''), excluded.ultima)
+    """, [(u, n, ultima[u]) for u, n in por_usuario.items()])
+    conn.executemany("""
+        INSERT INTO resumo_aula (modulo, aula, total) VALUES (?, ?, ?)
+        ON CONFLICT(modulo, aula) DO UPDATE SET total = total + excluded.total
+    """, [(m, a, n) for (m, a), n in por_aula.items()])
+    conn.executemany("""
+        INSERT INTO resumo_pergunta (chave, pergunta, total) VALUES (?, ?, ?)
+        ON CONFLICT(chave) DO UPDATE SET total = total + excluded.total
+    """, [(c, texto_pergunta[c], n) for c, n in por_pergunta.items()])
 
+
+def reconstruir_resumos(conn):
+    """Recalcula os agregados a partir da tabela logs (bancos antigos ou correções manuais)."""
+    print("📊 Recalculando os agregados do dashboard a partir dos logs...")
+    with conn:
+        conn.executemany(
+            "UPDATE logs SET chave_pergunta = ? WHERE id = ?",
+            [(chave_pergunta(p), i) for i, p in conn.execute(
+                "SELECT id, pergunta FROM logs WHERE chave_pergunta IS NULL"
+            )],
+        )
+        for tabela in ("resumo_dia", "resumo_usuario", "resumo_aula", "resumo_pergunta"):
+            conn.execute(f"DELETE FROM {tabela}")
+        conn.execute("""
+            INSERT INTO resumo_dia (dia, total)
+            SELECT substr(data, 1, 10), COUNT(*) FROM logs GROUP BY 1
+        """)
+        conn.execute("""
+            INSERT INTO resumo_usuario (usuario, total, ultima)
+            SELECT usuario, COUNT(*), MAX(data) FROM logs GROUP BY usuario
+        """)
+        conn.execute("""
+            INSERT INTO resumo_aula (modulo, aula, total)
+            SELECT coalesce(modulo, ''), coalesce(aula, ''), COUNT(*) FROM logs GROUP BY 1, 2
+        """)
+        conn.execute("""
+            INSERT INTO resumo_pergunta (chave, pergunta, total)
+            SELECT chave_pergunta, substr(MIN(pergunta), 1, 200), COUNT(*) FROM logs
+            WHERE chave_pergunta != '' GROUP BY chave_pergunta
+        """)
+
+
+def gravar_lote(conn, registros: list):
+    """
+    Insere os `registros` (tuplas na ordem de COLUNAS_LOG) e atualiza os
+    agregados do dashboard, tudo numa única transação.
+    """
+    registros = [r + (chave_pergunta(r[1]),) for r in registros]
+    colunas = COLUNAS_LOG + ("chave_pergunta",)
+    with conn:
+        conn.executemany(
+            f"INSERT INTO logs ({', '.join(colunas)}) VALUES ({', '.join('?' * len(colunas))})",
+            registros,
+        )
+        atualizar_resumos(conn, registros)
+
+
+class LogWriter:
+    """
+    Grava os logs fora do caminho da requisição: `registrar` só enfileira; uma
+    thread de fundo com uma conexão persistente (WAL) grava com executemany,
+    em lotes de até `lote_max` ou a cada `intervalo` segundos. Com a fila
+    cheia, o registro é descartado (e contado) em vez de travar a rota.
+    Um lote que falha por erro transitório do SQLite (banco travado pelo
+    dashboard/exportação) é regravado até LOG_TENTATIVAS vezes antes de ser
+    descartado; a fila continua recebendo registros enquanto isso.
+    """
+
+    _PARAR = object()
+
+    def __init__(self, caminho: str = DB_PATH, max_fila: int = LOG_FILA_MAX,
+                 lote_max: int = LOG_LOTE_MAX, intervalo: float = LOG_INTERVALO):
+        self.caminho = caminho
+        self.lote_max = lote_max
+        self.intervalo = intervalo
+        self._fila = queue.Queue(maxsize=max_fila)
+        self._thread = None
+        self._lock = threading.Lock()
+        self.gravados = 0
+        self.descartados = 0
+        self.lotes = 0
+        self.erros = 0
+
+    def iniciar(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._loop, name="log-writer", daemon=True)
+                self._thread.start()
+
+    def registrar(self, registro: tuple) -> bool:
+        """Enfileira um registro; retorna False se a fila estava cheia e ele foi descartado."""
+        self.iniciar()
+        try:
+            self._fila.put_nowait(registro)
+            return True
+        except queue.Full:
+            with self._lock:
+                self.descartados += 1
+            return False
+
+    def flush(self, timeout: float = 10.0) -> bool:
+        """Espera a gravação de tudo o que já foi enfileirado."""
+        if self._thread is None or not self._thread.is_alive():
+            return self._fila.empty()
+        pronto = threading.Event()
+        try:
+            self._fila.put(pronto, timeout=timeout)
+        except queue.Full:
+            return False
+        return pronto.wait(timeout)
+
+    def parar(self, timeout: float = 10.0):
+        """Grava o que estiver na fila e encerra a thread (chamado no shutdown)."""
+        if self._thread is None or not self._thread.is_alive():
+            return
+        try:
+            self._fila.put(self._PARAR, timeout=timeout)
+        except queue.Full:
+            pass
+        self._thread.join(timeout)
+
+    def stats(self) -> dict:
+        return {
+            "fila": self._fila.qsize(),
+            "gravados": self.gravados,
+            "descartados": self.descartados,
+            "lotes": self.lotes,
+            "erros": self.erros,
+        }
+
+    def _gravar(self, conn, lote: list):
+        if not lote:
+            return
+        espera = LOG_ESPERA_INICIAL
+        for tentativa in range(1, LOG_TENTATIVAS + 1):
+            try:
+                gravar_lote(conn, lote)  # transação única: em erro, nada fica gravado
+                self.gravados += len(lote)
+                self.lotes += 1
+                return
+            except sqlite3.OperationalError as e:
+                self.erros += 1
+                if tentativa == LOG_TENTATIVAS:
+                    erro = e
+                    break
+                print(f"⚠️ Falha ao gravar {len(lote)} log(s), tentativa {tentativa}; nova tentativa em {espera:.1f}s:", repr(e))
+                time.sleep(espera)
+                espera *= 2
+            except sqlite3.Error as e:
+                self.erros += 1
+                erro = e
+                break
+        with self._lock:
+            self.descartados += len(lote)
+        print(f"❌ {len(lote)} log(s) descartado(s) após falha na gravação:", repr(erro))
+
+    def _loop(self):
+        conn = sqlite3.connect(self.caminho)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        criar_tabela(conn)
+
+        lote, avisos = [], []
+        limite = time.monotonic() + self.intervalo
+        while True:
+            try:
+                item = self._fila.get(timeout=max(limite - time.monotonic(), 0.0))
+            except queue.Empty:
+                item = None
+
+            parar = item is self._PARAR
+            if isinstance(item, threading.Event):
+                avisos.append(item)
+            elif item is not None and not parar:
+                lote.append(item)
+
+            if parar or avisos or len(lote) >= self.lote_max or time.monotonic() >= limite:
+                self._gravar(conn, lote)
+                lote = []
+                for aviso in avisos:
+                    aviso.set()
+                avisos = []
+                limite = time.monotonic() + self.intervalo
+            if parar:
+                break
+        conn.close()
+
+
+log_writer = LogWriter()
+atexit.register(log_writer.parar)
+
+
+def registrar_log(usuario, pergunta, resposta, contexto, tipo_prompt, modulo=None, aula=None, data=None, tokens_prompt=None):
+    """Enfileira o log da interação; a gravação no SQLite é feita em lote pelo log_writer."""
     if data is None:
         data = datetime.now().isoformat()
-    cursor.execute("""
-        INSERT INTO logs (usuario, pergunta, resposta, contexto, tipo_prompt, modulo, aula, data)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-    """, (usuario, pergunta, resposta, contexto, tipo_prompt, modulo, aula, data))
-
-    conn.commit()
-    conn.close()
+    return log_writer.registrar((usuario, pergunta, resposta, contexto, tipo_prompt, modulo, aula, data, tokens_prompt))
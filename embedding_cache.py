@@ -0,0 +1,151 @@
+# embedding_cache.py
+# Cache de embeddings das perguntas: LRU em memória + SQLite em disco.
+# Perguntas repetidas ("sim", quick replies, ...) não voltam à API de embeddings.
+
+import asyncio
+import os
+import re
+import sqlite3
+import threading
+from array import array
+from collections import OrderedDict
+from datetime import datetime
+
+from openai import AsyncOpenAI, OpenAI
+
+EMBED_MODEL = "text-embedding-3-small"
+EMBEDDING_CACHE_DB = os.getenv("EMBEDDING_CACHE_DB", "embeddings_cache.db")
+EMBEDDING_CACHE_MAX = int(os.getenv("EMBEDDING_CACHE_MAX", "2048"))
+# Timeout curto: se a API demorar, o search_engine cai para a busca lexical
+EMBEDDING_TIMEOUT = float(os.getenv("EMBEDDING_TIMEOUT", "5"))
+
+client = OpenAI(timeout=EMBEDDING_TIMEOUT, max_retries=1)
+aclient = AsyncOpenAI(timeout=EMBEDDING_TIMEOUT, max_retries=1)
+
+
+def normalizar_texto(texto: str) -> str:
+    """Normaliza a pergunta para servir de chave: minúsculas, espaços colapsados, sem pontuação final."""
+    texto = re.sub(r"\s+", " ", (texto or "").strip().lower())
+    return texto.rstrip(" .!?…;,")
+
+
+class CacheEmbeddings:
+    """
+    LRU limitado em memória com persistência em SQLite que sobrevive a reinícios.
+    A memória e o disco têm locks separados: a consulta em memória nunca espera
+    um commit, e pode rodar no event loop (buscar_memoria).
+    """
+
+    def __init__(self, caminho: str, max_itens: int, modelo: str):
+        self.caminho = caminho
+        self.max_itens = max_itens
+        self.modelo = modelo
+        self._memoria = OrderedDict()
+        self._lock = threading.Lock()  # memória e contadores
+        self._lock_disco = threading.Lock()  # conexão SQLite
+        self.hits_memoria = 0
+        self.hits_disco = 0
+        self.misses = 0
+
+        self._conn = sqlite3.connect(caminho, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                modelo TEXT,
+                chave TEXT,
+                vetor BLOB,
+                criado_em TEXT,
+                PRIMARY KEY (modelo, chave)
+            )
+        """)
+        self._conn.commit()
+
+    def _guardar_memoria(self, chave: str, vetor: list):
+        self._memoria[chave] = vetor
+        self._memoria.move_to_end(chave)
+        while len(self._memoria) > self.max_itens:
+            self._memoria.popitem(last=False)
+
+    def buscar_memoria(self, texto: str):
+        """Só a LRU em memória (sem I/O); None se a pergunta não estiver nela."""
+        chave = normalizar_texto(texto)
+        with self._lock:
+            vetor = self._memoria.get(chave)
+            if vetor is not None:
+                self._memoria.move_to_end(chave)
+                self.hits_memoria += 1
+            return vetor
+
+    def get(self, texto: str):
+        vetor = self.buscar_memoria(texto)
+        if vetor is not None:
+            return vetor
+
+        chave = normalizar_texto(texto)
+        with self._lock_disco:
+            linha = self._conn.execute(
+                "SELECT vetor FROM embeddings WHERE modelo = ? AND chave = ?",
+                (self.modelo, chave),
+            ).fetchone()
+        with self._lock:
+            if linha is None:
+                self.misses += 1
+                return None
+            vetor = array("f")
+            vetor.frombytes(linha[0])
+            vetor = vetor.tolist()
+            self._guardar_memoria(chave, vetor)
+            self.hits_disco += 1
+            return vetor
+
+    def put(self, texto: str, vetor: list):
+        chave = normalizar_texto(texto)
+        with self._lock:
+            self._guardar_memoria(chave, list(vetor))
+        with self._lock_disco:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO embeddings (modelo, chave, vetor, criado_em) VALUES (?, ?, ?, ?)",
+                (self.modelo, chave, array("f", vetor).tobytes(), datetime.now().isoformat()),
+            )
+            self._conn.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits_memoria": self.hits_memoria,
+                "hits_disco": self.hits_disco,
+                "misses": self.misses,
+                "itens_memoria": len(self._memoria),
+            }
+
+
+cache_embeddings = CacheEmbeddings(EMBEDDING_CACHE_DB, EMBEDDING_CACHE_MAX, EMBED_MODEL)
+
+
+def obter_embedding(texto: str) -> list:
+    """Embedding da pergunta, consultando o cache antes de chamar a API da OpenAI."""
+    vetor = cache_embeddings.get(texto)
+    if vetor is not None:
+        return vetor
+
+    res = client.embeddings.create(model=EMBED_MODEL, input=texto.replace("\n", " "))
+    vetor = res.data[0].embedding
+    cache_embeddings.put(texto, vetor)
+    return vetor
+
+
+async def obter_embedding_async(texto: str) -> list:
+    """
+    Versão assíncrona de obter_embedding (não prende uma thread durante a chamada
+    à API). Só a consulta em memória roda no event loop; o SQLite vai para thread.
+    """
+    vetor = cache_embeddings.buscar_memoria(texto)
+    if vetor is not None:
+        return vetor
+    vetor = await asyncio.to_thread(cache_embeddings.get, texto)
+    if vetor is not None:
+        return vetor
+
+    res = await aclient.embeddings.create(model=EMBED_MODEL, input=texto.replace("\n", " "))
+    vetor = res.data[0].embedding
+    await asyncio.to_thread(cache_embeddings.put, texto, vetor)
+    return vetor
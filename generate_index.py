@@ -1,41 +1,194 @@
+import json
 import os
+import re
 import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
 from llama_index.core import (
-    SimpleDirectoryReader,
     GPTVectorStoreIndex,
     Settings
 )
+from llama_index.core.schema import MetadataMode
 from llama_index.embeddings.openai import OpenAIEmbedding
 
-# Caminho de saída
+from chunker import dividir_transcricoes, chunks_para_nodes, gravar_versao_indice
+from embedding_cache import EMBED_MODEL
+from lexical_search import construir_indice
+from vector_store import (
+    FAISS_INDEX_TYPE,
+    exportar_faiss,
+    exportar_numpy,
+    exportar_side_store,
+    faiss_disponivel,
+    numpy_disponivel,
+)
+
+# Caminho de saída (link simbólico para a versão ativa do índice)
 INDEX_DIR = "storage"
+VECTOR_STORE_FILE = "default__vector_store.json"
+MANIFEST_FILE = "manifest.json"
 
-# Apaga índice antigo (importante!)
-if os.path.exists(INDEX_DIR):
-    print("🧹 Limpando índice anterior...")
-    shutil.rmtree(INDEX_DIR)
+# Embeddings novos são gerados em lotes grandes, vários lotes em paralelo
+LOTE_EMBEDDINGS = int(os.getenv("INDEX_LOTE_EMBEDDINGS", "100"))
+CONCORRENCIA_EMBEDDINGS = int(os.getenv("INDEX_CONCORRENCIA_EMBEDDINGS", "4"))
 
-# Carrega a chave da API da OpenAI
-api_key = os.getenv("OPENAI_API_KEY")
-if not api_key:
-    raise ValueError("❌ OPENAI_API_KEY não encontrada nas variáveis de ambiente.")
+# Versões do índice mantidas no disco (a publicada + as anteriores, para rollback)
+INDEX_VERSOES_MANTIDAS = int(os.getenv("INDEX_VERSOES_MANTIDAS", "2"))
 
-# Define o modelo de embedding
-Settings.embed_model = OpenAIEmbedding(
-    model="text-embedding-3-small",
-    api_key=api_key,
-)
 
-# Lê os dados da transcrição
-print("📄 Lendo o arquivo transcricoes.txt...")
-documents = SimpleDirectoryReader(input_files=["transcricoes.txt"]).load_data()
+def carregar_embeddings_existentes(persist_dir: str) -> dict:
+    """
+    Embeddings do índice atual, por id de trecho. Como o id é o hash do
+    conteúdo + metadados, um id igual significa trecho inalterado.
+    Retorna {} se não houver índice ou se o modelo de embedding mudou.
+    """
+    try:
+        with open(os.path.join(persist_dir, MANIFEST_FILE), encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("modelo") != EMBED_MODEL:
+            print("♻️ Modelo de embedding mudou; todos os trechos serão reprocessados.")
+            return {}
+        with open(os.path.join(persist_dir, VECTOR_STORE_FILE), encoding="utf-8") as f:
+            return json.load(f).get("embedding_dict", {})
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def embutir_em_lotes(nodes: list) -> None:
+    """Gera os embeddings dos `nodes` em lotes concorrentes e grava em node.embedding."""
+    lotes = [nodes[i:i + LOTE_EMBEDDINGS] for i in range(0, len(nodes), LOTE_EMBEDDINGS)]
+
+    def _embutir(lote):
+        textos = [n.get_content(metadata_mode=MetadataMode.EMBED) for n in lote]
+        return lote, Settings.embed_model.get_text_embedding_batch(textos)
+
+    with ThreadPoolExecutor(max_workers=CONCORRENCIA_EMBEDDINGS) as executor:
+        for lote, embeddings in executor.map(_embutir, lotes):
+            for node, embedding in zip(lote, embeddings):
+                node.embedding = embedding
+
+
+def versoes_indice(destino: str = INDEX_DIR) -> list:
+    """Pastas de versão do índice (`storage.<timestamp>`), da mais antiga para a mais nova."""
+    base = os.path.dirname(os.path.abspath(destino))
+    padrao = re.compile(re.escape(os.path.basename(destino)) + r"\.\d{20}")
+    return sorted(
+        os.path.join(base, nome) for nome in os.listdir(base)
+        if padrao.fullmatch(nome) and os.path.isdir(os.path.join(base, nome))
+    )
+
+
+def trocar_indice(nova_versao: str, destino: str = INDEX_DIR) -> None:
+    """
+    Publica `nova_versao` trocando o link simbólico `destino` de forma atômica
+    (os.replace). Depois da troca, apaga só as versões mais antigas que a
+    publicada além das INDEX_VERSOES_MANTIDAS mais recentes: a anterior fica
+    para os workers que ainda a têm aberta (mmap) e para rollback, e pastas mais
+    novas (build concorrente em andamento) e o `.legado` nunca são tocados.
+    """
+    link_tmp = f"{destino}.link.{os.getpid()}"
+    if os.path.lexists(link_tmp):
+        os.remove(link_tmp)
+    os.symlink(os.path.basename(nova_versao), link_tmp)
+
+    if os.path.isdir(destino) and not os.path.islink(destino):
+        # índice legado (diretório comum): move para o lado antes da primeira troca;
+        # se já houver um .legado (segunda migração), o novo ganha um sufixo de data
+        legado = destino + ".legado"
+        if os.path.lexists(legado):
+            legado = f"{legado}.{datetime.now().strftime('%Y%m%d%H%M%S%f')}"
+        os.rename(destino, legado)
+    os.replace(link_tmp, destino)
+
+    publicada = os.path.abspath(nova_versao)
+    anteriores = [v for v in versoes_indice(destino) if v < publicada]
+    manter = max(INDEX_VERSOES_MANTIDAS - 1, 0)
+    for caminho in anteriores[:max(len(anteriores) - manter, 0)]:
+        print(f"🗑️ Removendo versão antiga do índice: {os.path.basename(caminho)}")
+        shutil.rmtree(caminho, ignore_errors=True)
+
+
+def gerar_indice() -> dict:
+    inicio = time.perf_counter()
+
+    # Lê os dados da transcrição e divide por módulo/aula/tema
+    print("📄 Lendo o arquivo transcricoes.txt...")
+    with open("transcricoes.txt", encoding="utf-8") as f:
+        chunks = dividir_transcricoes(f.read())
+    print(f"✂️ {len(chunks)} trechos com metadados de módulo/aula.")
+
+    # Reaproveita os embeddings de trechos que não mudaram
+    existentes = carregar_embeddings_existentes(INDEX_DIR)
+    nodes = chunks_para_nodes(chunks)
+    novos = []
+    for node in nodes:
+        embedding = existentes.get(node.node_id)
+        if embedding is not None:
+            node.embedding = embedding
+        else:
+            novos.append(node)
+    ids_atuais = {node.node_id for node in nodes}
+    removidos = [i for i in existentes if i not in ids_atuais]
+
+    if novos:
+        print(f"🧠 Gerando embeddings de {len(novos)} trecho(s) novo(s) ou alterado(s)...")
+        embutir_em_lotes(novos)
+
+    # Gera o índice numa pasta nova; o índice em uso só é trocado no final
+    staging = f"{INDEX_DIR}.{datetime.now().strftime('%Y%m%d%H%M%S%f')}"
+    print(f"⚙️ Gerando o índice vetorial em {staging}...")
+    index = GPTVectorStoreIndex(nodes)
+    index.storage_context.persist(persist_dir=staging)
+    if numpy_disponivel():
+        print("📦 Exportando side store e matriz NumPy...")
+        exportar_side_store(staging, nodes)
+        exportar_numpy(staging, nodes, "transcricoes.txt")
+    if faiss_disponivel():
+        print(f"📦 Exportando índice FAISS ({FAISS_INDEX_TYPE})...")
+        exportar_faiss(staging, nodes)
+    gravar_versao_indice(staging)
+    with open(os.path.join(staging, MANIFEST_FILE), "w", encoding="utf-8") as f:
+        json.dump({
+            "modelo": EMBED_MODEL,
+            "gerado_em": datetime.now().isoformat(),
+            "trechos": len(nodes),
+            "faiss": FAISS_INDEX_TYPE if faiss_disponivel() else None,
+        }, f)
+
+    print(f"🔁 Publicando índice em: {INDEX_DIR}")
+    trocar_indice(staging)
+
+    # Índice lexical (BM25) usado no debug e como fallback da busca vetorial
+    print("🔤 Gerando o índice lexical...")
+    construir_indice()
+
+    return {
+        "reaproveitados": len(nodes) - len(novos),
+        "embutidos": len(novos),
+        "removidos": len(removidos),
+        "tempo_s": round(time.perf_counter() - inicio, 2),
+    }
+
 
-# Gera o índice
-print("⚙️ Gerando o índice vetorial...")
-index = GPTVectorStoreIndex.from_documents(documents)
+if __name__ == "__main__":
+    # Carrega a chave da API da OpenAI
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        raise ValueError("❌ OPENAI_API_KEY não encontrada nas variáveis de ambiente.")
 
-# Persiste no diretório
-print(f"💾 Salvando índice em: {INDEX_DIR}")
-index.storage_context.persist(persist_dir=INDEX_DIR)
+    # Define o modelo de embedding
+    Settings.embed_model = OpenAIEmbedding(
+        model=EMBED_MODEL,
+        api_key=api_key,
+    )
 
-print("✅ Índice criado com sucesso.")
+    relatorio = gerar_indice()
+    print("✅ Índice criado com sucesso.")
+    print(
+        f"📊 Reaproveitados: {relatorio['reaproveitados']} | "
+        f"Embutidos: {relatorio['embutidos']} | "
+        f"Removidos: {relatorio['removidos']} | "
+        f"Tempo: {relatorio['tempo_s']}s"
+    )
@@ -1,10 +1,17 @@
+import asyncio
 import os
-import re
 import random
-from openai import OpenAI, OpenAIError
+from openai import AsyncOpenAI
+
+from answer_cache import ANSWER_CACHE_ATIVO, cache_respostas, escopo_resposta
+from embedding_cache import obter_embedding_async
+from lexical_search import search_transcripts, normalize_key
+from intent_engine import classificar
+from prompt_builder import MODELO_LLM, cabecalho_trecho, montar_prompt, tokens_prompt
+from content_store import CONTEUDO_ATIVO, conteudo_aulas, versao_conteudo
 
 TRANSCRIPTS_PATH = os.path.join(os.path.dirname(__file__), "transcricoes.txt")
-client = OpenAI()
+aclient = AsyncOpenAI()
 
 OUT_OF_SCOPE_MSG = (
     "Desculpe, ainda não tenho informações suficientes sobre esse tema específico do curso. "
@@ -26,6 +33,34 @@ CLOSINGS = [
     "Essa resposta foi útil? Clique em 👍 ou 👎."
 ]
 
+# Textos fixos (também pré-gerados em áudio por prewarm_tts.py)
+MENSAGEM_BOAS_VINDAS = (
+    "Olá, Doutor(a)! Que bom te ver por aqui. 😊<br><br>"
+    "Pode perguntar qualquer coisa sobre o curso, sobre aulas, módulos, ou me contar sua realidade no consultório. Se quiser, pode dizer o módulo ou aula que está estudando, ou sua especialidade, que eu adapto a resposta para você.<br><br>"
+    "Se preferir, posso sugerir exemplos práticos, simulações, dicas de experiência ou Health Plan para a sua área.<br><br>"
+    "<b>No que posso te ajudar agora?</b>"
+)
+
+MENU_MODULOS = (
+    "O curso Consultório High Ticket é composto por 7 módulos principais, cada um trazendo competências-chave para o crescimento do seu consultório e sua carreira como Doutor(a).<br><br>"
+    "<b>Confira os módulos:</b><br>"
+    "<b>Módulo 01 – mentalidade high ticket: como desenvolver uma mente preparada para atrair pacientes high ticket</b><br>"
+    "<b>Módulo 02 – senso estético high ticket: como transformar sua imagem e ambiente para atrair pacientes que valorizam</b><br>"
+    "<b>Módulo 03 – posicionamento presencial high ticket: como construir autoridade sem redes sociais</b><br>"
+    "<b>Módulo 04 – a jornada do paciente high ticket: como transformar atendimento em encantamento e fidelização</b><br>"
+    "<b>Módulo 05 – estratégias de captação e fidelização: como atrair pacientes high ticket sem tráfego ou redes sociais</b><br>"
+    "<b>Módulo 06 – estratégias de vendas high ticket: como apresentar e fechar tratamentos de alto valor com ética</b><br>"
+    "<b>Módulo 07 – estratégias por especialidade</b><br><br>"
+    "Para começar, diga o número do módulo e da aula (ex: 'módulo 2, aula 2.3') ou responda 'sim' para começar do início."
+)
+
+# Cenários sem pergunta específica, em que a etapa da aula pode vir do conteúdo pré-gerado
+CENARIOS_CANONICOS = ("geral", "voltar")
+
+# Respostas curtas que avançam a etapa ("sim") ou a aula ("não", sem dúvidas)
+RESPOSTAS_SIM = ("sim", "sim desejo", "quero sim", "vamos", "ok")
+RESPOSTAS_NAO = ("não", "nao", "não tenho dúvida", "nao tenho duvida")
+
 AULAS_POR_MODULO = {
     1: ['1.1', '1.2', '1.3', '1.4', '1.5'],
     2: ['2.1', '2.2', '2.3', '2.4', '2.5', '2.6', '2.7', '2.8', '2.9'],
@@ -55,75 +90,33 @@ def resposta_link(titulo, url, icone="📄"):
 def resposta_link_externo(titulo, url, icone="🔗"):
     return f"<br><a class='chip' href='{url}' target='_blank'>{icone} {titulo}</a>"
 
-# >>>>> MELHORIA APENAS NA DETECÇÃO DE CENÁRIOS DE DÚVIDAS PRÁTICAS <<<<<
-def detectar_cenario(pergunta: str) -> str:
-    pergunta = pergunta.lower()
-    
-    # Especialidades médicas reconhecidas para o método
-    especialidades = [
-        "dermatologista", "psicóloga", "psicologo", "pediatra", "dentista",
-        "fonoaudióloga", "fonoaudiologo", "nutricionista", "veterinário", "veterinaria",
-        "psicanalista", "fisioterapeuta", "terapeuta", "acupunturista"
-    ]
-    # Termos que sugerem intenção de atrair, crescer, captar, faturar etc
-    termos_acao = [
-        "atrair", "captar", "faturar", "paciente high ticket", "crescer", "aplicar",
-        "ter mais pacientes", "dobrar faturamento", "ganhar mais", "aumentar", "consultório cheio",
-        "lotar agenda", "consultorio", "atendimento particular"
-    ]
+def formatar_contexto(chunks) -> str:
+    """Monta o bloco de contexto do prompt a partir dos trechos recuperados do índice."""
+    if not chunks:
+        return ""
+    if isinstance(chunks, str):
+        return chunks
+    partes = []
+    for i, chunk in enumerate(chunks, start=1):
+        partes.append(f"{cabecalho_trecho(i, chunk)}\n{chunk.get('texto', '')}")
+    return "\n\n".join(partes)
 
-    # Se mencionar especialidade + intenção prática, é dúvida pontual
-    if any(f"sou {esp}" in pergunta for esp in especialidades) and any(
-        t in pergunta for t in termos_acao
-    ):
-        return "duvida_pontual"
-    # Detecta perguntas tipo "como faço para", "como atrair", "quero aumentar"
-    if re.search(r"como\s+faço|como\s+atrair|quero\s+(aumentar|dobrar|captar|faturar|ter mais|consultório|consultorio|lotar)", pergunta):
-        return "duvida_pontual"
-    # Detecta dúvidas sobre módulos, aulas, navegação (MANTÉM O FLUXO DE MÓDULOS)
-    if any(p in pergunta for p in [
-        "quero fazer o curso completo", "começar do início", "me ensina tudo",
-        "fazer o curso com você", "menu", "ver módulos", "ver o curso", "ver estrutura", "iniciar o curso", "quero começar o curso"
-    ]):
-        return "curso_completo"
-    elif re.search(r'\bm[oó]dulo\s*\d+\b', pergunta) or re.search(r'\baula\s*\d+\.\d+\b', pergunta):
-        return "navegacao_especifica"
-    elif any(p in pergunta for p in ["voltar", "retornar", "anterior", "repetir aula"]):
-        return "voltar"
-    elif any(p in pergunta for p in [
-        "tenho uma dúvida", "tenho outra dúvida", "minha dúvida", "não entendi", "duvida", "dúvida", "me explica",
-        "poderia explicar", "por que", "como", "o que", "quais", "qual", "explique", "me fale", "exemplo", "caso prático",
-        "me mostre", "me explique", "?"
-    ]):
-        return "duvida_pontual"
-    elif any(p in pergunta for p in [
-        "exemplo prático", "me dá um exemplo", "passo a passo", "como fazer isso", "como faço", "me ensina", "ensinar", "me mostre como"
-    ]):
-        return "exemplo_pratico"
-    else:
-        return "geral"
-# <<<<< FIM DA MELHORIA APENAS NA DETECÇÃO DE CENÁRIOS DE DÚVIDAS PRÁTICAS >>>>>
+def detectar_cenario(pergunta: str) -> str:
+    return classificar(pergunta)["cenario"]
 
 def encontrar_modulo_aula(pergunta):
-    pergunta = pergunta.lower()
-    m_modulo = re.search(r'\bm[oó]dulo\s*(\d+)\b', pergunta)
-    m_aula = re.search(r'\baula\s*(\d+\.\d+)\b', pergunta)
-    modulo = None
-    aula = None
-    if m_modulo:
-        modulo = int(m_modulo.group(1))
-    if m_aula:
-        aula = m_aula.group(1)
-    return modulo, aula
-
-def atualizar_progresso(pergunta: str, progresso: dict) -> dict:
+    intencao = classificar(pergunta)
+    return intencao["modulo"], intencao["aula"]
+
+def atualizar_progresso(pergunta: str, progresso: dict, intencao: dict = None) -> dict:
     # Sempre começa pelo módulo 1
     if not progresso:
         return {'modulo': 1, 'aula': '1.1', 'etapa': 1, 'aguardando_duvida': False, 'visao_geral': True}
 
     pergunta_lower = pergunta.strip().lower()
-    modulo_nav, aula_nav = encontrar_modulo_aula(pergunta)
-    cenario = detectar_cenario(pergunta)
+    intencao = intencao or classificar(pergunta)
+    modulo_nav, aula_nav = intencao["modulo"], intencao["aula"]
+    cenario = intencao["cenario"]
 
     # Começar do início
     if cenario == "curso_completo":
@@ -150,7 +143,7 @@ def atualizar_progresso(pergunta: str, progresso: dict) -> dict:
                 return progresso
 
     # Voltar aula ou módulo
-    if any(p in pergunta_lower for p in ["voltar", "retornar", "anterior"]):
+    if intencao["voltar"]:
         modulo = progresso['modulo']
         aula_atual = progresso['aula']
         aulas = AULAS_POR_MODULO.get(modulo, [])
@@ -168,14 +161,14 @@ def atualizar_progresso(pergunta: str, progresso: dict) -> dict:
         return progresso
 
     # Repetir aula
-    if "repetir" in pergunta_lower:
+    if intencao["repetir"]:
         progresso['etapa'] = 1
         progresso['aguardando_duvida'] = False
         progresso['visao_geral'] = False
         return progresso
 
     # Avançar aula
-    if any(p in pergunta_lower for p in ["próxima aula", "avançar", "continuar", "pode avançar"]):
+    if intencao["avancar"]:
         modulo = progresso['modulo']
         aula_atual = progresso['aula']
         aulas = AULAS_POR_MODULO.get(modulo, [])
@@ -193,7 +186,7 @@ def atualizar_progresso(pergunta: str, progresso: dict) -> dict:
         return progresso
 
     # "Sim" deve AVANÇAR ETAPA ou IR PRA AULA
-    if pergunta_lower in ["sim", "sim desejo", "quero sim", "vamos", "ok"]:
+    if pergunta_lower in RESPOSTAS_SIM:
         if progresso.get('visao_geral', True):
             progresso['visao_geral'] = False
             progresso['modulo'] = 1
@@ -204,7 +197,7 @@ def atualizar_progresso(pergunta: str, progresso: dict) -> dict:
         else:
             progresso['aguardando_duvida'] = True
     # "Não" avança para próxima aula ou módulo
-    elif pergunta_lower in ["não", "nao", "não tenho dúvida", "nao tenho duvida"]:
+    elif pergunta_lower in RESPOSTAS_NAO:
         if progresso.get('aguardando_duvida'):
             progresso['aguardando_duvida'] = False
             modulo = progresso['modulo']
@@ -281,7 +274,62 @@ módulo 07 – estratégias por especialidade
 7.9. nutricionistas – estratégias high ticket para emagrecimento, nutrologia e endocrinologia
 """
 
-def generate_answer(question, context="", history=None, tipo_de_prompt=None, is_first_question=True):
+def _mensagens(prompt: str) -> list:
+    return [
+        {"role": "system", "content": "Responda SEMPRE em português do Brasil."},
+        {"role": "user", "content": prompt}
+    ]
+
+async def _chamar_llm_async(prompt: str) -> str:
+    response = await aclient.chat.completions.create(
+        model="gpt-4o-mini",
+        messages=_mensagens(prompt),
+        temperature=0.4,
+        max_tokens=900
+    )
+    return response.choices[0].message.content.strip()
+
+async def _chamar_llm_stream_async(prompt: str):
+    """Gera os pedaços de texto da resposta do LLM à medida que chegam."""
+    stream = await aclient.chat.completions.create(
+        model="gpt-4o-mini",
+        messages=_mensagens(prompt),
+        temperature=0.4,
+        max_tokens=900,
+        stream=True
+    )
+    async for chunk in stream:
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
+
+async def _consultar_cache_async(question, progresso, cenario, usar_cache=True):
+    """
+    Procura no cache semântico uma explicação para o mesmo ponto do curso.
+    Retorna (explicacao ou None, embedding da pergunta ou None).
+    """
+    if not (usar_cache and ANSWER_CACHE_ATIVO):
+        return None, None
+    try:
+        vetor = await obter_embedding_async(question)
+    except Exception:
+        return None, None
+    escopo = escopo_resposta(progresso, cenario)
+    explicacao = cache_respostas.buscar(escopo, vetor)
+    if explicacao is not None:
+        print("⚡ DEBUG — Resposta servida do cache semântico:", escopo)
+    return explicacao, vetor
+
+def _preparar_turno(question, context="", history=None, is_first_question=True, intencao=None):
+    """
+    Atualiza o progresso e decide o que responder. Retorna um dict com `progresso` e:
+    - `resposta` e `quick_replies`, quando a resposta é fixa (saudação, menu, fallback);
+    - `prompt`, `cenario`, `saudacao` e `fechamento`, quando a explicação vem do LLM.
+    `intencao` é o resultado de intent_engine.classificar, se já calculado.
+    """
+    # O contexto (lista de trechos ou texto pronto) só é formatado em montar_prompt,
+    # já cortado ao orçamento de tokens
+    tokens_prompt.set(None)
+
     if history and isinstance(history, list) and len(history) > 0:
         ultimo_item = history[-1]
         progresso = ultimo_item.get('progresso', None)
@@ -290,7 +338,10 @@ def generate_answer(question, context="", history=None, tipo_de_prompt=None, is_
     else:
         progresso = {'modulo': 1, 'aula': '1.1', 'etapa': 1, 'aguardando_duvida': False, 'visao_geral': True}
 
-    progresso = atualizar_progresso(question, progresso)
+    # Classifica a pergunta uma vez só (progresso e cenário usam o mesmo resultado)
+    intencao = intencao or classificar(question)
+    posicao_anterior = (progresso.get('modulo'), progresso.get('aula'), progresso.get('etapa'))
+    progresso = atualizar_progresso(question, progresso, intencao)
     modulo = progresso.get('modulo', 1)
     aula = progresso.get('aula', '1.1')
     etapa = progresso.get('etapa', 1)
@@ -299,7 +350,7 @@ def generate_answer(question, context="", history=None, tipo_de_prompt=None, is_
 
     saudacao = random.choice(GREETINGS) if is_first_question else ""
     fechamento = random.choice(CLOSINGS)
-    cenario = detectar_cenario(question)
+    cenario = intencao["cenario"]
 
     mensagem_generica = question.strip().lower()
     saudacoes_vagas = [
@@ -314,12 +365,7 @@ def generate_answer(question, context="", history=None, tipo_de_prompt=None, is_
         or any(mensagem_generica.startswith(apr) for apr in apresentacoes_vagas)
         or (cenario == "geral" and visao_geral)
     ):
-        explicacao = (
-            "Olá, Doutor(a)! Que bom te ver por aqui. 😊<br><br>"
-            "Pode perguntar qualquer coisa sobre o curso, sobre aulas, módulos, ou me contar sua realidade no consultório. Se quiser, pode dizer o módulo ou aula que está estudando, ou sua especialidade, que eu adapto a resposta para você.<br><br>"
-            "Se preferir, posso sugerir exemplos práticos, simulações, dicas de experiência ou Health Plan para a sua área.<br><br>"
-            "<b>No que posso te ajudar agora?</b>"
-        )
+        explicacao = MENSAGEM_BOAS_VINDAS
         quick_replies = [
             "Quero tirar uma dúvida específica",
             "Me mostre um exemplo prático",
@@ -330,7 +376,7 @@ def generate_answer(question, context="", history=None, tipo_de_prompt=None, is_
             resposta = f"{saudacao}<br><br>{explicacao}<br><br>{fechamento}"
         else:
             resposta = f"{explicacao}<br><br>{fechamento}"
-        return resposta, quick_replies, progresso
+        return {"progresso": progresso, "resposta": resposta, "quick_replies": quick_replies}
 
     # Dúvida pontual, exemplo, etc.
     if cenario in ["duvida_pontual", "exemplo_pratico"]:
@@ -340,167 +386,183 @@ def generate_answer(question, context="", history=None, tipo_de_prompt=None, is_
             "Se quiser aprofundar ou pedir mais exemplos clínicos, é só pedir!<br>"
             "Fique à vontade para perguntar qualquer coisa relacionada ao método."
         )
-        prompt = f"""{instruction}
-
-Você é a professora Nanda Mac.ia, uma inteligência artificial altamente didática, criada especificamente para ensinar e tirar dúvidas de Doutores(as) que estudam o Curso Online Consultório High Ticket, ministrado por Nanda Mac Dowell.
-
-Leia atentamente o histórico da conversa antes de responder, compreendendo o contexto exato da interação atual para garantir precisão na sua resposta.
-
-IMPORTANTE: Sempre cite o nome do módulo e título da aula exatamente como está na estrutura abaixo. Não adapte, não resuma, não traduza.
-
-ESTRUTURA COMPLETA DO CURSO – MÓDULOS E AULAS:
-
-{BLOCO_MODULOS}
-
-Histórico da conversa anterior:
-{history}
-
-Pergunta atual do Doutor(a):
-'{question}'
-
-Utilize o conteúdo adicional abaixo, se relevante:
-{context}
-        """
-        try:
-            response = client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {"role": "system", "content": "Responda SEMPRE em português do Brasil."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.4,
-                max_tokens=900
-            )
-            explicacao = response.choices[0].message.content.strip()
-            quick_replies = gerar_quick_replies(question, explicacao, history, progresso)
-        except OpenAIError:
-            explicacao = OUT_OF_SCOPE_MSG
-            quick_replies = []
-            return explicacao, quick_replies, progresso
-        except Exception:
-            explicacao = OUT_OF_SCOPE_MSG
-            quick_replies = []
-            return explicacao, quick_replies, progresso
-
-        if saudacao:
-            resposta = f"{saudacao}<br><br>{explicacao}<br><br>{fechamento}"
-        else:
-            resposta = f"{explicacao}<br><br>{fechamento}"
-
-        return resposta, quick_replies, progresso
+        prompt = montar_prompt(instruction, question, context, history, BLOCO_MODULOS, modulo)
+        return {
+            "progresso": progresso, "prompt": prompt, "cenario": cenario,
+            "saudacao": saudacao, "fechamento": fechamento,
+        }
 
     # Navegação/menu – se pedir explicitamente
     if cenario in ["curso_completo", "navegacao_especifica"]:
-        explicacao = (
-            f"{saudacao}<br><br>"
-            "O curso Consultório High Ticket é composto por 7 módulos principais, cada um trazendo competências-chave para o crescimento do seu consultório e sua carreira como Doutor(a).<br><br>"
-            "<b>Confira os módulos:</b><br>"
-            "<b>Módulo 01 – mentalidade high ticket: como desenvolver uma mente preparada para atrair pacientes high ticket</b><br>"
-            "<b>Módulo 02 – senso estético high ticket: como transformar sua imagem e ambiente para atrair pacientes que valorizam</b><br>"
-            "<b>Módulo 03 – posicionamento presencial high ticket: como construir autoridade sem redes sociais</b><br>"
-            "<b>Módulo 04 – a jornada do paciente high ticket: como transformar atendimento em encantamento e fidelização</b><br>"
-            "<b>Módulo 05 – estratégias de captação e fidelização: como atrair pacientes high ticket sem tráfego ou redes sociais</b><br>"
-            "<b>Módulo 06 – estratégias de vendas high ticket: como apresentar e fechar tratamentos de alto valor com ética</b><br>"
-            "<b>Módulo 07 – estratégias por especialidade</b><br><br>"
-            "Para começar, diga o número do módulo e da aula (ex: 'módulo 2, aula 2.3') ou responda 'sim' para começar do início."
-        )
+        explicacao = f"{saudacao}<br><br>{MENU_MODULOS}"
         quick_replies = gerar_quick_replies(question, explicacao, history, progresso)
-        return explicacao, quick_replies, progresso
+        return {"progresso": progresso, "resposta": explicacao, "quick_replies": quick_replies}
 
     # Visão geral (apenas se explicitamente perdido)
     if visao_geral:
-        explicacao = (
-            f"{saudacao}<br><br>"
-            "O curso Consultório High Ticket é composto por 7 módulos principais, cada um trazendo competências-chave para o crescimento do seu consultório e sua carreira como Doutor(a).<br><br>"
-            "<b>Confira os módulos:</b><br>"
-            "<b>Módulo 01 – mentalidade high ticket: como desenvolver uma mente preparada para atrair pacientes high ticket</b><br>"
-            "<b>Módulo 02 – senso estético high ticket: como transformar sua imagem e ambiente para atrair pacientes que valorizam</b><br>"
-            "<b>Módulo 03 – posicionamento presencial high ticket: como construir autoridade sem redes sociais</b><br>"
-            "<b>Módulo 04 – a jornada do paciente high ticket: como transformar atendimento em encantamento e fidelização</b><br>"
-            "<b>Módulo 05 – estratégias de captação e fidelização: como atrair pacientes high ticket sem tráfego ou redes sociais</b><br>"
-            "<b>Módulo 06 – estratégias de vendas high ticket: como apresentar e fechar tratamentos de alto valor com ética</b><br>"
-            "<b>Módulo 07 – estratégias por especialidade</b><br><br>"
-            "Para começar, diga o número do módulo e da aula (ex: 'módulo 2, aula 2.3') ou responda 'sim' para começar do início."
-        )
+        explicacao = f"{saudacao}<br><br>{MENU_MODULOS}"
         quick_replies = gerar_quick_replies(question, explicacao, history, progresso)
-        return explicacao, quick_replies, progresso
+        return {"progresso": progresso, "resposta": explicacao, "quick_replies": quick_replies}
 
     # Etapas didáticas
     if etapa in [1, 2, 3] or aguardando_duvida:
-        if etapa == 1:
-            instruction = (
-                f"Você está iniciando a aula {aula} do módulo {modulo}.<br>"
-                "O objetivo desta aula é apresentar a você, Doutor(a), conceitos essenciais e estratégias práticas para transformar seu consultório.<br>"
-                "Durante o conteúdo, posso trazer exemplos reais, simulações de conversa e até um mini-roteiro prático para facilitar a aplicação.<br><br>"
-                "Deseja começar agora mesmo? Responda 'sim' para avançar, ou me pergunte se quiser um exemplo prático logo no início."
-            )
-        elif etapa == 2:
-            instruction = (
-                f"Agora vamos tornar o conteúdo da aula {aula} do módulo {modulo} mais prático para a sua realidade clínica.<br>"
-                "<b>Exemplo prático de aplicação:</b><br>"
-                "- Imagine que você atende um paciente novo e, antes de falar de valores, destaca a importância do vínculo e do acompanhamento contínuo.<br>"
-                "Frase que pode usar: 'Meu objetivo é que cada paciente se sinta seguro e confiante, pois assim conseguimos melhores resultados a longo prazo.'<br>"
-                "- Se quiser um roteiro de abordagem ou um diálogo simulado, é só pedir!"
-            )
-        else:
-            instruction = (
-                f"Você está concluindo a aula {aula} do módulo {modulo}. Recapitule os principais aprendizados de forma sucinta. "
-                "Se quiser, posso fechar com um exemplo prático do que foi ensinado, ou aprofundar algum ponto específico.<br>"
-                "Pergunte se ficou alguma dúvida, ou se o Doutor(a) quer uma explicação extra, voltar, pular ou escolher outro módulo antes de considerar a aula concluída."
-            )
+        instruction = instrucao_etapa(modulo, aula, etapa)
+        if etapa not in (1, 2):
             progresso['aguardando_duvida'] = True
 
-        prompt = f"""{instruction}
-
-Você é a professora Nanda Mac.ia, uma inteligência artificial altamente didática, criada especificamente para ensinar e tirar dúvidas de Doutores(as) que estudam o Curso Online Consultório High Ticket, ministrado por Nanda Mac Dowell.
-
-Leia atentamente o histórico da conversa antes de responder, compreendendo o contexto exato da interação atual para garantir precisão na sua resposta.
-
-IMPORTANTE: Sempre cite o nome do módulo e título da aula exatamente como está na estrutura abaixo. Não adapte, não resuma, não traduza.
-
-ESTRUTURA COMPLETA DO CURSO – MÓDULOS E AULAS:
-
-{BLOCO_MODULOS}
-
-Histórico da conversa anterior:
-{history}
-
-Pergunta atual do Doutor(a):
-'{question}'
-
-Utilize o conteúdo adicional abaixo, se relevante:
-{context}
-        """
-
-        try:
-            response = client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {"role": "system", "content": "Responda SEMPRE em português do Brasil."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.4,
-                max_tokens=900
-            )
-            explicacao = response.choices[0].message.content.strip()
-            quick_replies = gerar_quick_replies(question, explicacao, history, progresso)
-        except OpenAIError:
-            explicacao = OUT_OF_SCOPE_MSG
-            quick_replies = []
-            return explicacao, quick_replies, progresso
-        except Exception:
-            explicacao = OUT_OF_SCOPE_MSG
-            quick_replies = []
-            return explicacao, quick_replies, progresso
-
-        if saudacao:
-            resposta = f"{saudacao}<br><br>{explicacao}<br><br>{fechamento}"
-        else:
-            resposta = f"{explicacao}<br><br>{fechamento}"
-
-        return resposta, quick_replies, progresso
+        # Turno que só avançou/voltou na aula ("sim", "próxima aula", "repetir"...):
+        # a etapa é igual para todos os alunos, então serve o texto pré-gerado, se
+        # houver. Qualquer outra mensagem (mesmo sem pergunta) vai para o LLM.
+        navegou = (modulo, aula, etapa) != posicao_anterior and comando_de_navegacao(question, intencao)
+        if etapa in (1, 2, 3) and cenario in CENARIOS_CANONICOS and navegou:
+            explicacao = conteudo_canonico(modulo, aula, etapa)
+            if explicacao is not None:
+                print("📚 DEBUG — Etapa servida do conteúdo pré-gerado:", (modulo, aula, etapa))
+                turno = {"progresso": progresso, "saudacao": saudacao, "fechamento": fechamento}
+                resposta, quick_replies, progresso = _finalizar_turno(turno, question, history, explicacao)
+                return {"progresso": progresso, "resposta": resposta, "quick_replies": quick_replies}
+
+        prompt = montar_prompt(instruction, question, context, history, BLOCO_MODULOS, modulo)
+
+        return {
+            "progresso": progresso, "prompt": prompt, "cenario": cenario,
+            "saudacao": saudacao, "fechamento": fechamento,
+        }
 
     # Fallback
     explicacao = OUT_OF_SCOPE_MSG
     quick_replies = gerar_quick_replies(question, explicacao, history, progresso)
-    return explicacao, quick_replies, progresso
+    return {"progresso": progresso, "resposta": explicacao, "quick_replies": quick_replies}
+
+def _preparar_turno_contado(*args):
+    turno = _preparar_turno(*args)
+    return turno, tokens_prompt.get()
+
+async def _preparar_turno_async(question, context="", history=None, is_first_question=True, intencao=None):
+    """
+    Roda _preparar_turno numa thread: montar o prompt conta tokens (tiktoken) e o
+    conteúdo pré-gerado vem do SQLite. `tokens_prompt` é definido na thread, numa
+    cópia do contexto, então o valor é repassado ao contexto de quem chamou.
+    """
+    turno, tokens = await asyncio.to_thread(
+        _preparar_turno_contado, question, context, history, is_first_question, intencao
+    )
+    tokens_prompt.set(tokens)
+    return turno
+
+def instrucao_etapa(modulo, aula, etapa):
+    """Instrução da etapa didática (1: abertura, 2: exemplo prático, 3 ou mais: fechamento da aula)."""
+    if etapa == 1:
+        return (
+            f"Você está iniciando a aula {aula} do módulo {modulo}.<br>"
+            "O objetivo desta aula é apresentar a você, Doutor(a), conceitos essenciais e estratégias práticas para transformar seu consultório.<br>"
+            "Durante o conteúdo, posso trazer exemplos reais, simulações de conversa e até um mini-roteiro prático para facilitar a aplicação.<br><br>"
+            "Deseja começar agora mesmo? Responda 'sim' para avançar, ou me pergunte se quiser um exemplo prático logo no início."
+        )
+    if etapa == 2:
+        return (
+            f"Agora vamos tornar o conteúdo da aula {aula} do módulo {modulo} mais prático para a sua realidade clínica.<br>"
+            "<b>Exemplo prático de aplicação:</b><br>"
+            "- Imagine que você atende um paciente novo e, antes de falar de valores, destaca a importância do vínculo e do acompanhamento contínuo.<br>"
+            "Frase que pode usar: 'Meu objetivo é que cada paciente se sinta seguro e confiante, pois assim conseguimos melhores resultados a longo prazo.'<br>"
+            "- Se quiser um roteiro de abordagem ou um diálogo simulado, é só pedir!"
+        )
+    return (
+        f"Você está concluindo a aula {aula} do módulo {modulo}. Recapitule os principais aprendizados de forma sucinta. "
+        "Se quiser, posso fechar com um exemplo prático do que foi ensinado, ou aprofundar algum ponto específico.<br>"
+        "Pergunte se ficou alguma dúvida, ou se o Doutor(a) quer uma explicação extra, voltar, pular ou escolher outro módulo antes de considerar a aula concluída."
+    )
+
+def comando_de_navegacao(question, intencao):
+    """True se a mensagem é só um comando de avançar/voltar/repetir a aula."""
+    pergunta_lower = question.strip().lower()
+    return (
+        pergunta_lower in RESPOSTAS_SIM
+        or pergunta_lower in RESPOSTAS_NAO
+        or intencao["avancar"] or intencao["voltar"] or intencao["repetir"]
+    )
+
+def versao_etapa(modulo, aula, etapa):
+    return versao_conteudo(instrucao_etapa(modulo, aula, etapa), MODELO_LLM)
+
+def conteudo_canonico(modulo, aula, etapa):
+    """Texto pré-gerado (pregerar_conteudo.py) da etapa da aula na versão atual, ou None."""
+    if not CONTEUDO_ATIVO:
+        return None
+    return conteudo_aulas.buscar(modulo, aula, etapa, versao_etapa(modulo, aula, etapa))
+
+def _finalizar_turno(turno, question, history, explicacao):
+    """Monta (resposta, quick_replies, progresso) a partir da explicação gerada pelo LLM."""
+    progresso = turno["progresso"]
+    if explicacao is None:
+        return OUT_OF_SCOPE_MSG, [], progresso
+    quick_replies = gerar_quick_replies(question, explicacao, history, progresso)
+
+    if turno["saudacao"]:
+        resposta = f"{turno['saudacao']}<br><br>{explicacao}<br><br>{turno['fechamento']}"
+    else:
+        resposta = f"{explicacao}<br><br>{turno['fechamento']}"
+
+    return resposta, quick_replies, progresso
+
+async def generate_answer_async(question, context="", history=None, tipo_de_prompt=None, is_first_question=True, usar_cache=True, intencao=None):
+    """
+    Gera a resposta da professora para a `question` (usada pelas rotas do FastAPI).
+    `usar_cache=False` ignora o cache semântico de respostas (útil em avaliações).
+    `intencao` reaproveita a classificação feita pela rota (intent_engine.classificar).
+    """
+    turno = await _preparar_turno_async(question, context, history, is_first_question, intencao)
+    if "prompt" not in turno:
+        return turno["resposta"], turno["quick_replies"], turno["progresso"]
+
+    progresso, cenario = turno["progresso"], turno["cenario"]
+    explicacao, vetor = await _consultar_cache_async(question, progresso, cenario, usar_cache)
+    if explicacao is None:
+        try:
+            explicacao = await _chamar_llm_async(turno["prompt"])
+        except Exception as e:
+            print("⚠️ Falha na chamada ao LLM:", repr(e))
+            explicacao = None
+        if explicacao and vetor is not None:
+            cache_respostas.guardar(escopo_resposta(progresso, cenario), vetor, explicacao)
+    return _finalizar_turno(turno, question, history, explicacao)
+
+async def generate_answer_stream_async(question, context="", history=None, tipo_de_prompt=None, is_first_question=True, usar_cache=True, intencao=None):
+    """
+    Versão em streaming de generate_answer_async. Gera eventos (dicts):
+    - {"tipo": "delta", "texto": ...} com cada pedaço da resposta, na ordem;
+    - {"tipo": "fim", "resposta": ..., "quick_replies": [...], "progresso": {...}} no final.
+    """
+    turno = await _preparar_turno_async(question, context, history, is_first_question, intencao)
+    if "prompt" not in turno:
+        yield {"tipo": "delta", "texto": turno["resposta"]}
+        yield {
+            "tipo": "fim", "resposta": turno["resposta"],
+            "quick_replies": turno["quick_replies"], "progresso": turno["progresso"],
+        }
+        return
+
+    progresso, cenario = turno["progresso"], turno["cenario"]
+    if turno["saudacao"]:
+        yield {"tipo": "delta", "texto": f"{turno['saudacao']}<br><br>"}
+
+    explicacao, vetor = await _consultar_cache_async(question, progresso, cenario, usar_cache)
+    if explicacao is not None:
+        yield {"tipo": "delta", "texto": explicacao}
+    else:
+        partes = []
+        try:
+            async for pedaco in _chamar_llm_stream_async(turno["prompt"]):
+                partes.append(pedaco)
+                yield {"tipo": "delta", "texto": pedaco}
+            explicacao = "".join(partes).strip()
+        except Exception as e:
+            print("⚠️ Falha no streaming do LLM:", repr(e))
+            explicacao = None
+        if explicacao and vetor is not None:
+            cache_respostas.guardar(escopo_resposta(progresso, cenario), vetor, explicacao)
+
+    resposta, quick_replies, progresso = _finalizar_turno(turno, question, history, explicacao)
+    if explicacao:
+        yield {"tipo": "delta", "texto": f"<br><br>{turno['fechamento']}"}
+    yield {"tipo": "fim", "resposta": resposta, "quick_replies": quick_replies, "progresso": progresso}
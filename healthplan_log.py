@@ -1,8 +1,69 @@
 import os
 import json
+import threading
+from contextlib import contextmanager
 from datetime import datetime
 
-HEALTHPLAN_LOG = "healthplan_perguntas.json"
+try:
+    import fcntl
+except ImportError:  # Windows: só o lock entre threads do próprio processo
+    fcntl = None
+
+# JSON Lines: um registro por linha, gravado com append (custo constante por pergunta)
+HEALTHPLAN_LOG = "healthplan_perguntas.jsonl"
+# Formato antigo (lista JSON reescrita a cada pergunta), migrado uma única vez
+HEALTHPLAN_LOG_ANTIGO = "healthplan_perguntas.json"
+
+_lock = threading.Lock()
+_migrado = False
+
+
+@contextmanager
+def _bloqueio():
+    """Exclusão mútua entre threads e entre processos (workers do uvicorn) via flock."""
+    with _lock:
+        with open(HEALTHPLAN_LOG + ".lock", "a") as trava:
+            if fcntl:
+                fcntl.flock(trava, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl:
+                    fcntl.flock(trava, fcntl.LOCK_UN)
+
+
+def migrar_json_antigo() -> int:
+    """
+    Converte o healthplan_perguntas.json antigo para JSON Lines, antes dos
+    registros que já estiverem no .jsonl, e renomeia o antigo para
+    .json.migrado. Retorna o número de registros migrados.
+    """
+    global _migrado
+    if _migrado:
+        return 0
+    with _bloqueio():
+        if not os.path.exists(HEALTHPLAN_LOG_ANTIGO):
+            _migrado = True
+            return 0
+        with open(HEALTHPLAN_LOG_ANTIGO, "r", encoding="utf-8") as f:
+            dados = json.load(f)
+
+        temporario = HEALTHPLAN_LOG + ".tmp"
+        with open(temporario, "w", encoding="utf-8") as saida:
+            for registro in dados:
+                saida.write(json.dumps(registro, ensure_ascii=False) + "\n")
+            if os.path.exists(HEALTHPLAN_LOG):
+                with open(HEALTHPLAN_LOG, "r", encoding="utf-8") as atual:
+                    for linha in atual:
+                        saida.write(linha)
+            saida.flush()
+            os.fsync(saida.fileno())
+        os.replace(temporario, HEALTHPLAN_LOG)
+        os.replace(HEALTHPLAN_LOG_ANTIGO, HEALTHPLAN_LOG_ANTIGO + ".migrado")
+        _migrado = True
+    print(f"🗂️ {len(dados)} registro(s) do Health Plan migrados para {HEALTHPLAN_LOG}")
+    return len(dados)
+
 
 def registrar_healthplan(pergunta: str, usuario: str):
     registro = {
@@ -10,14 +71,21 @@ def registrar_healthplan(pergunta: str, usuario: str):
         "usuario": usuario,
         "data": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     }
+    migrar_json_antigo()
+    linha = json.dumps(registro, ensure_ascii=False) + "\n"
+    with _bloqueio():
+        with open(HEALTHPLAN_LOG, "a", encoding="utf-8") as f:
+            f.write(linha)
 
-    if os.path.exists(HEALTHPLAN_LOG):
-        with open(HEALTHPLAN_LOG, "r", encoding="utf-8") as f:
-            dados = json.load(f)
-    else:
-        dados = []
-
-    dados.append(registro)
 
-    with open(HEALTHPLAN_LOG, "w", encoding="utf-8") as f:
-        json.dump(dados, f, ensure_ascii=False, indent=2)
+def ler_healthplan():
+    """Percorre os registros um a um, sem carregar o arquivo inteiro (para exportações)."""
+    migrar_json_antigo()
+    if not os.path.exists(HEALTHPLAN_LOG):
+        return
+    with open(HEALTHPLAN_LOG, "r", encoding="utf-8") as f:
+        for linha in f:
+            try:
+                yield json.loads(linha)
+            except ValueError:
+                continue  # linha incompleta (gravação interrompida)
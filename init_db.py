@@ -1,23 +1,12 @@
 import sqlite3
 
-conn = sqlite3.connect("logs.db")
-cursor = conn.cursor()
+from db_logs import DB_PATH, criar_tabela
 
-cursor.execute("""
-CREATE TABLE IF NOT EXISTS logs (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    usuario TEXT,
-    pergunta TEXT,
-    resposta TEXT,
-    tipo_prompt TEXT,
-    contexto TEXT,
-    modulo TEXT,
-    aula TEXT,
-    data TEXT DEFAULT CURRENT_TIMESTAMP
-)
-""")
+conn = sqlite3.connect(DB_PATH)
+
+# Tabela de logs, colunas novas, índices e agregados do dashboard
+criar_tabela(conn)
 
-conn.commit()
 conn.close()
 
 print("✅ Tabela 'logs' criada ou ajustada com sucesso.")
@@ -0,0 +1,218 @@
+# intent_engine.py
+# Classificação da pergunta numa única passada: tipo de prompt (prompt_router),
+# cenário (gpt_utils.detectar_cenario), referências a módulo/aula e comandos de
+# navegação. Todas as tabelas de palavras-chave são compiladas uma vez só.
+#
+# Palavras-chave: uma regex com lookahead sobre a trie de todos os termos acha,
+# em cada posição, o termo mais longo que começa ali; os termos que são prefixo
+# dele também ocorrem ali e são somados pelo fecho de prefixos pré-calculado.
+# O resultado é o mesmo conjunto de termos que os antigos `termo in pergunta`,
+# como num autômato Aho-Corasick.
+# Padrões com espaço/dígitos variáveis ficam numa segunda regex combinada.
+
+import re
+
+# ---------------------------------------------------------------------------
+# Tabelas (mesma ordem de prioridade das cadeias antigas)
+# ---------------------------------------------------------------------------
+
+# 📩 Mensagens automáticas (WhatsApp, e-mail, direct, etc.)
+TERMOS_MENSAGEM_AUTO = (
+    "mensagem automática", "resposta automática", "mensagem padrão",
+    "robô", "responder depois", "responder mais tarde", "sem tempo para responder",
+    "fim de semana", "fora do horário", "mensagem fora do expediente",
+)
+# 🔎 Health Plan (além das combinações "sou pediatra" + "health" e "sou psicóloga" + "ansiedade")
+TERMOS_HEALTH_PLAN = (
+    "health plan", "plano de tratamento", "meu health plan", "fazer meu health plan",
+    "fazer meu plano", "dúvida no health", "dúvida no plano", "como montar meu health",
+    "como montar meu plano", "criar meu plano", "montar health plan", "montar plano",
+)
+TERMOS_PRECIFICACAO = ("preço", "valor", "cobrar", "precificar")
+TERMOS_CAPTACAO = ("atrair pacientes", "sem marketing", "sem instagram")
+TERMOS_APLICACAO = ("como aplicar", "exemplo prático", "na prática")
+TERMOS_CORRECAO = ("errei", "confundi", "não entendi")
+TERMOS_REVISAO = ("resumo", "revisão")
+TERMOS_FAQ = ("muitos perguntam", "pergunta comum")
+
+# Especialidades reconhecidas para o método ("sou <especialidade>")
+ESPECIALIDADES = (
+    "dermatologista", "psicóloga", "psicologo", "pediatra", "dentista",
+    "fonoaudióloga", "fonoaudiologo", "nutricionista", "veterinário", "veterinaria",
+    "psicanalista", "fisioterapeuta", "terapeuta", "acupunturista",
+)
+# Termos que sugerem intenção de atrair, crescer, captar, faturar etc
+TERMOS_ACAO = (
+    "atrair", "captar", "faturar", "paciente high ticket", "crescer", "aplicar",
+    "ter mais pacientes", "dobrar faturamento", "ganhar mais", "aumentar", "consultório cheio",
+    "lotar agenda", "consultorio", "atendimento particular",
+)
+TERMOS_CURSO_COMPLETO = (
+    "quero fazer o curso completo", "começar do início", "me ensina tudo",
+    "fazer o curso com você", "menu", "ver módulos", "ver o curso", "ver estrutura",
+    "iniciar o curso", "quero começar o curso",
+)
+TERMOS_VOLTAR_CENARIO = ("voltar", "retornar", "anterior", "repetir aula")
+TERMOS_DUVIDA = (
+    "tenho uma dúvida", "tenho outra dúvida", "minha dúvida", "não entendi", "duvida", "dúvida",
+    "me explica", "poderia explicar", "por que", "como", "o que", "quais", "qual", "explique",
+    "me fale", "exemplo", "caso prático", "me mostre", "me explique", "?",
+)
+TERMOS_EXEMPLO = (
+    "exemplo prático", "me dá um exemplo", "passo a passo", "como fazer isso", "como faço",
+    "me ensina", "ensinar", "me mostre como",
+)
+
+# Comandos de navegação usados em atualizar_progresso
+TERMOS_VOLTAR = ("voltar", "retornar", "anterior")
+TERMOS_REPETIR = ("repetir",)
+TERMOS_AVANCAR = ("próxima aula", "avançar", "continuar", "pode avançar")
+
+TIPOS_PROMPT = (
+    ("mensagem_automatica", TERMOS_MENSAGEM_AUTO),
+    ("health_plan", TERMOS_HEALTH_PLAN),
+    ("precificacao", TERMOS_PRECIFICACAO),
+    ("capitacao_sem_marketing_digital", TERMOS_CAPTACAO),
+    ("aplicacao", TERMOS_APLICACAO),
+    ("correcao", TERMOS_CORRECAO),
+    ("revisao", TERMOS_REVISAO),
+    ("faq", TERMOS_FAQ),
+)
+COMBINACOES_HEALTH_PLAN = (("sou pediatra", "health"), ("sou psicóloga", "ansiedade"))
+TERMOS_SOU_ESPECIALIDADE = tuple(f"sou {esp}" for esp in ESPECIALIDADES)
+
+# ---------------------------------------------------------------------------
+# Compilação
+# ---------------------------------------------------------------------------
+
+def _todos_os_termos() -> set:
+    termos = set()
+    for _, tabela in TIPOS_PROMPT:
+        termos.update(tabela)
+    for combinacao in COMBINACOES_HEALTH_PLAN:
+        termos.update(combinacao)
+    for tabela in (
+        TERMOS_SOU_ESPECIALIDADE, TERMOS_ACAO, TERMOS_CURSO_COMPLETO, TERMOS_VOLTAR_CENARIO,
+        TERMOS_DUVIDA, TERMOS_EXEMPLO, TERMOS_VOLTAR, TERMOS_REPETIR, TERMOS_AVANCAR,
+    ):
+        termos.update(tabela)
+    return termos
+
+
+def _regex_trie(termos) -> str:
+    """
+    Alternância dos `termos` em forma de trie: cada posição do texto só segue
+    o ramo do próximo caractere, em vez de testar termo a termo. Como os
+    sufixos opcionais são gulosos, o casamento é sempre o termo mais longo.
+    """
+    trie = {}
+    for termo in termos:
+        no = trie
+        for c in termo:
+            no = no.setdefault(c, {})
+        no[""] = True
+
+    def _montar(no):
+        ramos = [re.escape(c) + _montar(filho) for c, filho in sorted(no.items()) if c]
+        if not ramos:
+            return ""
+        corpo = ramos[0] if len(ramos) == 1 else "(?:" + "|".join(ramos) + ")"
+        if "" in no:
+            return ("(?:" + corpo + ")?") if len(ramos) == 1 else corpo + "?"
+        return corpo
+
+    return _montar(trie)
+
+
+_TERMOS = sorted(_todos_os_termos(), key=len, reverse=True)
+RE_TERMOS = re.compile("(?=(" + _regex_trie(_TERMOS) + "))")
+# Para cada termo, os termos que são prefixo dele (incluindo ele mesmo)
+_PREFIXOS = {t: frozenset(p for p in _TERMOS if t.startswith(p)) for t in _TERMOS}
+
+RE_ESTRUTURA = re.compile(
+    r"(?P<como>como\s+faço|como\s+atrair|quero\s+(?:aumentar|dobrar|captar|faturar|ter mais|consultório|consultorio|lotar))"
+    r"|\bm[oó]dulo\s*(?P<modulo>\d+)\b"
+    r"|\baula\s*(?P<aula>\d+\.\d+)\b"
+)
+
+_TIPOS = tuple((tipo, frozenset(tabela)) for tipo, tabela in TIPOS_PROMPT)
+_SOU_ESPECIALIDADE = frozenset(TERMOS_SOU_ESPECIALIDADE)
+_ACAO = frozenset(TERMOS_ACAO)
+_CURSO_COMPLETO = frozenset(TERMOS_CURSO_COMPLETO)
+_VOLTAR_CENARIO = frozenset(TERMOS_VOLTAR_CENARIO)
+_DUVIDA = frozenset(TERMOS_DUVIDA)
+_EXEMPLO = frozenset(TERMOS_EXEMPLO)
+_VOLTAR = frozenset(TERMOS_VOLTAR)
+_REPETIR = frozenset(TERMOS_REPETIR)
+_AVANCAR = frozenset(TERMOS_AVANCAR)
+
+# ---------------------------------------------------------------------------
+# Classificação
+# ---------------------------------------------------------------------------
+
+def termos_encontrados(texto: str) -> set:
+    """Conjunto de termos das tabelas que ocorrem em `texto` (já em minúsculas)."""
+    encontrados = set()
+    for match in RE_TERMOS.finditer(texto):
+        encontrados |= _PREFIXOS[match.group(1)]
+    return encontrados
+
+
+def _tipo_prompt(encontrados: set) -> str:
+    for tipo, termos in _TIPOS:
+        if encontrados & termos:
+            return tipo
+        if tipo == "health_plan" and any(a in encontrados and b in encontrados for a, b in COMBINACOES_HEALTH_PLAN):
+            return tipo
+    return "explicacao"
+
+
+def _cenario(encontrados: set, como_faco: bool, navegacao: bool) -> str:
+    if encontrados & _SOU_ESPECIALIDADE and encontrados & _ACAO:
+        return "duvida_pontual"
+    if como_faco:
+        return "duvida_pontual"
+    if encontrados & _CURSO_COMPLETO:
+        return "curso_completo"
+    if navegacao:
+        return "navegacao_especifica"
+    if encontrados & _VOLTAR_CENARIO:
+        return "voltar"
+    if encontrados & _DUVIDA:
+        return "duvida_pontual"
+    if encontrados & _EXEMPLO:
+        return "exemplo_pratico"
+    return "geral"
+
+
+def classificar(pergunta: str) -> dict:
+    """
+    Classifica a `pergunta` de uma vez. Retorna um dict com:
+    - `tipo_prompt`: como prompt_router.inferir_tipo_de_prompt;
+    - `cenario`: como gpt_utils.detectar_cenario;
+    - `modulo` (int ou None) e `aula` (str ou None): primeira referência na pergunta;
+    - `voltar`, `repetir`, `avancar`: comandos de navegação citados.
+    """
+    texto = pergunta.lower()
+    encontrados = termos_encontrados(texto)
+
+    como_faco = False
+    modulo = aula = None
+    for match in RE_ESTRUTURA.finditer(texto):
+        if match.group("como") is not None:
+            como_faco = True
+        elif match.group("modulo") is not None:
+            if modulo is None:
+                modulo = int(match.group("modulo"))
+        elif aula is None:
+            aula = match.group("aula")
+
+    return {
+        "tipo_prompt": _tipo_prompt(encontrados),
+        "cenario": _cenario(encontrados, como_faco, modulo is not None or aula is not None),
+        "modulo": modulo,
+        "aula": aula,
+        "voltar": bool(encontrados & _VOLTAR),
+        "repetir": bool(encontrados & _REPETIR),
+        "avancar": bool(encontrados & _AVANCAR),
+    }
@@ -0,0 +1,222 @@
+# lexical_search.py
+# Busca lexical local (BM25) sobre transcricoes.txt.
+# Não depende de rede: serve para o debug de trechos e como fallback quando
+# a API de embeddings da OpenAI está lenta ou fora do ar.
+
+import hashlib
+import heapq
+import json
+import math
+import os
+import re
+import threading
+import unicodedata
+
+from chunker import VERSAO_CHUNKER, dividir_transcricoes
+
+BASE_DIR = os.path.dirname(__file__)
+TRANSCRIPTS_PATH = os.path.join(BASE_DIR, "transcricoes.txt")
+LEXICAL_INDEX_PATH = os.getenv(
+    "LEXICAL_INDEX_PATH", os.path.join(BASE_DIR, "storage_lexico", "bm25_index.json")
+)
+
+# Parâmetros do BM25; o índice usa os mesmos trechos (e ids) do índice vetorial
+BM25_K1 = 1.5
+BM25_B = 0.75
+VERSAO_INDICE = f"2-{VERSAO_CHUNKER}"
+
+STOPWORDS_PT = {
+    "a", "o", "e", "as", "os", "ao", "aos", "de", "da", "do", "das", "dos", "em", "no", "na",
+    "nos", "nas", "um", "uma", "uns", "umas", "que", "para", "pra", "pro", "com", "sem", "por",
+    "pelo", "pela", "se", "nao", "sim", "ou", "mas", "mais", "menos", "como", "quando", "onde",
+    "qual", "quais", "eu", "voce", "voces", "ele", "ela", "eles", "elas", "me", "te", "lhe",
+    "meu", "minha", "meus", "minhas", "seu", "sua", "seus", "suas", "isso", "isto", "esse",
+    "essa", "este", "esta", "aquele", "aquela", "ja", "tem", "ter", "ser", "foi", "vai", "ne",
+    "muito", "muita", "sobre", "entao", "porque", "tambem", "so", "ate", "quero", "gostaria",
+}
+
+
+def normalize_key(texto: str) -> str:
+    """Minúsculas, sem acentos e sem pontuação: 'Técnica Alanis!' -> 'tecnica alanis'."""
+    texto = unicodedata.normalize("NFKD", texto or "")
+    texto = "".join(c for c in texto if not unicodedata.combining(c))
+    texto = re.sub(r"[^a-z0-9]+", " ", texto.lower())
+    return texto.strip()
+
+
+def tokenizar(texto: str) -> list:
+    return [t for t in normalize_key(texto).split() if len(t) > 1 and t not in STOPWORDS_PT]
+
+
+def dividir_frases(texto: str) -> list:
+    frases = re.split(r"(?<=[.!?…])\s+|\n+", texto.strip())
+    return [f.strip() for f in frases if f.strip()]
+
+
+def _texto_indexado(doc: dict) -> str:
+    """Título e temas da seção entram junto com o texto de cada trecho."""
+    metadata = doc.get("metadata", {})
+    return " ".join([metadata.get("titulo", ""), metadata.get("temas", ""), doc["texto"]])
+
+
+def extrair_passagens(texto: str) -> list:
+    """Trechos do chunker estrutural, sem as posições (não são usadas na busca lexical)."""
+    return [
+        {"id": c["id"], "texto": c["texto"], "metadata": c["metadata"]}
+        for c in dividir_transcricoes(texto)
+    ]
+
+
+class IndiceBM25:
+    """Índice invertido com os pesos BM25 já calculados por (termo, documento)."""
+
+    def __init__(self, docs: list, postings: dict, idf: dict, assinatura: str = ""):
+        self.docs = docs
+        self.postings = postings  # termo -> [[doc_idx, peso], ...]
+        self.idf = idf
+        self.assinatura = assinatura
+
+    @classmethod
+    def construir(cls, docs: list, assinatura: str = ""):
+        frequencias = []
+        df = {}
+        for doc in docs:
+            tf = {}
+            for termo in tokenizar(_texto_indexado(doc)):
+                tf[termo] = tf.get(termo, 0) + 1
+            frequencias.append(tf)
+            for termo in tf:
+                df[termo] = df.get(termo, 0) + 1
+
+        n = len(docs) or 1
+        tamanhos = [sum(tf.values()) for tf in frequencias]
+        media = (sum(tamanhos) / n) or 1.0
+        idf = {t: math.log(1 + (n - d + 0.5) / (d + 0.5)) for t, d in df.items()}
+
+        postings = {}
+        for doc_idx, tf in enumerate(frequencias):
+            norma = BM25_K1 * (1 - BM25_B + BM25_B * tamanhos[doc_idx] / media)
+            for termo, freq in tf.items():
+                peso = idf[termo] * freq * (BM25_K1 + 1) / (freq + norma)
+                postings.setdefault(termo, []).append([doc_idx, round(peso, 5)])
+        return cls(docs, postings, idf, assinatura)
+
+    def buscar(self, consulta: str, top_k: int = 5, filtros: dict = None) -> list:
+        """Retorna [(doc_idx, score)] em ordem decrescente de score."""
+        scores = {}
+        for termo in set(tokenizar(consulta)):
+            for doc_idx, peso in self.postings.get(termo, ()):
+                scores[doc_idx] = scores.get(doc_idx, 0.0) + peso
+        if filtros:
+            scores = {
+                i: s for i, s in scores.items()
+                if all(str(self.docs[i]["metadata"].get(k)) == str(v) for k, v in filtros.items())
+            }
+        return heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
+
+    def salvar(self, caminho: str):
+        os.makedirs(os.path.dirname(caminho) or ".", exist_ok=True)
+        tmp = caminho + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(
+                {"versao": VERSAO_INDICE, "assinatura": self.assinatura,
+                 "docs": self.docs, "postings": self.postings, "idf": self.idf},
+                f, ensure_ascii=False,
+            )
+        os.replace(tmp, caminho)
+
+    @classmethod
+    def carregar(cls, caminho: str, assinatura: str):
+        """Carrega o índice salvo; retorna None se não existir ou estiver desatualizado."""
+        try:
+            with open(caminho, encoding="utf-8") as f:
+                dados = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        if dados.get("versao") != VERSAO_INDICE or dados.get("assinatura") != assinatura:
+            return None
+        return cls(dados["docs"], dados["postings"], dados["idf"], assinatura)
+
+
+def _assinatura(texto: str) -> str:
+    return hashlib.sha256(texto.encode("utf-8")).hexdigest()
+
+
+def construir_indice(caminho_transcricoes: str = TRANSCRIPTS_PATH, caminho_indice: str = LEXICAL_INDEX_PATH):
+    """Reconstrói o índice BM25 a partir das transcrições e salva em disco."""
+    with open(caminho_transcricoes, encoding="utf-8") as f:
+        texto = f.read()
+    indice = IndiceBM25.construir(extrair_passagens(texto), _assinatura(texto))
+    indice.salvar(caminho_indice)
+    return indice
+
+
+_indice = None
+_indice_lock = threading.Lock()
+
+
+def obter_indice() -> IndiceBM25:
+    """Índice carregado uma vez por processo (do disco se estiver atualizado)."""
+    global _indice
+    if _indice is None:
+        with _indice_lock:
+            if _indice is None:
+                try:
+                    with open(TRANSCRIPTS_PATH, encoding="utf-8") as f:
+                        texto = f.read()
+                except FileNotFoundError:
+                    texto = ""
+                assinatura = _assinatura(texto)
+                indice = IndiceBM25.carregar(LEXICAL_INDEX_PATH, assinatura)
+                if indice is None:
+                    print("⚙️ Índice lexical ausente ou desatualizado. Construindo...")
+                    indice = IndiceBM25.construir(extrair_passagens(texto), assinatura)
+                    try:
+                        indice.salvar(LEXICAL_INDEX_PATH)
+                    except OSError as e:
+                        print("⚠️ Não foi possível salvar o índice lexical:", e)
+                _indice = indice
+    return _indice
+
+
+def buscar_trechos(question: str, top_k: int = 3, filtros: dict = None) -> list:
+    """Mesmo formato de retrieve_relevant_chunks: dicts com `id`, `texto`, `score` e `metadata`."""
+    indice = obter_indice()
+    return [
+        {
+            "id": indice.docs[doc_idx]["id"],
+            "texto": indice.docs[doc_idx]["texto"],
+            "score": score,
+            "metadata": dict(indice.docs[doc_idx]["metadata"]),
+        }
+        for doc_idx, score in indice.buscar(question, top_k=top_k, filtros=filtros)
+    ]
+
+
+def search_transcripts(query: str, max_sentences: int = 3, top_k: int = 5) -> str:
+    """
+    Retorna as `max_sentences` frases mais relevantes das passagens melhor
+    ranqueadas, separadas por '<br>'. String vazia se nada for encontrado.
+    """
+    indice = obter_indice()
+    termos = set(tokenizar(query))
+    if not termos:
+        return ""
+
+    candidatas = []
+    for rank, (doc_idx, _) in enumerate(indice.buscar(query, top_k=top_k)):
+        for frase in dividir_frases(indice.docs[doc_idx]["texto"]):
+            if frase.startswith("[TEMA"):
+                continue
+            presentes = termos.intersection(tokenizar(frase))
+            if presentes:
+                score = sum(indice.idf.get(t, 0.0) for t in presentes)
+                candidatas.append((score, -rank, frase))
+
+    melhores = heapq.nlargest(max_sentences, candidatas)
+    return "<br>".join(frase for _, _, frase in melhores)
+
+
+if __name__ == "__main__":
+    indice = construir_indice()
+    print(f"✅ Índice lexical salvo em {LEXICAL_INDEX_PATH} ({len(indice.docs)} trechos, {len(indice.postings)} termos).")
@@ -1,37 +1,179 @@
 # logs_route.py
 
-from fastapi import APIRouter, Depends
-from fastapi.responses import StreamingResponse
-import sqlite3
 import csv
 import io
+import json
+import os
+import sqlite3
+import zlib
+from datetime import date, timedelta
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
 
 from auth_utils import get_current_user
+from db_logs import DB_PATH, FTS_DISPONIVEL, consulta_fts
+from healthplan_log import ler_healthplan
 
 router = APIRouter()
 
+# Colunas que podem ser exportadas (também protege o SELECT montado abaixo)
+COLUNAS_EXPORTAVEIS = (
+    "id", "usuario", "pergunta", "resposta", "contexto", "tipo_prompt",
+    "modulo", "aula", "data", "tokens_prompt",
+)
+# Linhas lidas do cursor por vez: a memória fica constante, qualquer que seja o tamanho da tabela
+LOTE_EXPORTACAO = 200
+FORMATOS = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+
+def _data(valor: Optional[str], campo: str) -> Optional[date]:
+    if not valor:
+        return None
+    try:
+        return date.fromisoformat(valor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"{campo} deve estar no formato AAAA-MM-DD.")
+
+
+def _colunas_existentes(conn) -> list:
+    return [linha[1] for linha in conn.execute("PRAGMA table_info(logs)")]
+
+
+def montar_filtros(usuario=None, modulo=None, data_inicio=None, data_fim=None, palavra=None):
+    """Cláusula WHERE parametrizada (ou "") e seus parâmetros; `data_fim` inclui o dia inteiro."""
+    condicoes, params = [], []
+    if usuario:
+        condicoes.append("usuario = ?")
+        params.append(usuario)
+    if modulo:
+        condicoes.append("modulo = ?")
+        params.append(modulo)
+    if data_inicio:
+        condicoes.append("data >= ?")
+        params.append(data_inicio.isoformat())
+    if data_fim:
+        condicoes.append("data < ?")
+        params.append((data_fim + timedelta(days=1)).isoformat())
+    if palavra and FTS_DISPONIVEL:
+        consulta = consulta_fts(palavra)
+        if consulta:
+            condicoes.append("id IN (SELECT rowid FROM logs_fts WHERE logs_fts MATCH ?)")
+            params.append(consulta)
+    elif palavra:
+        condicoes.append("(pergunta LIKE ? OR resposta LIKE ?)")
+        params += [f"%{palavra}%"] * 2
+    return (" WHERE " + " AND ".join(condicoes)) if condicoes else "", params
+
+
+def montar_consulta(colunas: list, usuario=None, modulo=None, data_inicio=None, data_fim=None, palavra=None):
+    """SELECT das `colunas` com os filtros, do log mais recente para o mais antigo."""
+    where, params = montar_filtros(usuario, modulo, data_inicio, data_fim, palavra)
+    return f"SELECT {', '.join(colunas)} FROM logs{where} ORDER BY id DESC", params
+
+
+def _linhas_csv(colunas, lotes):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(colunas)
+    for lote in lotes:
+        writer.writerows(lote)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def _linhas_ndjson(colunas, lotes):
+    for lote in lotes:
+        yield "".join(json.dumps(dict(zip(colunas, linha)), ensure_ascii=False) + "\n" for linha in lote)
+
+
+def _comprimir(partes):
+    compressor = zlib.compressobj(wbits=31)  # formato gzip
+    for parte in partes:
+        dados = compressor.compress(parte)
+        if dados:
+            yield dados
+    yield compressor.flush()
+
+
+def exportar(colunas, sql, params, formato="csv", comprimir=False):
+    """Gera o arquivo de exportação em pedaços, lendo o cursor com fetchmany."""
+    def lotes():
+        if not os.path.exists(DB_PATH):
+            return
+        conn = sqlite3.connect(f"file:{DB_PATH}?mode=ro", uri=True)
+        try:
+            cursor = conn.execute(sql, params)
+            while True:
+                lote = cursor.fetchmany(LOTE_EXPORTACAO)
+                if not lote:
+                    break
+                yield lote
+        finally:
+            conn.close()
+
+    linhas = _linhas_ndjson(colunas, lotes()) if formato == "ndjson" else _linhas_csv(colunas, lotes())
+    partes = (texto.encode("utf-8") for texto in linhas)
+    return _comprimir(partes) if comprimir else partes
+
+
 @router.get("/logs")
-def exportar_logs_csv(user: str = Depends(get_current_user)):
+def exportar_logs_csv(
+    usuario: Optional[str] = None,
+    modulo: Optional[str] = None,
+    data_inicio: Optional[str] = None,
+    data_fim: Optional[str] = None,
+    colunas: Optional[str] = None,
+    formato: str = "csv",
+    gzip: bool = False,
+    user: str = Depends(get_current_user),
+):
     """
-    Retorna um CSV com todas as entradas da tabela 'logs' do seu banco SQLite.
+    Exporta a tabela 'logs' em streaming (CSV ou NDJSON, opcionalmente gzip).
+    Filtros opcionais: usuario, modulo, data_inicio/data_fim (AAAA-MM-DD).
+    `colunas` é uma lista separada por vírgulas (padrão: todas).
     A rota é /logs e só pode ser acessada por usuários autenticados.
     """
-    conn = sqlite3.connect("logs.db")
-    cursor = conn.cursor()
+    if formato not in FORMATOS:
+        raise HTTPException(status_code=400, detail=f"formato deve ser um de: {', '.join(FORMATOS)}.")
 
-    cursor.execute("SELECT * FROM logs ORDER BY id DESC")
-    registros = cursor.fetchall()
-    colunas = [desc[0] for desc in cursor.description]
-    conn.close()
+    existentes = COLUNAS_EXPORTAVEIS
+    if os.path.exists(DB_PATH):
+        conn = sqlite3.connect(f"file:{DB_PATH}?mode=ro", uri=True)
+        try:
+            existentes = [c for c in _colunas_existentes(conn) if c in COLUNAS_EXPORTAVEIS] or COLUNAS_EXPORTAVEIS
+        finally:
+            conn.close()
+    if colunas:
+        selecionadas = [c.strip() for c in colunas.split(",") if c.strip()]
+        invalidas = [c for c in selecionadas if c not in existentes]
+        if invalidas:
+            raise HTTPException(status_code=400, detail=f"Colunas inválidas: {', '.join(invalidas)}.")
+    else:
+        selecionadas = list(existentes)
+
+    sql, params = montar_consulta(
+        selecionadas, usuario, modulo,
+        _data(data_inicio, "data_inicio"), _data(data_fim, "data_fim"),
+    )
+    nome = f"logs.{formato}" + (".gz" if gzip else "")
+    return StreamingResponse(
+        exportar(selecionadas, sql, params, formato, gzip),
+        media_type="application/gzip" if gzip else FORMATOS[formato],
+        headers={"Content-Disposition": f"attachment; filename={nome}"},
+    )
 
-    output = io.StringIO()
-    writer = csv.writer(output)
-    writer.writerow(colunas)
-    writer.writerows(registros)
-    output.seek(0)
 
+@router.get("/logs/healthplan")
+def exportar_healthplan(user: str = Depends(get_current_user)):
+    """Exporta as perguntas de Health Plan em NDJSON, registro a registro."""
+    linhas = (json.dumps(registro, ensure_ascii=False) + "\n" for registro in ler_healthplan())
     return StreamingResponse(
-        output,
-        media_type="text/csv",
-        headers={"Content-Disposition": "attachment; filename=logs.csv"}
+        linhas,
+        media_type=FORMATOS["ndjson"],
+        headers={"Content-Disposition": "attachment; filename=healthplan_perguntas.ndjson"},
     )
@@ -1,22 +1,28 @@
+import asyncio
 import os
 import json
 import hashlib
 from datetime import datetime, timedelta
 from typing import Optional
-from fastapi import FastAPI, Request, Form, Depends
+from fastapi import FastAPI, Request, Form, Depends, File, HTTPException, UploadFile
 from fastapi.responses import HTMLResponse, RedirectResponse, StreamingResponse
 from fastapi.templating import Jinja2Templates
-from passlib.context import CryptContext
 from jose import jwt
 import markdown2
 
-from search_engine import retrieve_relevant_context
-from gpt_utils import generate_answer
-from db_logs import registrar_log
+from search_engine import retrieve_for_progresso_async
+from gpt_utils import generate_answer_async, generate_answer_stream_async, formatar_contexto
+from prompt_builder import tokens_prompt
+from db_logs import log_writer, registrar_log
 from logs_route import router as logs_router
+from dashboard_route import router as dashboard_router
+from voice_route import router as voice_router
 from auth_utils import get_current_user
-from prompt_router import inferir_tipo_de_prompt
+from intent_engine import classificar
 from healthplan_log import registrar_healthplan
+from session_store import SESSION_COOKIE, SESSION_TTL, novo_id_sessao, sessoes
+from voice_utils import FilaCheia, ler_upload, transcrever_audio
+from user_store import verificar_senha_async
 
 from sqlalchemy import create_engine, text
 from io import StringIO
@@ -26,22 +32,21 @@ import re
 app = FastAPI()
 templates = Jinja2Templates(directory="templates")
 app.include_router(logs_router)
+app.include_router(dashboard_router)
+app.include_router(voice_router)
+
+@app.on_event("shutdown")
+def gravar_logs_pendentes():
+    # Grava o que ainda estiver na fila de logs antes de encerrar o processo
+    log_writer.parar()
 
 SECRET_KEY = "segredo-teste"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60
 
-# 🔥 SOLUÇÃO DEFINITIVA — SEM BCRYPT
-pwd_context = CryptContext(schemes=["sha256_crypt"], deprecated="auto")
-
-fake_users = {
-    "aluno1": pwd_context.hash("N4nd@M4c#2025")
-}
-
-def authenticate_user(username: str, password: str):
-    if username not in fake_users:
-        return False
-    return pwd_context.verify(password, fake_users[username])
+async def authenticate_user(username: str, password: str):
+    # Hash pré-calculado no user_store; a verificação roda no pool de threads de autenticação
+    return await verificar_senha_async(username, password)
 
 def create_access_token(data: dict):
     to_encode = data.copy()
@@ -58,8 +63,8 @@ def login_get(request: Request):
     return templates.TemplateResponse("login.html", {"request": request})
 
 @app.post("/login")
-def login_post(request: Request, username: str = Form(...), password: str = Form(...)):
-    if not authenticate_user(username, password):
+async def login_post(request: Request, username: str = Form(...), password: str = Form(...)):
+    if not await authenticate_user(username, password):
         return templates.TemplateResponse(
             "login.html",
             {"request": request, "error": "Usuário ou senha inválidos."}
@@ -67,8 +72,160 @@ def login_post(request: Request, username: str = Form(...), password: str = Form
     token = create_access_token({"sub": username})
     response = RedirectResponse(url="/chat", status_code=302)
     response.set_cookie(key="token", value=token, httponly=True)
+    # Cada login começa uma conversa nova
+    _gravar_cookie_sessao(response, novo_id_sessao())
     return response
 
+def _sessao_id(request: Request) -> str:
+    return request.cookies.get(SESSION_COOKIE) or novo_id_sessao()
+
+def _gravar_cookie_sessao(response, sessao_id: str):
+    response.set_cookie(key=SESSION_COOKIE, value=sessao_id, httponly=True, samesite="lax", max_age=SESSION_TTL)
+
 @app.get("/chat", response_class=HTMLResponse)
 def chat_get(request: Request, user: str = Depends(get_current_user)):
-    return templates.TemplateResponse("chat.html", {"request": request, "history": []})
+    sessao_id = _sessao_id(request)
+    response = templates.TemplateResponse(
+        "chat.html", {"request": request, "history": sessoes.carregar(user, sessao_id)}
+    )
+    _gravar_cookie_sessao(response, sessao_id)
+    return response
+
+async def _preparar_pergunta(question: str, history_list: list, user: str):
+    # 🧭 Classificação em uma passada (microssegundos): feita aqui e repassada ao generate_answer
+    intencao = classificar(question)
+    tipo_prompt = intencao["tipo_prompt"]
+    if tipo_prompt == "health_plan":
+        await asyncio.to_thread(registrar_healthplan, question, user)
+
+    # 🔎 Busca híbrida restrita à aula/módulo atual do aluno
+    progresso_atual = history_list[-1].get("progresso") if history_list else None
+    chunks, _ = await retrieve_for_progresso_async(question, progresso_atual)
+    return intencao, chunks
+
+def _concluir_pergunta(user, question, chunks, tipo_prompt, resposta, quick_replies, progresso) -> dict:
+    registrar_log(
+        user,
+        question,
+        resposta,
+        formatar_contexto(chunks),
+        tipo_prompt,
+        modulo=progresso.get("modulo"),
+        aula=progresso.get("aula"),
+        tokens_prompt=tokens_prompt.get(),
+    )
+    return {
+        "user": question,
+        "ai": markdown2.markdown(resposta),
+        "quick_replies": quick_replies,
+        "progresso": progresso,
+    }
+
+@app.post("/ask", response_class=HTMLResponse)
+async def ask(
+    request: Request,
+    question: str = Form(...),
+    user: str = Depends(get_current_user),
+):
+    sessao_id = _sessao_id(request)
+    history_list = await asyncio.to_thread(sessoes.carregar, user, sessao_id)
+    intencao, chunks = await _preparar_pergunta(question, history_list, user)
+    tipo_prompt = intencao["tipo_prompt"]
+    resposta, quick_replies, progresso = await generate_answer_async(
+        question,
+        context=chunks,
+        history=history_list,
+        tipo_de_prompt=tipo_prompt,
+        is_first_question=len(history_list) == 0,
+        intencao=intencao,
+    )
+
+    item = _concluir_pergunta(user, question, chunks, tipo_prompt, resposta, quick_replies, progresso)
+    await asyncio.to_thread(sessoes.adicionar, user, sessao_id, item)
+    history_list.append(item)
+    response = templates.TemplateResponse("chat.html", {"request": request, "history": history_list})
+    _gravar_cookie_sessao(response, sessao_id)
+    return response
+
+async def _eventos_resposta(question: str, history_list: list, user: str, sessao_id: str):
+    """Eventos SSE da resposta (`delta`... e `fim`), gravando o turno na sessão ao final."""
+    intencao, chunks = await _preparar_pergunta(question, history_list, user)
+    tipo_prompt = intencao["tipo_prompt"]
+    async for evento in generate_answer_stream_async(
+        question,
+        context=chunks,
+        history=history_list,
+        tipo_de_prompt=tipo_prompt,
+        is_first_question=len(history_list) == 0,
+        intencao=intencao,
+    ):
+        if evento["tipo"] == "fim":
+            item = _concluir_pergunta(
+                user, question, chunks, tipo_prompt,
+                evento["resposta"], evento["quick_replies"], evento["progresso"],
+            )
+            await asyncio.to_thread(sessoes.adicionar, user, sessao_id, item)
+            evento = {"tipo": "fim", "html": item["ai"], "quick_replies": item["quick_replies"]}
+        yield f"data: {json.dumps(evento, ensure_ascii=False)}\n\n"
+
+def _streaming_eventos(eventos, sessao_id: str) -> StreamingResponse:
+    response = StreamingResponse(
+        eventos,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+    _gravar_cookie_sessao(response, sessao_id)
+    return response
+
+@app.post("/ask/stream")
+async def ask_stream(
+    request: Request,
+    question: str = Form(...),
+    user: str = Depends(get_current_user),
+):
+    """
+    Mesma lógica de /ask, mas envia a resposta por Server-Sent Events:
+    eventos `delta` com o texto à medida que o LLM gera e um evento `fim`
+    com o HTML final e os quick replies.
+    """
+    sessao_id = _sessao_id(request)
+    history_list = await asyncio.to_thread(sessoes.carregar, user, sessao_id)
+    return _streaming_eventos(_eventos_resposta(question, history_list, user, sessao_id), sessao_id)
+
+@app.post("/voice/ask")
+async def voice_ask(
+    request: Request,
+    audio: UploadFile = File(...),
+    user: str = Depends(get_current_user),
+):
+    """
+    Pergunta por voz: o áudio é lido e transcrito em memória (sem arquivo
+    temporário) e a transcrição segue o mesmo fluxo de /ask/stream. O
+    primeiro evento é `{"tipo": "transcricao", "texto": ...}`.
+    """
+    try:
+        conteudo = await ler_upload(audio)
+    except ValueError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    if not conteudo:
+        raise HTTPException(status_code=400, detail="Áudio vazio.")
+    try:
+        question = (await transcrever_audio(conteudo, audio.filename or "audio.webm")).strip()
+    except FilaCheia:
+        raise HTTPException(
+            status_code=503,
+            detail="Muitas perguntas por voz ao mesmo tempo. Tente de novo em instantes.",
+            headers={"Retry-After": "5"},
+        )
+    if not question:
+        raise HTTPException(status_code=422, detail="Não foi possível entender o áudio.")
+
+    sessao_id = _sessao_id(request)
+    history_list = await asyncio.to_thread(sessoes.carregar, user, sessao_id)
+
+    async def eventos():
+        yield f"data: {json.dumps({'tipo': 'transcricao', 'texto': question}, ensure_ascii=False)}\n\n"
+        async for evento in _eventos_resposta(question, history_list, user, sessao_id):
+            yield evento
+
+    return _streaming_eventos(eventos(), sessao_id)
@@ -0,0 +1,71 @@
+# pregerar_conteudo.py
+# Pré-gera o texto canônico de cada etapa (1, 2 e 3) de todas as aulas de
+# AULAS_POR_MODULO e grava no content_store. O generate_answer serve esses
+# textos quando o aluno só avança na aula ("sim", "próxima aula"...) e chama o
+# LLM apenas para perguntas personalizadas.
+#
+# Uso: python pregerar_conteudo.py            (só o que falta na versão atual)
+#      python pregerar_conteudo.py --forcar   (regenera tudo)
+#      python pregerar_conteudo.py --limpar   (também apaga versões antigas)
+
+import asyncio
+import os
+import sys
+import time
+
+from content_store import conteudo_aulas
+from gpt_utils import AULAS_POR_MODULO, BLOCO_MODULOS, _chamar_llm_async, instrucao_etapa, versao_etapa
+from prompt_builder import MODELO_LLM, montar_prompt
+from search_engine import retrieve_for_progresso
+
+ETAPAS = (1, 2, 3)
+PREGERAR_PARALELOS = int(os.getenv("PREGERAR_PARALELOS", "4"))
+
+# Mensagem do aluno usada no prompt canônico: equivale a só seguir a aula
+PERGUNTA_CANONICA = "sim"
+
+
+def tarefas_pendentes(forcar: bool = False) -> list:
+    tarefas = []
+    for modulo, aulas in AULAS_POR_MODULO.items():
+        for aula in aulas:
+            for etapa in ETAPAS:
+                versao = versao_etapa(modulo, aula, etapa)
+                if forcar or conteudo_aulas.buscar(modulo, aula, etapa, versao) is None:
+                    tarefas.append((modulo, aula, etapa, versao))
+    return tarefas
+
+
+async def gerar_etapa(modulo: int, aula: str, etapa: int, versao: str, semaforo: asyncio.Semaphore) -> bool:
+    async with semaforo:
+        progresso = {"modulo": modulo, "aula": aula, "etapa": etapa}
+        chunks, _ = await asyncio.to_thread(
+            retrieve_for_progresso, f"módulo {modulo} aula {aula}", progresso
+        )
+        prompt = montar_prompt(
+            instrucao_etapa(modulo, aula, etapa), PERGUNTA_CANONICA, chunks, [], BLOCO_MODULOS, modulo
+        )
+        try:
+            texto = await _chamar_llm_async(prompt)
+        except Exception as e:
+            print(f"⚠️ Falha em módulo {modulo}, aula {aula}, etapa {etapa}:", repr(e))
+            return False
+    await asyncio.to_thread(conteudo_aulas.gravar, modulo, aula, etapa, versao, texto, MODELO_LLM)
+    print(f"📝 Módulo {modulo}, aula {aula}, etapa {etapa} ({len(texto)} caracteres)")
+    return True
+
+
+async def pregerar(forcar: bool = False, paralelos: int = PREGERAR_PARALELOS) -> dict:
+    tarefas = tarefas_pendentes(forcar)
+    semaforo = asyncio.Semaphore(paralelos)
+    resultados = await asyncio.gather(*(gerar_etapa(*t, semaforo) for t in tarefas))
+    return {"pendentes": len(tarefas), "gerados": sum(resultados), "falhas": resultados.count(False)}
+
+
+if __name__ == "__main__":
+    inicio = time.time()
+    stats = asyncio.run(pregerar(forcar="--forcar" in sys.argv))
+    if "--limpar" in sys.argv:
+        atuais = {versao_etapa(m, a, e) for m, aulas in AULAS_POR_MODULO.items() for a in aulas for e in ETAPAS}
+        stats["removidos"] = conteudo_aulas.limpar_versoes_antigas(atuais)
+    print(f"✅ Conteúdo das aulas: {stats} em {time.time() - inicio:.1f}s ({len(conteudo_aulas)} textos no banco)")
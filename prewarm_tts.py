@@ -0,0 +1,69 @@
+# prewarm_tts.py
+# Pré-gera (no deploy) o áudio das respostas fixas do chat: boas-vindas, menu de
+# módulos e a mensagem de fora do escopo, com cada saudação e fechamento.
+# O modo voz (tts_em_trechos) sintetiza e guarda o cache por trecho de
+# dividir_em_frases, então o aquecimento usa os mesmos trechos das respostas
+# montadas como no gpt_utils; trechos já em cache não chamam a API de novo.
+
+import asyncio
+import time
+
+from gpt_utils import CLOSINGS, GREETINGS, MENSAGEM_BOAS_VINDAS, MENU_MODULOS, OUT_OF_SCOPE_MSG
+from voice_utils import (
+    ELEVEN_API_KEY,
+    TTS_PARALELOS,
+    _arquivo_em_cache,
+    chave_audio,
+    dividir_em_frases,
+    limpar_cache_audio,
+    texto_para_fala,
+    tts_with_elevenlabs_async,
+)
+
+
+def respostas_fixas() -> list:
+    """As respostas fixas como o _preparar_turno as monta (com e sem saudação)."""
+    respostas = [OUT_OF_SCOPE_MSG]
+    for saudacao in ["", *GREETINGS]:
+        respostas.append(f"{saudacao}<br><br>{MENU_MODULOS}")
+        for fechamento in CLOSINGS:
+            if saudacao:
+                respostas.append(f"{saudacao}<br><br>{MENSAGEM_BOAS_VINDAS}<br><br>{fechamento}")
+            else:
+                respostas.append(f"{MENSAGEM_BOAS_VINDAS}<br><br>{fechamento}")
+    return respostas
+
+
+def trechos_fixos() -> list:
+    """Trechos distintos (na ordem em que aparecem) que o modo voz pede para essas respostas."""
+    trechos = {}
+    for resposta in respostas_fixas():
+        for trecho in dividir_em_frases(resposta):
+            trechos.setdefault(trecho, None)
+    return list(trechos)
+
+
+async def prewarm(paralelos: int = TTS_PARALELOS) -> dict:
+    stats = {"em_cache": 0, "gerados": 0, "falhas": 0}
+    semaforo = asyncio.Semaphore(paralelos)
+
+    async def aquecer(trecho):
+        if _arquivo_em_cache(f"{chave_audio(texto_para_fala(trecho))}.mp3"):
+            stats["em_cache"] += 1
+            return
+        async with semaforo:
+            filename = await tts_with_elevenlabs_async(trecho)
+        stats["gerados" if filename else "falhas"] += 1
+
+    await asyncio.gather(*(aquecer(t) for t in trechos_fixos()))
+    return stats
+
+
+if __name__ == "__main__":
+    if not ELEVEN_API_KEY:
+        print("🔇 ELEVEN_API_KEY não definida: pré-geração de áudio ignorada.")
+    else:
+        inicio = time.time()
+        limpar_cache_audio()
+        stats = asyncio.run(prewarm())
+        print(f"🔊 Trechos de áudio fixos: {stats} em {time.time() - inicio:.1f}s")
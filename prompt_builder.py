@@ -0,0 +1,226 @@
+# prompt_builder.py
+# Montagem do prompt do LLM com orçamento explícito de tokens:
+# só o módulo atual e os vizinhos da estrutura do curso, janela dos últimos
+# turnos + resumo curto dos anteriores, e contexto cortado para caber.
+
+import os
+import re
+from contextvars import ContextVar
+
+MODELO_LLM = "gpt-4o-mini"
+PROMPT_MAX_TOKENS = int(os.getenv("PROMPT_MAX_TOKENS", "3000"))
+PROMPT_HISTORICO_TURNOS = int(os.getenv("PROMPT_HISTORICO_TURNOS", "4"))
+PROMPT_HISTORICO_MAX_TOKENS = int(os.getenv("PROMPT_HISTORICO_MAX_TOKENS", "700"))
+PROMPT_RESUMO_MAX_TOKENS = int(os.getenv("PROMPT_RESUMO_MAX_TOKENS", "150"))
+# Sem tiktoken, estimativa conservadora para português
+CHARS_POR_TOKEN = 3.5
+# Abaixo disso não vale a pena incluir um trecho cortado
+MIN_TOKENS_TRECHO = 80
+
+# Tokens do último prompt montado na requisição atual (None se a resposta não usou o LLM)
+tokens_prompt: ContextVar = ContextVar("tokens_prompt", default=None)
+
+_encoding = None
+_encoding_carregado = False
+
+RE_TAG_HTML = re.compile(r"<[^>]+>")
+RE_ESPACOS = re.compile(r"\s+")
+RE_CABECALHO_MODULO = re.compile(r"^módulo\s+0?(\d+)", re.IGNORECASE)
+
+TEMPLATE_PROMPT = """{instruction}
+
+Você é a professora Nanda Mac.ia, uma inteligência artificial altamente didática, criada especificamente para ensinar e tirar dúvidas de Doutores(as) que estudam o Curso Online Consultório High Ticket, ministrado por Nanda Mac Dowell.
+
+Leia atentamente o histórico da conversa antes de responder, compreendendo o contexto exato da interação atual para garantir precisão na sua resposta.
+
+IMPORTANTE: Sempre cite o nome do módulo e título da aula exatamente como está na estrutura abaixo. Não adapte, não resuma, não traduza.
+
+ESTRUTURA DO CURSO – MÓDULO ATUAL E VIZINHOS:
+
+{estrutura}
+
+Histórico da conversa anterior:
+{historico}
+
+Pergunta atual do Doutor(a):
+'{question}'
+
+Utilize o conteúdo adicional abaixo, se relevante:
+{context}
+        """
+
+
+def _obter_encoding():
+    """Tokenizer do modelo via tiktoken (carregado uma vez); None se indisponível."""
+    global _encoding, _encoding_carregado
+    if not _encoding_carregado:
+        _encoding_carregado = True
+        try:
+            import tiktoken
+            try:
+                _encoding = tiktoken.encoding_for_model(MODELO_LLM)
+            except KeyError:
+                _encoding = tiktoken.get_encoding("o200k_base")
+        except Exception as e:
+            print("⚠️ tiktoken indisponível, estimando tokens pelo tamanho do texto:", repr(e))
+            _encoding = None
+    return _encoding
+
+
+def contar_tokens(texto: str) -> int:
+    if not texto:
+        return 0
+    encoding = _obter_encoding()
+    if encoding is not None:
+        return len(encoding.encode(texto))
+    return int(len(texto) / CHARS_POR_TOKEN) + 1
+
+
+def cortar_tokens(texto: str, max_tokens: int) -> str:
+    """Corta `texto` para caber em `max_tokens`, terminando com reticências se cortado."""
+    if max_tokens <= 0:
+        return ""
+    if contar_tokens(texto) <= max_tokens:
+        return texto
+    encoding = _obter_encoding()
+    if encoding is not None:
+        return encoding.decode(encoding.encode(texto)[:max_tokens - 1]).rstrip() + "…"
+    return texto[:int((max_tokens - 1) * CHARS_POR_TOKEN)].rstrip() + "…"
+
+
+def _modulos_do_bloco(bloco_modulos: str) -> dict:
+    """Divide o BLOCO_MODULOS em {número do módulo: texto do módulo com as aulas}."""
+    modulos = {}
+    for bloco in bloco_modulos.strip().split("\n\n"):
+        match = RE_CABECALHO_MODULO.match(bloco.strip())
+        if match:
+            modulos[int(match.group(1))] = bloco.strip()
+    return modulos
+
+
+def estrutura_resumida(bloco_modulos: str, modulo=None) -> str:
+    """
+    Aulas do módulo atual e dos vizinhos (anterior e seguinte); dos demais,
+    só o título. Sem módulo definido, só os títulos de todos os módulos.
+    """
+    modulos = _modulos_do_bloco(bloco_modulos)
+    try:
+        modulo = int(modulo) if modulo is not None else None
+    except (TypeError, ValueError):
+        modulo = None
+    partes = []
+    for numero, texto in modulos.items():
+        if modulo is not None and abs(numero - modulo) <= 1:
+            partes.append(texto)
+        else:
+            partes.append(texto.split("\n", 1)[0])
+    return "\n\n".join(partes)
+
+
+def _texto_plano(html: str) -> str:
+    return RE_ESPACOS.sub(" ", RE_TAG_HTML.sub(" ", html or "")).strip()
+
+
+def montar_historico(history, max_tokens: int = None, turnos: int = None) -> str:
+    """
+    Últimos `turnos` da conversa na íntegra (cortados ao orçamento) e, antes
+    deles, um resumo compacto dos turnos anteriores: perguntas e aulas vistas.
+    """
+    if not history or not isinstance(history, list):
+        return "(início da conversa)"
+    max_tokens = PROMPT_HISTORICO_MAX_TOKENS if max_tokens is None else max_tokens
+    turnos = PROMPT_HISTORICO_TURNOS if turnos is None else turnos
+
+    if turnos > 0:
+        antigos, recentes = history[:-turnos], history[-turnos:]
+    else:
+        antigos, recentes = history, []
+
+    resumo = ""
+    if antigos:
+        aulas = []
+        for item in antigos:
+            aula = (item.get("progresso") or {}).get("aula")
+            if aula and aula not in aulas:
+                aulas.append(str(aula))
+        perguntas = "; ".join(_texto_plano(item.get("user", ""))[:80] for item in antigos)
+        resumo = f"Resumo de {len(antigos)} turno(s) anterior(es)"
+        if aulas:
+            resumo += f" — aulas vistas: {', '.join(aulas)}"
+        resumo = cortar_tokens(f"{resumo}. Perguntas: {perguntas}", PROMPT_RESUMO_MAX_TOKENS)
+
+    # Os turnos mais recentes têm prioridade: monta do último para o primeiro
+    restante = max_tokens - contar_tokens(resumo)
+    blocos = []
+    for item in reversed(recentes):
+        if restante <= 0:
+            break
+        bloco = f"Doutor(a): {_texto_plano(item.get('user', ''))}\nNanda Mac.ia: {_texto_plano(item.get('ai', ''))}"
+        bloco = cortar_tokens(bloco, restante)
+        restante -= contar_tokens(bloco)
+        blocos.append(bloco)
+    blocos.reverse()
+
+    return "\n\n".join(([resumo] if resumo else []) + blocos)
+
+
+def cabecalho_trecho(i: int, chunk: dict) -> str:
+    """
+    Cabeçalho do trecho no prompt. Só mostra a similaridade vetorial (cosseno);
+    o score RRF da busca híbrida e o BM25 não estão nessa escala e ficam de fora.
+    """
+    similaridade = chunk.get("similaridade")
+    if similaridade is None:
+        return f"[Trecho {i}]"
+    return f"[Trecho {i} | similaridade {similaridade:.2f}]"
+
+
+def montar_contexto(chunks, max_tokens: int) -> str:
+    """
+    Inclui os trechos em ordem de relevância enquanto couberem; o último pode
+    entrar cortado se sobrar espaço útil. Aceita também o contexto já em texto.
+    """
+    if not chunks or max_tokens <= 0:
+        return ""
+    if isinstance(chunks, str):
+        return cortar_tokens(chunks, max_tokens)
+    partes = []
+    restante = max_tokens
+    for i, chunk in enumerate(chunks, start=1):
+        bloco = f"{cabecalho_trecho(i, chunk)}\n{chunk.get('texto', '')}"
+        tokens = contar_tokens(bloco) + 1
+        if tokens > restante:
+            if restante >= MIN_TOKENS_TRECHO:
+                partes.append(cortar_tokens(bloco, restante))
+            break
+        partes.append(bloco)
+        restante -= tokens
+    return "\n\n".join(partes)
+
+
+def montar_prompt(instruction, question, chunks, history, bloco_modulos, modulo=None, max_tokens: int = None) -> str:
+    """
+    Monta o prompt dentro de `max_tokens` (PROMPT_MAX_TOKENS por padrão).
+    A parte fixa (instrução, estrutura e pergunta) entra sempre; o histórico
+    usa até PROMPT_HISTORICO_MAX_TOKENS e o contexto fica com o que sobrar.
+    O total é registrado em `tokens_prompt`.
+    """
+    max_tokens = PROMPT_MAX_TOKENS if max_tokens is None else max_tokens
+    campos = {
+        "instruction": instruction,
+        "estrutura": estrutura_resumida(bloco_modulos, modulo),
+        "question": question,
+        "historico": "",
+        "context": "",
+    }
+    fixo = contar_tokens(TEMPLATE_PROMPT.format(**campos))
+
+    campos["historico"] = montar_historico(history, min(PROMPT_HISTORICO_MAX_TOKENS, max(max_tokens - fixo, 0)))
+    restante = max_tokens - fixo - contar_tokens(campos["historico"])
+    campos["context"] = montar_contexto(chunks, restante)
+
+    prompt = TEMPLATE_PROMPT.format(**campos)
+    total = contar_tokens(prompt)
+    tokens_prompt.set(total)
+    print(f"🧮 DEBUG — Prompt com {total} tokens (orçamento {max_tokens})")
+    return prompt
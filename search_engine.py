@@ -1,16 +1,22 @@
+import asyncio
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from llama_index.core import (
-    SimpleDirectoryReader,
-    GPTVectorStoreIndex,
     StorageContext,
     load_index_from_storage,
     Settings,
+    QueryBundle,
 )
+from llama_index.core.vector_stores import MetadataFilters, ExactMatchFilter
 from llama_index.embeddings.openai import OpenAIEmbedding
 
-# 📁 Diretório e caminho do índice
-INDEX_DIR = "storage"
-INDEX_FILE = os.path.join(INDEX_DIR, "index.json")
+from chunker import versao_indice_ok
+from embedding_cache import EMBED_MODEL, obter_embedding, obter_embedding_async
+from generate_index import INDEX_DIR, gerar_indice
+from lexical_search import buscar_trechos
+from vector_store import VECTOR_BACKEND, ARQUIVOS_BACKEND, abrir_store
 
 # 🔑 Configura a API Key da OpenAI
 api_key = os.getenv("OPENAI_API_KEY")
@@ -19,74 +25,328 @@ if not api_key:
 
 # 🤖 Define o modelo de embedding
 Settings.embed_model = OpenAIEmbedding(
-    model="text-embedding-3-small",
+    model=EMBED_MODEL,
     api_key=api_key,
 )
 
+def _indice_pronto() -> bool:
+    if not versao_indice_ok(INDEX_DIR):
+        return False
+    if VECTOR_BACKEND in ARQUIVOS_BACKEND:
+        return os.path.exists(os.path.join(INDEX_DIR, ARQUIVOS_BACKEND[VECTOR_BACKEND]))
+    return True
+
 def load_or_build_index():
-    """Carrega o índice existente ou cria um novo a partir de transcricoes.txt."""
-    if os.path.exists(INDEX_FILE):
-        print("📁 Índice encontrado. Carregando do disco...")
-        storage_context = StorageContext.from_defaults(persist_dir=INDEX_DIR)
-        return load_index_from_storage(storage_context)
-    else:
-        print("⚙️ Índice não encontrado. Construindo novo...")
-        docs = SimpleDirectoryReader(input_files=["transcricoes.txt"]).load_data()
-        index = GPTVectorStoreIndex.from_documents(docs)
-        index.storage_context.persist(persist_dir=INDEX_DIR)
-        print(f"✅ Índice construído com {len(docs)} documentos.")
-        return index
+    """
+    Carrega o índice existente ou cria um novo a partir de transcricoes.txt.
+    Com VECTOR_BACKEND=faiss/numpy o JSON do LlamaIndex não é carregado (retorna None).
+    """
+    if not _indice_pronto():
+        print("⚙️ Índice não encontrado ou desatualizado. Construindo novo...")
+        relatorio = gerar_indice()
+        print(f"✅ Índice construído: {relatorio}")
+    if VECTOR_BACKEND in ARQUIVOS_BACKEND:
+        return None
+    print("📁 Carregando índice do disco...")
+    storage_context = StorageContext.from_defaults(persist_dir=INDEX_DIR)
+    return load_index_from_storage(storage_context)
 
 # ⚡ Inicializa o índice na importação deste módulo
 index = load_or_build_index()
+store_local = abrir_store(VECTOR_BACKEND, INDEX_DIR)
+if store_local is not None:
+    print(f"📦 Store vetorial '{VECTOR_BACKEND}' carregado do disco (mmap).")
 
-def retrieve_relevant_context(
+# ♻️ Registro de retrievers pré-construídos, compartilhados entre requisições.
+# A chave é (top_k, filtros); os retrievers não guardam estado por consulta,
+# então a mesma instância pode atender requisições concorrentes.
+RETRIEVERS_PADRAO = [(3, None), (5, None)]
+
+_retrievers = {}
+_retrievers_lock = threading.Lock()
+
+def _chave_retriever(top_k: int, filtros: dict = None) -> tuple:
+    return (top_k, tuple(sorted((filtros or {}).items())))
+
+def _construir_retriever(top_k: int, filtros: dict = None):
+    kwargs = {"similarity_top_k": top_k}
+    if filtros:
+        kwargs["filters"] = MetadataFilters(
+            filters=[ExactMatchFilter(key=k, value=v) for k, v in sorted(filtros.items())]
+        )
+    return index.as_retriever(**kwargs)
+
+def get_retriever(top_k: int = 3, chunk_size: int = 512, filtros: dict = None):
+    """
+    Devolve o retriever do registro para a combinação pedida, criando-o uma única vez.
+    `chunk_size` é mantido por compatibilidade: o tamanho dos blocos é definido
+    na indexação (chunker.py), não na consulta.
+    """
+    chave = _chave_retriever(top_k, filtros)
+    retriever = _retrievers.get(chave)
+    if retriever is None:
+        with _retrievers_lock:
+            retriever = _retrievers.get(chave)
+            if retriever is None:
+                retriever = _construir_retriever(top_k, filtros)
+                _retrievers[chave] = retriever
+    return retriever
+
+if index is not None:
+    for _top_k, _filtros in RETRIEVERS_PADRAO:
+        get_retriever(_top_k, filtros=_filtros)
+
+# 🚫 Termos fora de escopo: trechos que os mencionam não vão para o prompt
+TERMOS_PROIBIDOS = [
+    "instagram", "vídeos para instagram", "celular para gravar", "smartphone",
+    "tiktok", "post viral", "gravar vídeos", "microfone", "câmera",
+    "edição de vídeo", "hashtags", "stories", "marketing de conteúdo",
+    "produção de vídeo", "influencer"
+]
+
+# 📉 Similaridade mínima para aceitar um trecho (0 desativa o corte)
+SCORE_MINIMO = float(os.getenv("RETRIEVAL_SCORE_MINIMO", "0"))
+
+# 🔀 Busca híbrida: pesos de cada ranking na fusão RRF e candidatos por busca
+HYBRID_PESO_VETOR = float(os.getenv("HYBRID_PESO_VETOR", "1.0"))
+HYBRID_PESO_LEXICO = float(os.getenv("HYBRID_PESO_LEXICO", "1.0"))
+HYBRID_CANDIDATOS = int(os.getenv("HYBRID_CANDIDATOS", "10"))
+RRF_K = int(os.getenv("HYBRID_RRF_K", "60"))
+
+# 🎯 Escopo da busca pelo progresso do aluno: "aula", "modulo" ou "nenhum".
+# O padrão é "modulo": os módulos das transcrições batem com os do curso, mas a
+# numeração das aulas não (ex.: a 2.5 das transcrições é "O que evitar no
+# consultório", a do curso é papelaria/brindes; o módulo 3 tem 25 aulas gravadas
+# e 5 no AULAS_POR_MODULO). Só usar "aula" depois de reconciliar a numeração.
+RETRIEVAL_FILTRO_PROGRESSO = os.getenv("RETRIEVAL_FILTRO_PROGRESSO", "modulo")
+
+# Threads para a busca vetorial em paralelo com a lexical, quando o embedding ainda
+# precisa ir à API (o caminho assíncrono já chega com o embedding e não usa este pool)
+HYBRID_THREADS = int(os.getenv("HYBRID_THREADS", "16"))
+_executor = ThreadPoolExecutor(max_workers=HYBRID_THREADS, thread_name_prefix="busca")
+
+def _buscar_vetorial(question: str, top_k: int, chunk_size: int, filtros: dict = None, embedding: list = None) -> list:
+    """Consulta o índice vetorial e devolve os candidatos sem filtragem."""
+    # O embedding vem do cache (memória/disco); só perguntas novas vão à API
+    if embedding is None:
+        embedding = obter_embedding(question)
+    if store_local is not None:
+        return store_local.buscar(embedding, top_k=top_k, filtros=filtros)
+
+    retriever = get_retriever(top_k, chunk_size, filtros)
+    query_bundle = QueryBundle(query_str=question, embedding=embedding)
+    return [
+        {
+            "id": resultado.node.node_id,
+            "texto": resultado.node.get_content().strip(),
+            "score": float(resultado.score if resultado.score is not None else 0.0),
+            "metadata": dict(resultado.node.metadata or {}),
+        }
+        for resultado in retriever.retrieve(query_bundle)
+    ]
+
+def _filtrar_trechos(candidatos: list, score_minimo: float = 0.0) -> list:
+    """Remove trechos vazios, abaixo do score mínimo ou com termos fora de escopo."""
+    chunks = []
+    for chunk in candidatos:
+        if not chunk["texto"] or chunk["score"] < score_minimo:
+            continue
+        lower = chunk["texto"].lower()
+        if any(tp in lower for tp in TERMOS_PROIBIDOS):
+            print("🔎 DEBUG — Trecho descartado por termo proibido:", chunk["id"])
+            continue
+        chunks.append(chunk)
+    return chunks
+
+def retrieve_relevant_chunks(
     question: str,
     top_k: int = 3,
-    chunk_size: int = 512
-) -> str:
+    chunk_size: int = 512,
+    filtros: dict = None
+) -> list:
     """
-    Busca no índice até `top_k` trechos que respondam à `question`.
-    Usa `chunk_size` para controlar o tamanho dos blocos de texto.
-    Retorna string vazia se não encontrar algo relevante.
+    Busca direto no índice vetorial os `top_k` trechos mais próximos da `question`,
+    sem a etapa de síntese via LLM do query engine.
+    `filtros` restringe a busca por metadados (igualdade exata).
+    Retorna uma lista de dicts com `id`, `texto`, `score` e `metadata`.
     """
     # DEBUG: confira nos logs qual pergunta chegou
     print("🔎 DEBUG — Pergunta para contexto:", question)
 
-    # cria um engine de consulta ajustado
-    engine = index.as_query_engine(
-        similarity_top_k=top_k,
-        chunk_size=chunk_size
+    try:
+        chunks = _filtrar_trechos(_buscar_vetorial(question, top_k, chunk_size, filtros), SCORE_MINIMO)
+        chunks = [dict(c, similaridade=c["score"]) for c in chunks]
+    except Exception as e:
+        # 🛟 Embeddings indisponíveis/lentos: cai para a busca lexical local (BM25)
+        print("⚠️ Busca vetorial falhou, usando busca lexical:", repr(e))
+        chunks = _filtrar_trechos(buscar_trechos(question, top_k=top_k, filtros=filtros))
+
+    print(f"🔎 DEBUG — {len(chunks)} trecho(s) aceito(s):", [round(c["score"], 3) for c in chunks])
+    return chunks
+
+def fundir_rrf(listas: list, top_k: int, k: int = None) -> list:
+    """
+    Reciprocal-rank fusion: `listas` é uma lista de pares (peso, trechos ranqueados).
+    Cada trecho soma peso / (k + posição) em cada lista em que aparece. O
+    `score` passa a ser o valor RRF (só serve para ordenar); a similaridade
+    vetorial original, se o trecho veio da busca vetorial, fica em `similaridade`.
+    """
+    k = RRF_K if k is None else k
+    fundidos = {}
+    for peso, trechos in listas:
+        for posicao, chunk in enumerate(trechos, start=1):
+            atual = fundidos.get(chunk["id"])
+            if atual is None:
+                atual = dict(chunk, score=0.0, scores_origem={})
+                fundidos[chunk["id"]] = atual
+            atual["score"] += peso / (k + posicao)
+            atual["scores_origem"][chunk.get("origem", "?")] = chunk["score"]
+    for atual in fundidos.values():
+        atual["similaridade"] = atual["scores_origem"].get("vetorial")
+    return sorted(fundidos.values(), key=lambda c: c["score"], reverse=True)[:top_k]
+
+def retrieve_hybrid(
+    question: str,
+    top_k: int = 3,
+    chunk_size: int = 512,
+    filtros: dict = None,
+    peso_vetor: float = None,
+    peso_lexico: float = None,
+    candidatos: int = None,
+    embedding: list = None,
+    sem_vetor: bool = False
+) -> tuple:
+    """
+    Busca híbrida: roda a busca vetorial e a lexical, funde os rankings com RRF
+    e devolve os `top_k` melhores trechos.
+    Com `embedding` (vetor da pergunta já calculado) as duas buscas são locais e
+    rodam na própria thread; sem ele, a vetorial roda em paralelo enquanto o
+    embedding vai à API. `sem_vetor` pula a busca vetorial (embeddings fora do ar).
+    Retorna (trechos, tempos), com os tempos de cada etapa em milissegundos.
+    """
+    print("🔎 DEBUG — Pergunta para contexto (híbrida):", question)
+    peso_vetor = HYBRID_PESO_VETOR if peso_vetor is None else peso_vetor
+    peso_lexico = HYBRID_PESO_LEXICO if peso_lexico is None else peso_lexico
+    candidatos = candidatos or max(HYBRID_CANDIDATOS, top_k)
+
+    def _cronometrar(fn, *args, **kwargs):
+        inicio = time.perf_counter()
+        resultado = fn(*args, **kwargs)
+        return resultado, (time.perf_counter() - inicio) * 1000
+
+    inicio_total = time.perf_counter()
+    futuro_vetor = None
+    if embedding is None and not sem_vetor:
+        futuro_vetor = _executor.submit(_cronometrar, _buscar_vetorial, question, candidatos, chunk_size, filtros)
+
+    tempos = {}
+    lexicais, tempos["lexical_ms"] = _cronometrar(buscar_trechos, question, candidatos, filtros)
+    lexicais = _filtrar_trechos(lexicais)
+    try:
+        if sem_vetor:
+            vetoriais, tempos["vetorial_ms"] = [], None
+        elif futuro_vetor is not None:
+            vetoriais, tempos["vetorial_ms"] = futuro_vetor.result()
+        else:
+            vetoriais, tempos["vetorial_ms"] = _cronometrar(
+                _buscar_vetorial, question, candidatos, chunk_size, filtros, embedding
+            )
+        vetoriais = _filtrar_trechos(vetoriais, SCORE_MINIMO)
+    except Exception as e:
+        print("⚠️ Busca vetorial falhou, usando só a lexical:", repr(e))
+        vetoriais, tempos["vetorial_ms"] = [], None
+
+    inicio_fusao = time.perf_counter()
+    chunks = fundir_rrf(
+        [
+            (peso_vetor, [dict(c, origem="vetorial") for c in vetoriais]),
+            (peso_lexico, [dict(c, origem="lexical") for c in lexicais]),
+        ],
+        top_k=top_k,
     )
+    tempos["fusao_ms"] = (time.perf_counter() - inicio_fusao) * 1000
+    tempos["total_ms"] = (time.perf_counter() - inicio_total) * 1000
 
-    response = engine.query(question)
-    response_str = str(response).strip()
-    # DEBUG: confira o texto bruto retornado
-    print("🔎 DEBUG — Contexto bruto retornado:", response_str)
-
-    lower = response_str.lower()
-    # se vazio ou sem sentido
-    if not lower or lower in ("none", "null"):
-        print("🔎 DEBUG — Contexto vazio após normalização")
-        return ""
-
-    # bloqueia respostas genéricas
-    for frase in ("não tenho certeza", "desculpe", "não sei"):
-        if frase in lower:
-            print("🔎 DEBUG — Contexto bloqueado por frase de incerteza")
-            return ""
-
-    # filtra termos fora de escopo
-    proibidos = [
-        "instagram", "vídeos para instagram", "celular para gravar", "smartphone",
-        "tiktok", "post viral", "gravar vídeos", "microfone", "câmera",
-        "edição de vídeo", "hashtags", "stories", "marketing de conteúdo",
-        "produção de vídeo", "influencer"
-    ]
-    if any(tp in lower for tp in proibidos):
-        print("🔎 DEBUG — Contexto bloqueado por termo proibido")
-        return ""
+    print(
+        f"🔎 DEBUG — {len(chunks)} trecho(s) híbridos:",
+        [(c["id"], {o: round(v, 3) for o, v in c["scores_origem"].items()}) for c in chunks], tempos,
+    )
+    return chunks, tempos
+
+def filtros_do_progresso(progresso: dict) -> list:
+    """
+    Filtros de metadados a partir do `progresso` do aluno, do mais específico ao
+    mais amplo (aula atual, se RETRIEVAL_FILTRO_PROGRESSO="aula"; módulo atual;
+    sem filtro).
+    """
+    if not progresso or progresso.get("visao_geral") or RETRIEVAL_FILTRO_PROGRESSO == "nenhum":
+        return [None]
+    niveis = []
+    if RETRIEVAL_FILTRO_PROGRESSO == "aula" and progresso.get("aula"):
+        niveis.append({"aula": str(progresso["aula"])})
+    if progresso.get("modulo") is not None:
+        niveis.append({"modulo": str(progresso["modulo"])})
+    niveis.append(None)
+    return niveis
 
-    # DEBUG: contexto aprovado
-    print("🔎 DEBUG — Contexto final aceito:", response_str)
-    return response_str
+def retrieve_for_progresso(
+    question: str,
+    progresso: dict = None,
+    top_k: int = 3,
+    embedding: list = None,
+    sem_vetor: bool = False
+) -> tuple:
+    """
+    Busca híbrida restrita à aula/módulo em que o aluno está. Se o escopo não
+    tiver `top_k` trechos, amplia para o módulo e depois para o curso inteiro.
+    O embedding da pergunta é obtido uma vez só, antes dos níveis; se a API
+    falhar, todos os níveis usam só a busca lexical.
+    Retorna (trechos, tempos), como retrieve_hybrid.
+    """
+    if embedding is None and not sem_vetor:
+        try:
+            embedding = obter_embedding(question)
+        except Exception as e:
+            print("⚠️ Embedding indisponível, usando só a busca lexical:", repr(e))
+            sem_vetor = True
+    for filtros in filtros_do_progresso(progresso):
+        chunks, tempos = retrieve_hybrid(
+            question, top_k=top_k, filtros=filtros, embedding=embedding, sem_vetor=sem_vetor
+        )
+        if len(chunks) >= top_k or filtros is None:
+            tempos["filtros"] = filtros
+            return chunks, tempos
+    return [], {}
+
+async def retrieve_for_progresso_async(question: str, progresso: dict = None, top_k: int = 3) -> tuple:
+    """
+    Versão assíncrona de retrieve_for_progresso. O embedding da pergunta é obtido
+    com o cliente assíncrono (única etapa de rede); a busca local, que é CPU e
+    leva poucos milissegundos, roda no executor padrão com esse embedding. Se a
+    API falhar, vai direto para a busca lexical, sem tentar de novo.
+    """
+    embedding, sem_vetor = None, False
+    try:
+        embedding = await obter_embedding_async(question)
+    except Exception as e:
+        print("⚠️ Embedding indisponível, usando só a busca lexical:", repr(e))
+        sem_vetor = True
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        None, retrieve_for_progresso, question, progresso, top_k, embedding, sem_vetor
+    )
+
+def retrieve_relevant_context(
+    question: str,
+    top_k: int = 3,
+    chunk_size: int = 512
+) -> str:
+    """
+    Busca no índice até `top_k` trechos que respondam à `question`
+    e devolve os textos concatenados (sem chamada ao LLM).
+    `chunk_size` é mantido por compatibilidade; o tamanho dos blocos
+    é definido na construção do índice.
+    Retorna string vazia se não encontrar algo relevante.
+    """
+    chunks = retrieve_relevant_chunks(question, top_k=top_k, chunk_size=chunk_size)
+    return "\n\n".join(c["texto"] for c in chunks)
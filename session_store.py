@@ -0,0 +1,151 @@
+# session_store.py
+# Histórico e progresso de cada conversa guardados no servidor, por
+# (usuário do JWT, id de sessão do cookie). O navegador só envia a pergunta.
+
+import copy
+import json
+import os
+import secrets
+import sqlite3
+import threading
+import time
+
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "memoria")  # "memoria" ou "sqlite"
+SESSION_DB = os.getenv("SESSION_DB", "sessoes.db")
+SESSION_COOKIE = "sessao"
+# Turnos guardados por sessão (o progresso vai no último turno)
+SESSION_MAX_TURNOS = int(os.getenv("SESSION_MAX_TURNOS", "20"))
+# Sessões sem uso por mais que isso (segundos) são descartadas
+SESSION_TTL = int(os.getenv("SESSION_TTL", "7200"))
+# Intervalo mínimo entre varreduras de sessões expiradas
+SESSION_VARREDURA = 60
+
+
+def novo_id_sessao() -> str:
+    return secrets.token_urlsafe(16)
+
+
+class SessoesMemoria:
+    """Sessões num dict em memória (um processo só; perdidas ao reiniciar)."""
+
+    def __init__(self, max_turnos: int = SESSION_MAX_TURNOS, ttl: int = SESSION_TTL):
+        self.max_turnos = max_turnos
+        self.ttl = ttl
+        self._sessoes = {}
+        self._lock = threading.Lock()
+        self._ultima_varredura = time.monotonic()
+
+    def _varrer(self, agora: float):
+        if agora - self._ultima_varredura < SESSION_VARREDURA:
+            return
+        self._ultima_varredura = agora
+        expiradas = [chave for chave, (acesso, _) in self._sessoes.items() if agora - acesso > self.ttl]
+        for chave in expiradas:
+            del self._sessoes[chave]
+
+    def carregar(self, usuario: str, sessao_id: str) -> list:
+        """Cópia do histórico da sessão ([] se não existir ou tiver expirado)."""
+        agora = time.monotonic()
+        with self._lock:
+            self._varrer(agora)
+            registro = self._sessoes.get((usuario, sessao_id))
+            if registro is None or agora - registro[0] > self.ttl:
+                return []
+            self._sessoes[(usuario, sessao_id)] = (agora, registro[1])
+            # cópia: generate_answer altera o progresso do último turno
+            return copy.deepcopy(registro[1])
+
+    def adicionar(self, usuario: str, sessao_id: str, item: dict):
+        agora = time.monotonic()
+        with self._lock:
+            _, historico = self._sessoes.get((usuario, sessao_id), (agora, []))
+            historico = (historico + [item])[-self.max_turnos:]
+            self._sessoes[(usuario, sessao_id)] = (agora, historico)
+
+    def limpar(self, usuario: str, sessao_id: str):
+        with self._lock:
+            self._sessoes.pop((usuario, sessao_id), None)
+
+    def __len__(self):
+        return len(self._sessoes)
+
+
+class SessoesSQLite:
+    """Sessões numa tabela SQLite (sobrevivem a reinícios e valem para vários workers)."""
+
+    def __init__(self, caminho: str = SESSION_DB, max_turnos: int = SESSION_MAX_TURNOS, ttl: int = SESSION_TTL):
+        self.caminho = caminho
+        self.max_turnos = max_turnos
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._ultima_varredura = 0.0
+        self._conn = sqlite3.connect(caminho, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS sessoes (
+                usuario TEXT NOT NULL,
+                sessao_id TEXT NOT NULL,
+                historico TEXT NOT NULL,
+                atualizado_em REAL NOT NULL,
+                PRIMARY KEY (usuario, sessao_id)
+            )
+        """)
+        self._conn.commit()
+
+    def _varrer(self, agora: float):
+        if agora - self._ultima_varredura < SESSION_VARREDURA:
+            return
+        self._ultima_varredura = agora
+        self._conn.execute("DELETE FROM sessoes WHERE atualizado_em < ?", (agora - self.ttl,))
+        self._conn.commit()
+
+    def carregar(self, usuario: str, sessao_id: str) -> list:
+        agora = time.time()
+        with self._lock:
+            self._varrer(agora)
+            linha = self._conn.execute(
+                "SELECT historico, atualizado_em FROM sessoes WHERE usuario = ? AND sessao_id = ?",
+                (usuario, sessao_id),
+            ).fetchone()
+            if linha is None or agora - linha[1] > self.ttl:
+                return []
+            self._conn.execute(
+                "UPDATE sessoes SET atualizado_em = ? WHERE usuario = ? AND sessao_id = ?",
+                (agora, usuario, sessao_id),
+            )
+            self._conn.commit()
+        return json.loads(linha[0])
+
+    def adicionar(self, usuario: str, sessao_id: str, item: dict):
+        agora = time.time()
+        with self._lock:
+            linha = self._conn.execute(
+                "SELECT historico FROM sessoes WHERE usuario = ? AND sessao_id = ?",
+                (usuario, sessao_id),
+            ).fetchone()
+            historico = (json.loads(linha[0]) if linha else []) + [item]
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sessoes (usuario, sessao_id, historico, atualizado_em) VALUES (?, ?, ?, ?)",
+                (usuario, sessao_id, json.dumps(historico[-self.max_turnos:], ensure_ascii=False), agora),
+            )
+            self._conn.commit()
+
+    def limpar(self, usuario: str, sessao_id: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM sessoes WHERE usuario = ? AND sessao_id = ?", (usuario, sessao_id))
+            self._conn.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM sessoes").fetchone()[0]
+
+
+def abrir_sessoes(backend: str = SESSION_BACKEND):
+    if backend == "sqlite":
+        return SessoesSQLite()
+    if backend != "memoria":
+        print(f"⚠️ SESSION_BACKEND '{backend}' desconhecido; usando memória.")
+    return SessoesMemoria()
+
+
+sessoes = abrir_sessoes()
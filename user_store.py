@@ -0,0 +1,100 @@
+# user_store.py
+# Usuários e hashes de senha (sha256_crypt) numa tabela SQLite. Os hashes são
+# calculados uma vez, ao cadastrar, e nunca na inicialização do app. A
+# verificação (centenas de milhares de rounds) roda num pool de threads
+# próprio, fora do event loop e sem ocupar o pool das rotas síncronas.
+#
+# Cadastrar/alterar senha: python user_store.py <usuario> <senha>
+
+import asyncio
+import os
+import sqlite3
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Optional
+
+from passlib.context import CryptContext
+
+USERS_DB = os.getenv("USERS_DB", "usuarios.db")
+AUTH_THREADS = int(os.getenv("AUTH_THREADS", str(min(4, os.cpu_count() or 1))))
+
+# 🔥 SOLUÇÃO DEFINITIVA — SEM BCRYPT
+pwd_context = CryptContext(schemes=["sha256_crypt"], deprecated="auto", sha256_crypt__default_rounds=535000)
+
+# Usuários criados junto com o banco (hash já calculado, 535000 rounds)
+USUARIOS_INICIAIS = {
+    "aluno1": "$5$rounds=535000$eSMdhq3qEg/DCRxI$3zTAxofSpQVWjFpgljt4tK5Jq6xTmwDgySazI.msh7C",
+}
+
+
+class Usuarios:
+    """Tabela de usuários; os hashes já lidos ficam em memória."""
+
+    def __init__(self, caminho: str = USERS_DB):
+        self._lock = threading.Lock()
+        self._hashes = {}
+        self._conn = sqlite3.connect(caminho, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS usuarios (
+                usuario TEXT PRIMARY KEY,
+                senha_hash TEXT NOT NULL,
+                criado_em TEXT NOT NULL
+            )
+        """)
+        agora = datetime.now().isoformat()
+        self._conn.executemany(
+            "INSERT OR IGNORE INTO usuarios (usuario, senha_hash, criado_em) VALUES (?, ?, ?)",
+            [(usuario, senha_hash, agora) for usuario, senha_hash in USUARIOS_INICIAIS.items()],
+        )
+        self._conn.commit()
+
+    def obter_hash(self, usuario: str) -> Optional[str]:
+        senha_hash = self._hashes.get(usuario)
+        if senha_hash is not None:
+            return senha_hash
+        with self._lock:
+            linha = self._conn.execute("SELECT senha_hash FROM usuarios WHERE usuario = ?", (usuario,)).fetchone()
+        if linha is None:
+            return None
+        self._hashes[usuario] = linha[0]
+        return linha[0]
+
+    def definir_senha(self, usuario: str, senha: str):
+        """Cadastra o usuário ou troca a senha (calcula o hash: operação lenta de propósito)."""
+        senha_hash = pwd_context.hash(senha)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO usuarios (usuario, senha_hash, criado_em) VALUES (?, ?, ?)",
+                (usuario, senha_hash, datetime.now().isoformat()),
+            )
+            self._conn.commit()
+            self._hashes[usuario] = senha_hash
+
+    def verificar(self, usuario: str, senha: str) -> bool:
+        senha_hash = self.obter_hash(usuario)
+        if senha_hash is None:
+            return False
+        return pwd_context.verify(senha, senha_hash)
+
+
+usuarios = Usuarios()
+_pool_senhas = ThreadPoolExecutor(max_workers=AUTH_THREADS, thread_name_prefix="senhas")
+
+
+async def verificar_senha_async(usuario: str, senha: str) -> bool:
+    """Verifica a senha no pool de threads de autenticação (usuário inexistente nem entra no pool)."""
+    if usuarios.obter_hash(usuario) is None:
+        return False
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_pool_senhas, usuarios.verificar, usuario, senha)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("Uso: python user_store.py <usuario> <senha>")
+        sys.exit(1)
+    usuarios.definir_senha(sys.argv[1], sys.argv[2])
+    print(f"✅ Senha de {sys.argv[1]} gravada em {USERS_DB}")
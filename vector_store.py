@@ -0,0 +1,269 @@
+# vector_store.py
+# Armazenamentos vetoriais alternativos ao JSON padrão do LlamaIndex:
+# - FAISS: índice salvo em arquivo e aberto com mmap;
+# - NumPy: matriz .npy de embeddings normalizados (mmap) + offsets dos trechos
+#   numa cópia da transcrição, com busca exata por produto matricial.
+# Metadados dos trechos ficam num SQLite compacto ao lado (side store).
+
+import os
+import shutil
+import sqlite3
+import threading
+
+try:
+    import numpy as np
+except ImportError:  # numpy/faiss são opcionais: o backend "llama" funciona sem eles
+    np = None
+
+try:
+    import faiss
+except ImportError:
+    faiss = None
+
+# "llama" (JSON do LlamaIndex), "faiss" ou "numpy"
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "llama")
+# "flat" (exato), "hnsw" ou "ivf"
+FAISS_INDEX_TYPE = os.getenv("FAISS_INDEX_TYPE", "flat")
+FAISS_HNSW_M = int(os.getenv("FAISS_HNSW_M", "32"))
+FAISS_NPROBE = int(os.getenv("FAISS_NPROBE", "8"))
+
+FAISS_INDEX_FILE = "faiss.index"
+SIDE_STORE_FILE = "trechos.sqlite"
+# float16 reduz a matriz pela metade; float32 é o padrão
+NUMPY_DTYPE = os.getenv("NUMPY_DTYPE", "float32")
+NUMPY_MATRIZ_FILE = "embeddings.npy"
+NUMPY_OFFSETS_FILE = "offsets.npy"
+SNAPSHOT_FILE = "transcricoes.snapshot.txt"
+
+# Arquivo que precisa existir no índice para cada backend
+ARQUIVOS_BACKEND = {"faiss": FAISS_INDEX_FILE, "numpy": NUMPY_MATRIZ_FILE}
+CAMPOS_METADATA = ["modulo", "aula", "secao", "titulo", "temas"]
+
+# Com filtro, busca mais candidatos e filtra depois
+FATOR_SOBREAMOSTRA = 8
+
+
+def faiss_disponivel() -> bool:
+    return faiss is not None
+
+
+def numpy_disponivel() -> bool:
+    return np is not None
+
+
+def _matriz_normalizada(embeddings: list):
+    matriz = np.asarray(embeddings, dtype="float32")
+    normas = np.linalg.norm(matriz, axis=1, keepdims=True)
+    normas[normas == 0] = 1.0
+    return matriz / normas
+
+
+def _criar_indice_faiss(matriz, tipo: str):
+    dim = matriz.shape[1]
+    if tipo == "hnsw":
+        indice = faiss.IndexHNSWFlat(dim, FAISS_HNSW_M, faiss.METRIC_INNER_PRODUCT)
+    elif tipo == "ivf":
+        nlist = max(1, int(len(matriz) ** 0.5))
+        quantizador = faiss.IndexFlatIP(dim)
+        indice = faiss.IndexIVFFlat(quantizador, dim, nlist, faiss.METRIC_INNER_PRODUCT)
+        indice.train(matriz)
+    else:
+        indice = faiss.IndexFlatIP(dim)
+    indice.add(matriz)
+    return indice
+
+
+def exportar_side_store(persist_dir: str, nodes: list) -> None:
+    """Grava id, texto e metadados dos `nodes` no SQLite, na mesma ordem das linhas dos vetores."""
+    caminho = os.path.join(persist_dir, SIDE_STORE_FILE)
+    if os.path.exists(caminho):
+        os.remove(caminho)
+    conn = sqlite3.connect(caminho)
+    conn.execute(f"""
+        CREATE TABLE trechos (
+            pos INTEGER PRIMARY KEY,
+            id TEXT,
+            texto TEXT,
+            {", ".join(f"{c} TEXT" for c in CAMPOS_METADATA)}
+        )
+    """)
+    conn.executemany(
+        f"INSERT INTO trechos VALUES (?, ?, ?, {', '.join('?' for _ in CAMPOS_METADATA)})",
+        [
+            (pos, n.node_id, n.get_content(), *[str(n.metadata.get(c, "")) for c in CAMPOS_METADATA])
+            for pos, n in enumerate(nodes)
+        ],
+    )
+    for campo in ("modulo", "aula"):
+        conn.execute(f"CREATE INDEX idx_trechos_{campo} ON trechos ({campo})")
+    conn.commit()
+    conn.close()
+
+
+def exportar_faiss(persist_dir: str, nodes: list, tipo: str = None) -> None:
+    """Grava o índice FAISS dos `nodes` (já com embedding) em `persist_dir`."""
+    tipo = tipo or FAISS_INDEX_TYPE
+    matriz = _matriz_normalizada([n.embedding for n in nodes])
+    faiss.write_index(_criar_indice_faiss(matriz, tipo), os.path.join(persist_dir, FAISS_INDEX_FILE))
+
+
+def exportar_numpy(persist_dir: str, nodes: list, transcricoes_path: str) -> None:
+    """
+    Grava a matriz de embeddings normalizados, os offsets (início, fim) de cada
+    trecho e uma cópia da transcrição à qual os offsets se referem.
+    """
+    matriz = _matriz_normalizada([n.embedding for n in nodes]).astype(NUMPY_DTYPE)
+    np.save(os.path.join(persist_dir, NUMPY_MATRIZ_FILE), matriz)
+    offsets = np.asarray([[n.start_char_idx, n.end_char_idx] for n in nodes], dtype="int64")
+    np.save(os.path.join(persist_dir, NUMPY_OFFSETS_FILE), offsets)
+    shutil.copyfile(transcricoes_path, os.path.join(persist_dir, SNAPSHOT_FILE))
+
+
+class FaissStore:
+    """Busca por similaridade de cosseno no índice FAISS (mmap) + side store SQLite."""
+
+    def __init__(self, persist_dir: str):
+        caminho = os.path.join(persist_dir, FAISS_INDEX_FILE)
+        try:
+            self.indice = faiss.read_index(caminho, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+        except RuntimeError:
+            # nem todo tipo de índice aceita mmap nesta versão do faiss
+            self.indice = faiss.read_index(caminho)
+        if hasattr(self.indice, "nprobe"):
+            self.indice.nprobe = FAISS_NPROBE
+
+        uri = "file:" + os.path.abspath(os.path.join(persist_dir, SIDE_STORE_FILE)) + "?mode=ro"
+        self._conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._posicoes_por_filtro = {}
+
+    def _posicoes_permitidas(self, filtros: dict) -> set:
+        chave = tuple(sorted(filtros.items()))
+        posicoes = self._posicoes_por_filtro.get(chave)
+        if posicoes is None:
+            campos = [k for k, _ in chave if k in CAMPOS_METADATA]
+            where = " AND ".join(f"{k} = ?" for k in campos) or "1 = 1"
+            with self._lock:
+                linhas = self._conn.execute(
+                    f"SELECT pos FROM trechos WHERE {where}", [str(filtros[k]) for k in campos]
+                ).fetchall()
+            posicoes = {pos for (pos,) in linhas}
+            self._posicoes_por_filtro[chave] = posicoes
+        return posicoes
+
+    def _carregar_trechos(self, posicoes: list) -> dict:
+        marcadores = ", ".join("?" for _ in posicoes)
+        with self._lock:
+            linhas = self._conn.execute(
+                f"SELECT pos, id, texto, {', '.join(CAMPOS_METADATA)} FROM trechos WHERE pos IN ({marcadores})",
+                posicoes,
+            ).fetchall()
+        return {linha[0]: linha for linha in linhas}
+
+    def buscar(self, embedding: list, top_k: int = 3, filtros: dict = None) -> list:
+        """Mesmo formato de retrieve_relevant_chunks: dicts com `id`, `texto`, `score` e `metadata`."""
+        consulta = _matriz_normalizada([embedding])
+        total = self.indice.ntotal
+        permitidas = self._posicoes_permitidas(filtros) if filtros else None
+        k = min(total, top_k * FATOR_SOBREAMOSTRA if filtros else top_k)
+
+        while True:
+            scores, posicoes = self.indice.search(consulta, k)
+            resultados = [
+                (int(pos), float(score))
+                for pos, score in zip(posicoes[0], scores[0])
+                if pos >= 0 and (permitidas is None or pos in permitidas)
+            ]
+            if len(resultados) >= top_k or k >= total:
+                break
+            k = total
+        resultados = resultados[:top_k]
+        if not resultados:
+            return []
+
+        linhas = self._carregar_trechos([pos for pos, _ in resultados])
+        return [
+            {
+                "id": linhas[pos][1],
+                "texto": linhas[pos][2],
+                "score": score,
+                "metadata": dict(zip(CAMPOS_METADATA, linhas[pos][3:])),
+            }
+            for pos, score in resultados
+            if pos in linhas
+        ]
+
+
+class NumpyStore:
+    """
+    Busca exata de cosseno: um produto matricial contra a matriz (mmap) e
+    argpartition para o top-k. Aceita várias consultas na mesma chamada.
+    """
+
+    def __init__(self, persist_dir: str):
+        self.matriz = np.load(os.path.join(persist_dir, NUMPY_MATRIZ_FILE), mmap_mode="r")
+        self.offsets = np.load(os.path.join(persist_dir, NUMPY_OFFSETS_FILE), mmap_mode="r")
+        with open(os.path.join(persist_dir, SNAPSHOT_FILE), encoding="utf-8") as f:
+            self.texto = f.read()
+
+        # ids e metadados são poucos: ficam em memória, na ordem das linhas da matriz
+        conn = sqlite3.connect(os.path.join(persist_dir, SIDE_STORE_FILE))
+        linhas = conn.execute(f"SELECT id, {', '.join(CAMPOS_METADATA)} FROM trechos ORDER BY pos").fetchall()
+        conn.close()
+        self.ids = [linha[0] for linha in linhas]
+        self.metadata = [dict(zip(CAMPOS_METADATA, linha[1:])) for linha in linhas]
+        self._mascaras = {}
+
+    def _mascara(self, filtros: dict):
+        chave = tuple(sorted(filtros.items()))
+        mascara = self._mascaras.get(chave)
+        if mascara is None:
+            mascara = np.array(
+                [all(m.get(k) == str(v) for k, v in filtros.items()) for m in self.metadata], dtype=bool
+            )
+            self._mascaras[chave] = mascara
+        return mascara
+
+    def buscar_lote(self, embeddings: list, top_k: int = 3, filtros: dict = None) -> list:
+        """Uma lista de resultados (mesmo formato de `buscar`) para cada embedding de consulta."""
+        # O produto é feito no dtype da matriz (float16/float32) direto sobre o mmap:
+        # só as consultas são convertidas, nunca a matriz inteira
+        consultas = _matriz_normalizada(embeddings).astype(self.matriz.dtype, copy=False)
+        scores = (consultas @ self.matriz.T).astype("float32", copy=False)
+        if filtros:
+            scores[:, ~self._mascara(filtros)] = -np.inf
+
+        k = min(top_k, scores.shape[1])
+        if k == 0:
+            return [[] for _ in embeddings]
+        candidatos = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+
+        resultados = []
+        for linha, posicoes in enumerate(candidatos):
+            ordem = posicoes[np.argsort(-scores[linha, posicoes])]
+            trechos = []
+            for pos in ordem:
+                score = float(scores[linha, pos])
+                if score == -np.inf:
+                    continue
+                inicio, fim = self.offsets[pos]
+                trechos.append({
+                    "id": self.ids[pos],
+                    "texto": self.texto[int(inicio):int(fim)],
+                    "score": score,
+                    "metadata": dict(self.metadata[pos]),
+                })
+            resultados.append(trechos)
+        return resultados
+
+    def buscar(self, embedding: list, top_k: int = 3, filtros: dict = None) -> list:
+        return self.buscar_lote([embedding], top_k=top_k, filtros=filtros)[0]
+
+
+def abrir_store(backend: str, persist_dir: str):
+    """Store local do backend escolhido, ou None para o backend "llama"."""
+    if backend == "faiss":
+        return FaissStore(persist_dir)
+    if backend == "numpy":
+        return NumpyStore(persist_dir)
+    return None
@@ -0,0 +1,59 @@
+# voice_route.py
+# Modo voz: a resposta é enviada em mp3 por streaming (chunked), trecho a trecho,
+# para o aluno começar a ouvir antes de a resposta inteira ser sintetizada.
+
+import asyncio
+import os
+
+from fastapi import APIRouter, Depends, Form, HTTPException, Request
+from fastapi.responses import StreamingResponse
+
+from auth_utils import get_current_user
+from session_store import SESSION_COOKIE, sessoes
+from voice_utils import ELEVEN_API_KEY, tts_em_trechos
+
+router = APIRouter()
+
+# Limite de caracteres do /voice/tts (a ElevenLabs cobra por caractere sintetizado)
+TTS_TEXTO_MAX_CHARS = int(os.getenv("TTS_TEXTO_MAX_CHARS", "1500"))
+
+
+def _streaming_audio(texto: str) -> StreamingResponse:
+    if not ELEVEN_API_KEY:
+        raise HTTPException(status_code=503, detail="Voz indisponível: ELEVEN_API_KEY não configurada.")
+    return StreamingResponse(
+        tts_em_trechos(texto),
+        media_type="audio/mpeg",
+        headers={"Cache-Control": "no-store"},
+    )
+
+
+@router.get("/voice/resposta")
+async def ouvir_resposta(request: Request, indice: int = -1, user: str = Depends(get_current_user)):
+    """
+    Áudio de uma resposta da conversa atual. `indice` segue a lista do
+    histórico da sessão (negativo conta do fim: -1 é a última resposta).
+    """
+    historico = await asyncio.to_thread(sessoes.carregar, user, request.cookies.get(SESSION_COOKIE) or "")
+    try:
+        item = historico[indice]
+    except IndexError:
+        raise HTTPException(status_code=404, detail="Resposta não encontrada nesta conversa.")
+    return _streaming_audio(item["ai"])
+
+
+@router.post("/voice/tts")
+async def falar_texto(texto: str = Form(...), user: str = Depends(get_current_user)):
+    """
+    Áudio (em streaming) de um texto curto, até TTS_TEXTO_MAX_CHARS caracteres.
+    Respostas da conversa, de qualquer tamanho, vão por /voice/resposta.
+    """
+    texto = texto.strip()
+    if not texto:
+        raise HTTPException(status_code=400, detail="Texto vazio.")
+    if len(texto) > TTS_TEXTO_MAX_CHARS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Texto muito longo para voz: máximo de {TTS_TEXTO_MAX_CHARS} caracteres.",
+        )
+    return _streaming_audio(texto)
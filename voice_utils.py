@@ -1,15 +1,68 @@
 # voice_utils.py
+import asyncio
+import hashlib
+import html
+import json
 import os
-import uuid
+import re
+import shutil
+import threading
+import time
+import httpx
 import requests
+from requests.adapters import HTTPAdapter
 from typing import Optional
-from openai import OpenAI
+from urllib3.util.retry import Retry
+from openai import AsyncOpenAI, OpenAI
 
 WHISPER_MODEL = os.getenv("WHISPER_MODEL", "whisper-1")
 ELEVEN_API_KEY = os.getenv("ELEVEN_API_KEY", "")
 ELEVEN_VOICE_ID = os.getenv("ELEVEN_VOICE_ID", "21m00Tcm4TlvDq8ikWAM")  # default "Rachel"
+VOICE_SETTINGS = {"stability": 0.4, "similarity_boost": 0.8}
+
+# Transcrição: pool limitado de chamadas ao Whisper, com fila de espera limitada (backpressure)
+WHISPER_PARALELOS = int(os.getenv("WHISPER_PARALELOS", "4"))
+WHISPER_FILA_MAX = int(os.getenv("WHISPER_FILA_MAX", "16"))  # pedidos aguardando, além dos em andamento
+AUDIO_MAX_MB = float(os.getenv("AUDIO_MAX_MB", "25"))  # limite de upload da API do Whisper
+AUDIO_OPUS_KBPS = int(os.getenv("AUDIO_OPUS_KBPS", "24"))
+FFMPEG = shutil.which("ffmpeg")
+
+# Cache de áudio em static_audio/: um arquivo por (texto, voz, configurações)
+TTS_CACHE_MAX_MB = float(os.getenv("TTS_CACHE_MAX_MB", "500"))
+TTS_CACHE_MAX_DIAS = float(os.getenv("TTS_CACHE_MAX_DIAS", "30"))
+TTS_CACHE_LIMPEZA = int(os.getenv("TTS_CACHE_LIMPEZA", "50"))  # limpeza a cada N áudios novos
+
+# Voz progressiva: a resposta é sintetizada em trechos (frases) e enviada à medida que ficam prontos
+TTS_PARALELOS = int(os.getenv("TTS_PARALELOS", "3"))
+TTS_MAX_CHARS_TRECHO = int(os.getenv("TTS_MAX_CHARS_TRECHO", "350"))
+TTS_MIN_CHARS_TRECHO = int(os.getenv("TTS_MIN_CHARS_TRECHO", "40"))
 
 client = OpenAI()
+aclient = AsyncOpenAI()
+
+# Cliente HTTP assíncrono compartilhado (pool de conexões com a ElevenLabs)
+_http = httpx.AsyncClient(timeout=60)
+
+# Sessão síncrona com keep-alive: reaproveita a conexão TLS entre chamadas.
+# O POST de TTS não é idempotente (cada chamada é cobrada): só repete em erro de
+# conexão (nada foi enviado) e em 429 (recusado); nunca após erro de leitura ou 5xx.
+# Sem respect_retry_after_header, porque com ele o urllib3 também repete 503/413.
+_sessao = requests.Session()
+_sessao.mount("https://", HTTPAdapter(
+    pool_connections=2,
+    pool_maxsize=8,
+    max_retries=Retry(
+        total=2, connect=2, read=0, other=0, status=2,
+        backoff_factor=0.5, status_forcelist=(429,), allowed_methods=None,
+        raise_on_status=False, respect_retry_after_header=False,
+    ),
+))
+
+_slots_whisper = asyncio.Semaphore(WHISPER_PARALELOS)
+_transcricoes_pendentes = 0
+
+_novos_desde_limpeza = 0
+_lock_limpeza = threading.Lock()
 
 AUDIO_DIR = os.path.join(os.path.dirname(__file__), "static_audio")
 os.makedirs(AUDIO_DIR, exist_ok=True)
@@ -24,11 +77,134 @@ def transcribe_with_whisper(file_path: str) -> str:
         )
     return res.text if hasattr(res, "text") else str(res)
 
-def tts_with_elevenlabs(text: str) -> Optional[str]:
-    """Gera mp3 com ElevenLabs. Retorna nome do arquivo ou None se desabilitado/falhou."""
-    if not ELEVEN_API_KEY:
-        return None
+class FilaCheia(Exception):
+    """Transcrições demais aguardando: a rota responde 503 e o cliente tenta de novo."""
+
+async def ler_upload(upload, max_bytes: int = int(AUDIO_MAX_MB * 1024 * 1024)) -> bytes:
+    """Lê o upload (UploadFile) para a memória em blocos; ValueError se passar de `max_bytes`."""
+    partes, total = [], 0
+    while True:
+        bloco = await upload.read(64 * 1024)
+        if not bloco:
+            break
+        total += len(bloco)
+        if total > max_bytes:
+            raise ValueError(f"Áudio maior que {max_bytes // (1024 * 1024)} MB.")
+        partes.append(bloco)
+    return b"".join(partes)
+
+async def reduzir_audio(conteudo: bytes, nome: str):
+    """
+    Converte o áudio para Opus mono 16 kHz com ffmpeg, por pipe (stdin ->
+    stdout, sem arquivos temporários), para enviar menos bytes ao Whisper.
+    Sem ffmpeg, se a conversão falhar ou não diminuir o tamanho, devolve o
+    original. Retorna (bytes, nome do arquivo).
+    """
+    if not FFMPEG:
+        return conteudo, nome
+    try:
+        proc = await asyncio.create_subprocess_exec(
+            FFMPEG, "-hide_banner", "-loglevel", "error", "-i", "pipe:0",
+            "-vn", "-ac", "1", "-ar", "16000",
+            "-c:a", "libopus", "-b:a", f"{AUDIO_OPUS_KBPS}k", "-application", "voip",
+            "-f", "ogg", "pipe:1",
+            stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE,
+        )
+    except OSError as e:
+        print("⚠️ ffmpeg indisponível, enviando o áudio original:", repr(e))
+        return conteudo, nome
+    try:
+        saida, erro = await asyncio.wait_for(proc.communicate(conteudo), timeout=60)
+    except asyncio.TimeoutError:
+        proc.kill()
+        await proc.wait()
+        return conteudo, nome
+    if proc.returncode != 0 or not saida or len(saida) >= len(conteudo):
+        if proc.returncode != 0:
+            print("⚠️ ffmpeg falhou, enviando o áudio original:", erro.decode(errors="ignore")[:200])
+        return conteudo, nome
+    print(f"🎙️ Áudio reduzido de {len(conteudo) // 1024} KB para {len(saida) // 1024} KB")
+    return saida, os.path.splitext(nome)[0] + ".ogg"
 
+async def transcrever_audio(conteudo: bytes, nome: str = "audio.webm") -> str:
+    """
+    Transcreve áudio em memória. No máximo WHISPER_PARALELOS transcrições
+    (conversão + chamada à API) rodam ao mesmo tempo; com WHISPER_FILA_MAX
+    pedidos já aguardando, levanta FilaCheia em vez de acumular espera.
+    """
+    global _transcricoes_pendentes
+    if _transcricoes_pendentes >= WHISPER_PARALELOS + WHISPER_FILA_MAX:
+        raise FilaCheia()
+    _transcricoes_pendentes += 1
+    try:
+        async with _slots_whisper:
+            conteudo, nome = await reduzir_audio(conteudo, nome)
+            res = await aclient.audio.transcriptions.create(
+                model=WHISPER_MODEL,
+                file=(nome, conteudo),
+                language="pt"
+            )
+    finally:
+        _transcricoes_pendentes -= 1
+    return res.text if hasattr(res, "text") else str(res)
+
+async def transcribe_with_whisper_async(file_path: str) -> str:
+    """Versão assíncrona de transcribe_with_whisper (passa pelo mesmo pool de transcrever_audio)."""
+    conteudo = await asyncio.to_thread(_ler_arquivo, file_path)
+    return await transcrever_audio(conteudo, os.path.basename(file_path))
+
+def texto_para_fala(texto: str) -> str:
+    """Tira o HTML das respostas do chat (<br>, <b>, links) para a ElevenLabs não ler as tags."""
+    texto = re.sub(r"<br\s*/?>", "\n", texto, flags=re.IGNORECASE)
+    texto = html.unescape(re.sub(r"<[^>]+>", "", texto))
+    return re.sub(r"[ \t]+", " ", texto).strip()
+
+_FIM_DE_FRASE = re.compile(r"(?<=[.!?…])\s+|\n+")
+
+def _cortar_frase_longa(frase: str, max_chars: int) -> list:
+    """Frases acima do limite são cortadas na última vírgula (ou espaço) antes dele."""
+    partes = []
+    while len(frase) > max_chars:
+        corte = frase.rfind(", ", 0, max_chars)
+        if corte < max_chars // 2:
+            corte = frase.rfind(" ", 0, max_chars)
+        if corte <= 0:
+            corte = max_chars
+        partes.append(frase[:corte + 1].strip())
+        frase = frase[corte + 1:].strip()
+    if frase:
+        partes.append(frase)
+    return partes
+
+def dividir_em_frases(texto: str, max_chars: int = TTS_MAX_CHARS_TRECHO, min_chars: int = TTS_MIN_CHARS_TRECHO) -> list:
+    """
+    Divide o texto (HTML do chat ou texto puro) em trechos para a síntese
+    progressiva: um por frase, juntando frases curtas até `min_chars` e
+    cortando as que passam de `max_chars`.
+    """
+    trechos = []
+    for frase in _FIM_DE_FRASE.split(texto_para_fala(texto)):
+        for parte in _cortar_frase_longa(frase.strip(), max_chars):
+            if trechos and len(trechos[-1]) < min_chars and len(trechos[-1]) + 1 + len(parte) <= max_chars:
+                trechos[-1] = f"{trechos[-1]} {parte}"
+            else:
+                trechos.append(parte)
+    return trechos
+
+def chave_audio(text: str, voice_id: str = ELEVEN_VOICE_ID, voice_settings: dict = VOICE_SETTINGS) -> str:
+    """sha256 de (texto, voz, configurações): o mesmo pedido sempre cai no mesmo arquivo."""
+    bruto = json.dumps([text, voice_id, voice_settings], ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(bruto.encode("utf-8")).hexdigest()
+
+def _arquivo_em_cache(filename: str) -> bool:
+    caminho = os.path.join(AUDIO_DIR, filename)
+    try:
+        os.utime(caminho)  # mtime = último uso, para a limpeza remover os menos usados
+        return True
+    except FileNotFoundError:
+        return False
+
+def _requisicao_elevenlabs(text: str):
     url = f"https://api.elevenlabs.io/v1/text-to-speech/{ELEVEN_VOICE_ID}"
     headers = {
         "xi-api-key": ELEVEN_API_KEY,
@@ -37,14 +213,131 @@ def tts_with_elevenlabs(text: str) -> Optional[str]:
     }
     payload = {
         "text": text,
-        "voice_settings": {"stability": 0.4, "similarity_boost": 0.8},
+        "voice_settings": VOICE_SETTINGS,
     }
-    r = requests.post(url, json=payload, headers=headers, timeout=60)
-    if r.status_code != 200:
-        return None
+    return url, headers, payload
 
-    filename = f"{uuid.uuid4().hex}.mp3"
+def _salvar_mp3(conteudo: bytes, filename: str) -> str:
+    """Grava de forma atômica (tmp + replace): pedidos simultâneos do mesmo texto não corrompem o arquivo."""
+    global _novos_desde_limpeza
     out_path = os.path.join(AUDIO_DIR, filename)
-    with open(out_path, "wb") as f:
-        f.write(r.content)
+    tmp_path = f"{out_path}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(conteudo)
+    os.replace(tmp_path, out_path)
+    with _lock_limpeza:
+        _novos_desde_limpeza += 1
+        limpar = _novos_desde_limpeza >= TTS_CACHE_LIMPEZA
+        if limpar:
+            _novos_desde_limpeza = 0
+    if limpar:
+        limpar_cache_audio()
     return filename
+
+def limpar_cache_audio(max_mb: float = TTS_CACHE_MAX_MB, max_dias: float = TTS_CACHE_MAX_DIAS) -> dict:
+    """
+    Remove de static_audio/ os mp3 sem uso há mais de `max_dias` e, se o total
+    ainda passar de `max_mb`, os usados há mais tempo até caber no limite.
+    """
+    arquivos = []
+    for entrada in os.scandir(AUDIO_DIR):
+        if entrada.is_file() and entrada.name.endswith(".mp3"):
+            info = entrada.stat()
+            arquivos.append((info.st_mtime, info.st_size, entrada.path))
+    arquivos.sort()
+
+    limite_idade = time.time() - max_dias * 86400
+    limite_bytes = max_mb * 1024 * 1024
+    total = sum(tamanho for _, tamanho, _ in arquivos)
+    removidos = 0
+    for mtime, tamanho, caminho in arquivos:
+        if mtime >= limite_idade and total <= limite_bytes:
+            break
+        try:
+            os.remove(caminho)
+        except FileNotFoundError:
+            pass
+        total -= tamanho
+        removidos += 1
+    if removidos:
+        print(f"🧹 Cache de áudio: {removidos} arquivo(s) removido(s), {total / 1024 / 1024:.1f} MB em uso")
+    return {"arquivos": len(arquivos) - removidos, "removidos": removidos, "bytes": total}
+
+def tts_with_elevenlabs(text: str) -> Optional[str]:
+    """
+    Gera mp3 com ElevenLabs. Retorna nome do arquivo ou None se desabilitado/falhou.
+    Textos já sintetizados (mesma voz e configurações) saem do cache, sem chamar a API.
+    """
+    if not ELEVEN_API_KEY:
+        return None
+
+    text = texto_para_fala(text)
+    filename = f"{chave_audio(text)}.mp3"
+    if _arquivo_em_cache(filename):
+        return filename
+
+    url, headers, payload = _requisicao_elevenlabs(text)
+    try:
+        r = _sessao.post(url, json=payload, headers=headers, timeout=60)
+    except requests.RequestException:
+        return None
+    if r.status_code != 200:
+        return None
+    return _salvar_mp3(r.content, filename)
+
+async def tts_with_elevenlabs_async(text: str) -> Optional[str]:
+    """Versão assíncrona de tts_with_elevenlabs (httpx, sem prender uma thread)."""
+    if not ELEVEN_API_KEY:
+        return None
+
+    text = texto_para_fala(text)
+    filename = f"{chave_audio(text)}.mp3"
+    if await asyncio.to_thread(_arquivo_em_cache, filename):
+        return filename
+
+    url, headers, payload = _requisicao_elevenlabs(text)
+    try:
+        r = await _http.post(url, json=payload, headers=headers)
+    except httpx.HTTPError:
+        return None
+    if r.status_code != 200:
+        return None
+    return await asyncio.to_thread(_salvar_mp3, r.content, filename)
+
+async def _audio_do_trecho(trecho: str) -> Optional[bytes]:
+    filename = await tts_with_elevenlabs_async(trecho)
+    if not filename:
+        return None
+    try:
+        return await asyncio.to_thread(_ler_arquivo, os.path.join(AUDIO_DIR, filename))
+    except FileNotFoundError:  # removido pela limpeza entre a gravação e a leitura
+        return None
+
+def _ler_arquivo(caminho: str) -> bytes:
+    with open(caminho, "rb") as f:
+        return f.read()
+
+async def tts_em_trechos(text: str, paralelos: int = TTS_PARALELOS):
+    """
+    Gera o mp3 da resposta em pedaços, na ordem do texto: os trechos de
+    dividir_em_frases são sintetizados com até `paralelos` chamadas simultâneas
+    (cada um passa pelo cache de áudio) e cada pedaço sai assim que ele e os
+    anteriores estão prontos. O primeiro áudio chega em ~1 frase de síntese.
+    Trechos que falharem são pulados.
+    """
+    semaforo = asyncio.Semaphore(paralelos)
+
+    async def sintetizar(trecho):
+        async with semaforo:
+            return await _audio_do_trecho(trecho)
+
+    tarefas = [asyncio.create_task(sintetizar(trecho)) for trecho in dividir_em_frases(text)]
+    try:
+        for tarefa in tarefas:
+            audio = await tarefa
+            if audio:
+                yield audio
+    finally:
+        # Cliente desconectou (ou erro): não sintetiza o resto à toa
+        for tarefa in tarefas:
+            tarefa.cancel()